@@ -1,12 +1,26 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import tensorflow as tf
-import numpy as np
 from PIL import Image
-import io
 import os
 import logging
 
+from image_decode import preprocess_pixels, UnsupportedImageError, SUPPORTED_MODES
+from upload_limits import (
+    install_flask_limits,
+    PREDICT_LIMITS,
+    SEARCH_LIMITS,
+    SIMILAR_LIMITS,
+    BATCH_LIMITS,
+)
+from inference_batcher import shared_batcher, BatcherOverloadedError
+from model_serving import load_serving_model
+from prediction_cache import PredictionCache
+from flower_names import VietnameseNameTable
+from fast_json import FastJSONProvider
+from product_search import shared_catalog_search, parse_search_k, parse_search_nprobe
+import metrics
+from metrics import stage
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -15,17 +29,53 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 # Load model Oxford Flowers
 try:
     logger.info("Loading Oxford Flowers model...")
-    model = tf.keras.models.load_model("oxford102_m2_optimized.h5")
-    logger.info("Model loaded successfully!")
+    model = load_serving_model("oxford102_m2_optimized.h5", warm_up=True)
+    logger.info(f"Model loaded successfully! (backend: {model.backend})")
 except Exception as e:
     logger.error(f"Failed to load model: {str(e)}")
     raise
 
+# Gom các request đồng thời thành batch trước khi chạy model
+# (model.serve nhận pixel uint8, trả về top-k ngay trong graph)
+batcher = shared_batcher(model.serve)
+embed_batcher = shared_batcher(model.embed)
+
+# Index embedding ảnh sản phẩm (wwwroot/images) cho /search-similar, build nền
+catalog_search = shared_catalog_search(model)
+catalog_search.start()
+
+# Cache kết quả theo hash nội dung ảnh (ảnh upload lại / client retry)
+prediction_cache = PredictionCache()
+
+# Số ảnh tối đa trong một request /predict-batch
+MAX_BATCH_IMAGES = int(os.environ.get("FLOWER_MAX_BATCH_IMAGES", "32"))
+
+# /metrics: latency theo stage, request theo route/status, batch, cache
+metrics.instrument_flask(app, "classic")
+metrics.register_cache("classic", prediction_cache)
+metrics.register_model(model)
+metrics.register_batcher(batcher)
+metrics.register_batcher(embed_batcher)
+
+# Giới hạn byte của request theo endpoint (413 trước khi view đọc ảnh); giới hạn
+# pixel/format được kiểm tra từ header khi decode (preprocess_pixels)
+install_flask_limits(
+    app,
+    {
+        "predict": PREDICT_LIMITS,
+        "predict_batch": BATCH_LIMITS,
+        "search_by_image": SEARCH_LIMITS,
+        "search_similar": SIMILAR_LIMITS,
+    },
+    error_endpoints={"search_by_image"},
+)
+
 # Danh sách 102 loài hoa từ dataset Oxford Flowers
 class_names = [
     "pink primrose",
@@ -132,10 +182,154 @@ class_names = [
     "blackberry lily",
 ]
 
+# Tên tiếng Việt: key đầu tiên là chuỗi con của tên tiếng Anh (viết thường) được chọn
+VIETNAMESE_NAMES = {
+    # Common flowers
+    "rose": "Hoa Hồng",
+    "sunflower": "Hoa Hướng Dương",
+    "tulip": "Hoa Tulip",
+    "lily": "Hoa Lily",
+    "orchid": "Hoa Lan",
+    "carnation": "Hoa Cẩm Chướng",
+    "daffodil": "Hoa Thủy Tiên",
+    "iris": "Hoa Diên Vĩ",
+    "dahlia": "Hoa Thược Dược",
+    "magnolia": "Hoa Mộc Lan",
+    "marigold": "Hoa Vạn Thọ",
+    "poppy": "Hoa Anh Túc",
+    "lotus": "Hoa Sen",
+
+    # Daisy family
+    "daisy": "Hoa Cúc",
+    "oxeye daisy": "Hoa Cúc Trắng",
+    "barbeton daisy": "Hoa Đồng Tiền",
+    "black-eyed susan": "Hoa Cúc Mắt Đen",
+
+    # Specific flowers
+    "primrose": "Hoa Anh Thảo",
+    "pink primrose": "Hoa Anh Thảo Hồng",
+    "canterbury bells": "Hoa Chuông Canterbury",
+    "sweet pea": "Hoa Đậu Hà Lan",
+    "english marigold": "Hoa Cúc Vạn Thọ Anh",
+    "tiger lily": "Hoa Lily Hổ",
+    "moon orchid": "Hoa Lan Trăng",
+    "bird of paradise": "Hoa Thiên Điểu",
+    "monkshood": "Hoa Mũ Tu Sĩ",
+    "globe thistle": "Hoa Kế Cầu",
+    "snapdragon": "Hoa Mõm Sói",
+    "king protea": "Hoa Protea Vua",
+    "spear thistle": "Hoa Kế Gai",
+    "yellow iris": "Hoa Diên Vĩ Vàng",
+    "purple coneflower": "Hoa Cúc Tím",
+    "peruvian lily": "Hoa Lily Peru",
+    "balloon flower": "Hoa Cát Cánh",
+    "giant white arum lily": "Hoa Rum Trắng",
+    "fire lily": "Hoa Lily Lửa",
+    "pincushion flower": "Hoa Cúc Gối",
+    "fritillary": "Hoa Fritillary",
+    "red ginger": "Hoa Gừng Đỏ",
+    "grape hyacinth": "Hoa Đậu Biếc",
+    "corn poppy": "Hoa Anh Túc Đỏ",
+    "prince of wales feathers": "Hoa Lông Hoàng Tử",
+    "stemless gentian": "Hoa Long Đởm",
+    "artichoke": "Hoa Atiso",
+    "sweet william": "Hoa Cẩm Chướng Thơm",
+    "garden phlox": "Hoa Phlox Vườn",
+    "love in the mist": "Hoa Cúc Mơ",
+    "mexican aster": "Hoa Cúc Mexico",
+    "alpine sea holly": "Hoa Cúc Gai Biển",
+    "cape flower": "Hoa Mũi Cape",
+    "great masterwort": "Hoa Astrantia",
+    "siam tulip": "Hoa Tulip Xiêm",
+    "lenten rose": "Hoa Helleborus",
+    "sword lily": "Hoa Lay Ơn",
+    "poinsettia": "Hoa Trạng Nguyên",
+    "wallflower": "Hoa Tường Vi",
+    "buttercup": "Hoa Mao Lương",
+    "common dandelion": "Hoa Bồ Công Anh",
+    "petunia": "Hoa Dạ Yến Thảo",
+    "wild pansy": "Hoa Păng-xê Dại",
+    "primula": "Hoa Anh Thảo",
+    "pelargonium": "Hoa Phong Lữ Thảo",
+    "geranium": "Hoa Phong Lữ",
+    "orange dahlia": "Hoa Thược Dược Cam",
+    "pink-yellow dahlia": "Hoa Thược Dược Hồng Vàng",
+    "japanese anemone": "Hoa Hải Quỳ Nhật",
+    "silverbush": "Hoa Bạc",
+    "californian poppy": "Hoa Anh Túc California",
+    "spring crocus": "Hoa Nghệ Tây Mùa Xuân",
+    "bearded iris": "Hoa Diên Vĩ Râu",
+    "windflower": "Hoa Gió",
+    "tree poppy": "Hoa Anh Túc Cây",
+    "gazania": "Hoa Cúc Gazania",
+    "azalea": "Hoa Đỗ Quyên",
+    "water lily": "Hoa Súng",
+    "thorn apple": "Hoa Táo Gai",
+    "morning glory": "Hoa Bìm Bìm",
+    "passion flower": "Hoa Lạc Tiên",
+    "toad lily": "Hoa Lily Cóc",
+    "anthurium": "Hoa Hồng Môn",
+    "frangipani": "Hoa Đại",
+    "clematis": "Hoa Tơ Hồng",
+    "hibiscus": "Hoa Dâm Bụt",
+    "columbine": "Hoa Huyền Sâm",
+    "desert-rose": "Hoa Sứ",
+    "tree mallow": "Hoa Cẩm Quỳ Cây",
+    "cyclamen": "Hoa Tiên Khách",
+    "watercress": "Hoa Cải Xoong",
+    "canna lily": "Hoa Dong Riềng",
+    "hippeastrum": "Hoa Huệ Tây",
+    "bee balm": "Hoa Bạc Hà Ong",
+    "ball moss": "Rêu Cầu",
+    "foxglove": "Hoa Mao Địa Hoàng",
+    "bougainvillea": "Hoa Giấy",
+    "camellia": "Hoa Trà",
+    "mallow": "Hoa Cẩm Quỳ",
+    "mexican petunia": "Hoa Dạ Yến Thảo Mexico",
+    "bromelia": "Hoa Dứa Cảnh",
+    "blanket flower": "Hoa Cúc Thảm",
+    "trumpet creeper": "Hoa Kèn Hồng",
+    "blackberry lily": "Hoa Lily Dâu Đen",
+    "gerbera": "Hoa Đồng Tiền",
+    "hydrangea": "Hoa Cẩm Tú Cầu",
+}
+
+# Tra cứu tên dựng sẵn một lần: theo class id (O(1)) và theo tên tự do (memoize)
+vietnamese_names = VietnameseNameTable(VIETNAMESE_NAMES, class_names)
+
 
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({"status": "healthy", "model": "Oxford102_m2_optimized"})
+    return jsonify(
+        {
+            "status": "healthy" if model.ready else "starting",
+            "ready": model.ready,
+            "model": "Oxford102_m2_optimized",
+            "backend": model.backend,
+            "cache": prediction_cache.stats(),
+            "catalog_index": catalog_search.stats(),
+        }
+    )
+
+
+@app.route("/health/live", methods=["GET"])
+def health_live():
+    """Liveness: process còn phục vụ request"""
+    return jsonify({"status": "alive"})
+
+
+@app.route("/health/ready", methods=["GET"])
+def health_ready():
+    """Readiness: model đã load và đã warm-up, kèm thời gian warm-up"""
+    return jsonify(
+        {
+            "status": "ready" if model.ready else "not_ready",
+            "model_loaded": model.loaded,
+            "warm": model.warmup_ms is not None,
+            "warmup_ms": model.warmup_ms,
+            "backend": model.backend,
+        }
+    ), (200 if model.ready else 503)
 
 
 @app.route("/predict", methods=["POST"])
@@ -158,60 +352,143 @@ def predict():
 
         # Đọc và xử lý ảnh
         image_bytes = file.read()
-        image = Image.open(io.BytesIO(image_bytes))
 
-        # Validate image
-        if image.mode not in ['RGB', 'RGBA', 'L']:
-            logger.warning(f"Unsupported image mode: {image.mode}")
-            return jsonify({"success": False, "message": "Unsupported image format"}), 400
+        cache_key = prediction_cache.make_key(image_bytes, "predict")
+        cached_response = prediction_cache.get(cache_key)
+        if cached_response is not None:
+            logger.info("Prediction served from cache")
+            return jsonify(cached_response)
+
+        # Decode thẳng về kích thước model yêu cầu (224x224)
+        # Từ chối trước khi decode nếu hàng đợi inference đã quá tải
+        batcher.admit()
+        try:
+            image_array = preprocess_pixels(
+                image_bytes, allowed_modes=SUPPORTED_MODES, limits=PREDICT_LIMITS
+            )
+        except UnsupportedImageError as e:
+            logger.warning(str(e))
+            return jsonify({"success": False, "message": e.public_message}), e.status
+
+        # Dự đoán (qua batcher)
+        logger.info("Running model prediction...")
+        with stage("inference"):
+            outputs = batcher.predict(image_array)
+        result_predictions = build_top_predictions(outputs)
 
-        # Resize về kích thước model yêu cầu (224x224)
-        image = image.convert("RGB")
-        image = image.resize((224, 224))
+        logger.info(f"Prediction successful. Top result: {result_predictions[0]['className']} ({result_predictions[0]['confidence']:.2%})")
 
-        # Chuẩn hóa dữ liệu
-        image_array = np.array(image) / 255.0
-        image_array = np.expand_dims(image_array, axis=0)
+        # Trả về kết quả theo format mà C# service mong đợi
+        response_data = {
+            "success": True,
+            "predictions": result_predictions,
+            "message": "Prediction successful",
+        }
+        prediction_cache.put(cache_key, response_data)
 
-        # Dự đoán
-        logger.info("Running model prediction...")
-        predictions = model.predict(image_array, verbose=0)
+        return jsonify(response_data)
 
-        # Lấy top 3 predictions
-        top_3_indices = np.argsort(predictions[0])[-3:][::-1]
+    except BatcherOverloadedError as e:
+        logger.warning(str(e))
+        return jsonify(
+            {"success": False, "message": e.public_message}
+        ), e.status, e.headers
+    except Image.UnidentifiedImageError:
+        logger.error("Invalid image file - cannot be identified")
+        return jsonify(
+            {"success": False, "message": "Invalid image file. Please upload a valid image."}
+        ), 400
+    except Exception as e:
+        logger.error(f"Error in prediction: {str(e)}", exc_info=True)
+        return jsonify(
+            {"success": False, "message": f"Error processing image: {str(e)}"}
+        ), 500
 
-        result_predictions = []
-        for idx in top_3_indices:
-            flower_name = class_names[idx]
-            vietnamese_name = map_flower_to_vietnamese(flower_name)
-            confidence = float(predictions[0][idx])
 
-            result_predictions.append({
-                "className": vietnamese_name,
-                "confidence": confidence,
-                "englishName": flower_name
-            })
+@app.route("/predict-batch", methods=["POST"])
+def predict_batch():
+    """Nhận dạng nhiều ảnh trong một request, chạy theo batch qua batcher"""
+    try:
+        files = request.files.getlist("images") + request.files.getlist("image")
+        files = [file for file in files if file.filename != ""]
 
-        logger.info(f"Prediction successful. Top result: {result_predictions[0]['className']} ({result_predictions[0]['confidence']:.2%})")
+        if not files:
+            logger.warning("No image files provided in batch request")
+            return jsonify({"success": False, "message": "No image file provided"}), 400
+
+        # Không vượt quá số ảnh hàng đợi của batcher có thể nhận
+        max_images = batcher.max_images(MAX_BATCH_IMAGES)
+        if len(files) > max_images:
+            return jsonify(
+                {"success": False, "message": f"Too many images (max {max_images})"}
+            ), 400
+
+        logger.info(f"Received batch prediction request: {len(files)} images")
+
+        results = [None] * len(files)
+        pending = []  # (vị trí, cache key, mảng ảnh) cần chạy model
+
+        for i, file in enumerate(files):
+            image_bytes = file.read()
+            cache_key = prediction_cache.make_key(image_bytes, "predict")
+            cached_response = prediction_cache.get(cache_key)
+            if cached_response is not None:
+                results[i] = dict(cached_response, filename=file.filename)
+                continue
+
+            try:
+                image_array = preprocess_pixels(
+                    image_bytes, allowed_modes=SUPPORTED_MODES, limits=BATCH_LIMITS
+                )
+                pending.append((i, cache_key, image_array))
+            except UnsupportedImageError as e:
+                results[i] = {
+                    "success": False,
+                    "filename": file.filename,
+                    "message": e.public_message,
+                }
+            except Image.UnidentifiedImageError:
+                results[i] = {
+                    "success": False,
+                    "filename": file.filename,
+                    "message": "Invalid image file. Please upload a valid image.",
+                }
+
+        if pending:
+            # Cả batch đi qua hàng đợi của batcher (được tính vào depth/delay)
+            with stage("inference"):
+                outputs = batcher.predict_many([array for _, _, array in pending])
+            for j, (i, cache_key, _) in enumerate(pending):
+                response_data = {
+                    "success": True,
+                    "predictions": build_top_predictions(
+                        {key: value[j] for key, value in outputs.items()}
+                    ),
+                    "message": "Prediction successful",
+                }
+                prediction_cache.put(cache_key, response_data)
+                results[i] = dict(response_data, filename=files[i].filename)
+
+        logger.info(f"Batch prediction successful: {len(files)} images")
 
-        # Trả về kết quả theo format mà C# service mong đợi
         return jsonify(
             {
                 "success": True,
-                "predictions": result_predictions,
-                "message": "Prediction successful",
+                "count": len(results),
+                "results": results,
+                "message": "Batch prediction successful",
             }
         )
 
-    except Image.UnidentifiedImageError:
-        logger.error("Invalid image file - cannot be identified")
+    except BatcherOverloadedError as e:
+        logger.warning(str(e))
         return jsonify(
-            {"success": False, "message": "Invalid image file. Please upload a valid image."}
-        ), 400
+            {"success": False, "message": e.public_message}
+        ), e.status, e.headers
     except Exception as e:
-        logger.error(f"Error in prediction: {str(e)}", exc_info=True)
+        logger.error(f"Error in batch prediction: {str(e)}", exc_info=True)
         return jsonify(
-            {"success": False, "message": f"Error processing image: {str(e)}"}
+            {"success": False, "message": f"Error processing images: {str(e)}"}
         ), 500
 
 
@@ -234,39 +511,48 @@ def search_by_image():
 
         # Preprocess image cho model Oxford Flowers (224x224)
         image_bytes = file.read()
-        image = Image.open(io.BytesIO(image_bytes))
-
-        # Validate image
-        if image.mode not in ['RGB', 'RGBA', 'L']:
-            logger.warning(f"Unsupported image mode: {image.mode}")
-            return jsonify({"error": "Unsupported image format"}), 400
-
-        image = image.convert("RGB")
-        image = image.resize((224, 224))
-        image_array = np.array(image) / 255.0
-        image_array = np.expand_dims(image_array, axis=0)
 
-        # Predict
+        cache_key = prediction_cache.make_key(image_bytes, "search")
+        cached_response = prediction_cache.get(cache_key)
+        if cached_response is not None:
+            logger.info("Search result served from cache")
+            return jsonify(cached_response)
+
+        batcher.admit()
+        try:
+            image_array = preprocess_pixels(
+                image_bytes, allowed_modes=SUPPORTED_MODES, limits=SEARCH_LIMITS
+            )
+        except UnsupportedImageError as e:
+            logger.warning(str(e))
+            return jsonify({"error": e.public_message}), e.status
+
+        # Predict (qua batcher)
         logger.info("Running model prediction for search...")
-        predictions = model.predict(image_array, verbose=0)
-        predicted_class = np.argmax(predictions[0])
-        confidence = float(predictions[0][predicted_class])
+        with stage("inference"):
+            outputs = batcher.predict(image_array)
+        predicted_class = outputs["top_k_indices"][0]
+        confidence = float(outputs["top_k_values"][0])
 
         # Map tên hoa sang tiếng Việt
         flower_name = class_names[predicted_class]
-        vietnamese_name = map_flower_to_vietnamese(flower_name)
+        vietnamese_name = vietnamese_names.for_class(predicted_class)
 
         logger.info(f"Search result: {vietnamese_name} ({confidence:.2%})")
 
-        return jsonify(
-            {
-                "class_id": int(predicted_class),
-                "class_name": flower_name,
-                "vietnamese_name": vietnamese_name,
-                "probability": confidence,
-            }
-        )
+        response_data = {
+            "class_id": int(predicted_class),
+            "class_name": flower_name,
+            "vietnamese_name": vietnamese_name,
+            "probability": confidence,
+        }
+        prediction_cache.put(cache_key, response_data)
+
+        return jsonify(response_data)
 
+    except BatcherOverloadedError as e:
+        logger.warning(str(e))
+        return jsonify({"error": e.public_message}), e.status, e.headers
     except Image.UnidentifiedImageError:
         logger.error("Invalid image file in search-by-image")
         return jsonify({"error": "Invalid image file"}), 400
@@ -275,127 +561,83 @@ def search_by_image():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/search-similar", methods=["POST"])
+def search_similar():
+    """Tìm sản phẩm có ảnh giống ảnh upload nhất (embedding + nearest neighbor)"""
+    try:
+        file = request.files.get("imageFile") or request.files.get("image")
+        if file is None or file.filename == "":
+            return jsonify({"success": False, "message": "No image file"}), 400
+
+        try:
+            k = parse_search_k(request.values.get("k"))
+            nprobe = parse_search_nprobe(request.values.get("nprobe"))
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+
+        if not catalog_search.ready:
+            return jsonify({
+                "success": False,
+                "message": f"Catalog index is {catalog_search.status}",
+                "catalog_index": catalog_search.stats(),
+            }), 503
+
+        embed_batcher.admit()
+        try:
+            image_array = preprocess_pixels(
+                file.read(), allowed_modes=SUPPORTED_MODES, limits=SIMILAR_LIMITS
+            )
+        except UnsupportedImageError as e:
+            logger.warning(str(e))
+            return jsonify({"success": False, "message": e.public_message}), e.status
+
+        with stage("inference"):
+            embedding = embed_batcher.predict(image_array)
+        with stage("search"):
+            results = catalog_search.search(embedding, k, nprobe)
+        return jsonify({
+            "success": True,
+            "count": len(results),
+            "results": results,
+            "message": f"Found {len(results)} similar products",
+        })
+
+    except BatcherOverloadedError as e:
+        logger.warning(str(e))
+        return jsonify(
+            {"success": False, "message": e.public_message}
+        ), e.status, e.headers
+    except Image.UnidentifiedImageError:
+        logger.error("Invalid image file in search-similar")
+        return jsonify({"success": False, "message": "Invalid image file"}), 400
+    except Exception as e:
+        logger.error(f"Error in search-similar: {str(e)}", exc_info=True)
+        return jsonify({"success": False, "message": str(e)}), 500
+
+
+def build_top_predictions(outputs):
+    """Lấy top 3 predictions từ output top-k của serving graph cho một ảnh"""
+    result_predictions = []
+    for idx, confidence in zip(
+        outputs["top_k_indices"][:3], outputs["top_k_values"][:3]
+    ):
+        flower_name = class_names[idx]
+        vietnamese_name = vietnamese_names.for_class(idx)
+        confidence = float(confidence)
+
+        result_predictions.append({
+            "className": vietnamese_name,
+            "confidence": confidence,
+            "englishName": flower_name
+        })
+
+    return result_predictions
+
+
 def map_flower_to_vietnamese(english_name):
     """Map tên hoa từ tiếng Anh sang tiếng Việt - Đầy đủ cho Oxford Flowers 102"""
-    flower_mapping = {
-        # Common flowers
-        "rose": "Hoa Hồng",
-        "sunflower": "Hoa Hướng Dương",
-        "tulip": "Hoa Tulip",
-        "lily": "Hoa Lily",
-        "orchid": "Hoa Lan",
-        "carnation": "Hoa Cẩm Chướng",
-        "daffodil": "Hoa Thủy Tiên",
-        "iris": "Hoa Diên Vĩ",
-        "dahlia": "Hoa Thược Dược",
-        "magnolia": "Hoa Mộc Lan",
-        "marigold": "Hoa Vạn Thọ",
-        "poppy": "Hoa Anh Túc",
-        "lotus": "Hoa Sen",
-
-        # Daisy family
-        "daisy": "Hoa Cúc",
-        "oxeye daisy": "Hoa Cúc Trắng",
-        "barbeton daisy": "Hoa Đồng Tiền",
-        "black-eyed susan": "Hoa Cúc Mắt Đen",
-
-        # Specific flowers
-        "primrose": "Hoa Anh Thảo",
-        "pink primrose": "Hoa Anh Thảo Hồng",
-        "canterbury bells": "Hoa Chuông Canterbury",
-        "sweet pea": "Hoa Đậu Hà Lan",
-        "english marigold": "Hoa Cúc Vạn Thọ Anh",
-        "tiger lily": "Hoa Lily Hổ",
-        "moon orchid": "Hoa Lan Trăng",
-        "bird of paradise": "Hoa Thiên Điểu",
-        "monkshood": "Hoa Mũ Tu Sĩ",
-        "globe thistle": "Hoa Kế Cầu",
-        "snapdragon": "Hoa Mõm Sói",
-        "king protea": "Hoa Protea Vua",
-        "spear thistle": "Hoa Kế Gai",
-        "yellow iris": "Hoa Diên Vĩ Vàng",
-        "purple coneflower": "Hoa Cúc Tím",
-        "peruvian lily": "Hoa Lily Peru",
-        "balloon flower": "Hoa Cát Cánh",
-        "giant white arum lily": "Hoa Rum Trắng",
-        "fire lily": "Hoa Lily Lửa",
-        "pincushion flower": "Hoa Cúc Gối",
-        "fritillary": "Hoa Fritillary",
-        "red ginger": "Hoa Gừng Đỏ",
-        "grape hyacinth": "Hoa Đậu Biếc",
-        "corn poppy": "Hoa Anh Túc Đỏ",
-        "prince of wales feathers": "Hoa Lông Hoàng Tử",
-        "stemless gentian": "Hoa Long Đởm",
-        "artichoke": "Hoa Atiso",
-        "sweet william": "Hoa Cẩm Chướng Thơm",
-        "garden phlox": "Hoa Phlox Vườn",
-        "love in the mist": "Hoa Cúc Mơ",
-        "mexican aster": "Hoa Cúc Mexico",
-        "alpine sea holly": "Hoa Cúc Gai Biển",
-        "cape flower": "Hoa Mũi Cape",
-        "great masterwort": "Hoa Astrantia",
-        "siam tulip": "Hoa Tulip Xiêm",
-        "lenten rose": "Hoa Helleborus",
-        "sword lily": "Hoa Lay Ơn",
-        "poinsettia": "Hoa Trạng Nguyên",
-        "wallflower": "Hoa Tường Vi",
-        "buttercup": "Hoa Mao Lương",
-        "common dandelion": "Hoa Bồ Công Anh",
-        "petunia": "Hoa Dạ Yến Thảo",
-        "wild pansy": "Hoa Păng-xê Dại",
-        "primula": "Hoa Anh Thảo",
-        "pelargonium": "Hoa Phong Lữ Thảo",
-        "geranium": "Hoa Phong Lữ",
-        "orange dahlia": "Hoa Thược Dược Cam",
-        "pink-yellow dahlia": "Hoa Thược Dược Hồng Vàng",
-        "japanese anemone": "Hoa Hải Quỳ Nhật",
-        "silverbush": "Hoa Bạc",
-        "californian poppy": "Hoa Anh Túc California",
-        "spring crocus": "Hoa Nghệ Tây Mùa Xuân",
-        "bearded iris": "Hoa Diên Vĩ Râu",
-        "windflower": "Hoa Gió",
-        "tree poppy": "Hoa Anh Túc Cây",
-        "gazania": "Hoa Cúc Gazania",
-        "azalea": "Hoa Đỗ Quyên",
-        "water lily": "Hoa Súng",
-        "thorn apple": "Hoa Táo Gai",
-        "morning glory": "Hoa Bìm Bìm",
-        "passion flower": "Hoa Lạc Tiên",
-        "toad lily": "Hoa Lily Cóc",
-        "anthurium": "Hoa Hồng Môn",
-        "frangipani": "Hoa Đại",
-        "clematis": "Hoa Tơ Hồng",
-        "hibiscus": "Hoa Dâm Bụt",
-        "columbine": "Hoa Huyền Sâm",
-        "desert-rose": "Hoa Sứ",
-        "tree mallow": "Hoa Cẩm Quỳ Cây",
-        "cyclamen": "Hoa Tiên Khách",
-        "watercress": "Hoa Cải Xoong",
-        "canna lily": "Hoa Dong Riềng",
-        "hippeastrum": "Hoa Huệ Tây",
-        "bee balm": "Hoa Bạc Hà Ong",
-        "ball moss": "Rêu Cầu",
-        "foxglove": "Hoa Mao Địa Hoàng",
-        "bougainvillea": "Hoa Giấy",
-        "camellia": "Hoa Trà",
-        "mallow": "Hoa Cẩm Quỳ",
-        "mexican petunia": "Hoa Dạ Yến Thảo Mexico",
-        "bromelia": "Hoa Dứa Cảnh",
-        "blanket flower": "Hoa Cúc Thảm",
-        "trumpet creeper": "Hoa Kèn Hồng",
-        "blackberry lily": "Hoa Lily Dâu Đen",
-        "gerbera": "Hoa Đồng Tiền",
-        "hydrangea": "Hoa Cẩm Tú Cầu",
-    }
-
-    # Tìm tên phù hợp (case-insensitive)
-    english_lower = english_name.lower()
-    for eng_name, vi_name in flower_mapping.items():
-        if eng_name in english_lower:
-            return vi_name
-
-    # Nếu không tìm thấy, capitalize tên gốc
-    return english_name.title()
+    # Không khớp tên nào thì capitalize tên gốc
+    return vietnamese_names.lookup(english_name)
 
 
 if __name__ == "__main__":
@@ -406,8 +648,21 @@ if __name__ == "__main__":
     logger.info(f"Number of flower classes: {len(class_names)}")
     logger.info("API Endpoints:")
     logger.info("  - GET  /health - Health check")
+    logger.info("  - GET  /health/live - Liveness probe")
+    logger.info("  - GET  /health/ready - Readiness probe (model loaded + warm)")
+    logger.info("  - GET  /metrics - Prometheus metrics")
     logger.info("  - POST /predict - Main prediction endpoint")
     logger.info("  - POST /search-by-image - Alternative search endpoint")
+    logger.info("  - POST /search-similar - Sản phẩm có ảnh giống nhất")
+    logger.info("  - POST /predict-batch - Batch prediction (nhiều ảnh)")
+    logger.info(
+        f"Micro-batching: max_batch_size={batcher.max_batch_size}, "
+        f"max_wait_ms={batcher.max_wait * 1000:.1f}"
+    )
+    logger.info(
+        f"Admission control: max_queue_depth={batcher.max_queue_depth}, "
+        f"max_queue_delay_ms={batcher.max_queue_delay * 1000:.0f}"
+    )
     logger.info("Server starting on http://0.0.0.0:8000")
     logger.info("=" * 60)
-    app.run(host="0.0.0.0", port=8000, debug=True)
+    app.run(host="0.0.0.0", port=8000, debug=True, threaded=True)
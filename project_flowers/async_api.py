@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Asyncio Front-End for the Enhanced Flower Recognition API
+Phục vụ /predict, /search-by-image, /health bằng aiohttp; decode ảnh chạy trên thread pool,
+inference chạy trên worker thread riêng của batcher nên upload chậm không giữ inference
+"""
+
+import os
+import asyncio
+import argparse
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web, BodyPartReader
+from PIL import Image
+
+import metrics
+import fast_json
+from metrics import stage
+from image_decode import (
+    preprocess_pixels,
+    UnsupportedImageError,
+    ImageTooLargeError,
+    SUPPORTED_MODES,
+)
+from upload_limits import PREDICT_LIMITS, SEARCH_LIMITS, check_request_size
+from inference_batcher import BatcherOverloadedError
+from enhanced_api import (
+    recognition_system,
+    prediction_cache,
+    build_predict_response,
+    build_search_response,
+    build_health_response,
+    build_readiness_response,
+)
+
+logger = logging.getLogger(__name__)
+
+DECODE_THREADS = int(os.environ.get("FLOWER_DECODE_THREADS", "4"))
+# Kích thước mỗi lần đọc multipart stream
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+decode_executor = ThreadPoolExecutor(
+    max_workers=DECODE_THREADS, thread_name_prefix="image-decode"
+)
+
+
+def decode_and_preprocess(image_bytes, allowed_modes, limits):
+    """Chạy trên decode pool: decode về buffer pixel uint8 224x224"""
+    return preprocess_pixels(image_bytes, allowed_modes=allowed_modes, limits=limits)
+
+
+async def run_prediction(image_bytes, mode, allowed_modes=None, limits=None):
+    """Decode trên thread pool, inference qua batcher"""
+    # Từ chối trước khi decode nếu hàng đợi inference đã quá tải
+    recognition_system.admit()
+    loop = asyncio.get_running_loop()
+    # Chạy trong bản copy context để stage decode/resize ghi vào request hiện tại
+    image_array = await loop.run_in_executor(
+        decode_executor,
+        contextvars.copy_context().run,
+        decode_and_preprocess,
+        image_bytes,
+        allowed_modes,
+        limits,
+    )
+    with stage("inference"):
+        outputs = await asyncio.wrap_future(
+            recognition_system.batcher.submit(image_array)
+        )
+    with stage("rules"):
+        return recognition_system.build_prediction(outputs, mode)
+
+
+def json_response(data, status=200, headers=None):
+    """JSON response qua fast_json (orjson), có đo stage serialize"""
+    with stage("serialize"):
+        return web.Response(
+            body=fast_json.dumps(data),
+            status=status,
+            headers=headers,
+            content_type=fast_json.CONTENT_TYPE,
+        )
+
+
+@web.middleware
+async def request_metrics(request, handler):
+    """Đo latency theo route và thêm header Server-Timing (giống instrument_flask)"""
+    resource = request.match_info.route.resource
+    metrics.begin_request("enhanced", resource.canonical if resource else "unmatched")
+    try:
+        response = await handler(request)
+    except web.HTTPException as e:
+        metrics.end_request(e.status)
+        raise
+    except Exception:
+        metrics.end_request(500)
+        raise
+    header = metrics.end_request(response.status)
+    if header is not None and metrics.SERVER_TIMING:
+        response.headers["Server-Timing"] = header
+    return response
+
+
+async def read_part(part, budget):
+    """Đọc một part theo từng chunk, dừng ngay khi vượt budget byte còn lại"""
+    chunks = []
+    size = 0
+    while True:
+        chunk = await part.read_chunk(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            return b"".join(chunks)
+        size += len(chunk)
+        if size > budget:
+            raise ImageTooLargeError(f"Upload too large (max {budget} bytes)")
+        chunks.append(chunk)
+
+
+async def read_upload(request, field_names, limits):
+    """Đọc multipart dạng stream, trả về (filename, bytes, form) của field ảnh đầu tiên
+    tìm thấy. Tổng số byte đọc được bị chặn bởi limits.max_bytes: upload quá lớn bị
+    từ chối (ImageTooLargeError) ngay khi vượt giới hạn, không đọc hết body."""
+    check_request_size(request.content_length, limits)
+    if not request.content_type.startswith("multipart/"):
+        return None, None, {}
+
+    form = {}
+    uploads = {}
+    budget = limits.max_bytes
+    with stage("multipart"):
+        reader = await request.multipart()
+        async for part in reader:
+            if not isinstance(part, BodyPartReader):
+                continue  # multipart lồng nhau: bỏ qua
+            data = await read_part(part, budget)
+            budget -= len(data)
+            if part.filename is None:
+                form.setdefault(part.name, data.decode(part.get_charset("utf-8")))
+            else:
+                uploads.setdefault(part.name, (part.filename, data))
+
+    for field_name in field_names:
+        if field_name in uploads:
+            filename, data = uploads[field_name]
+            return filename, data, form
+    return None, None, form
+
+
+async def health(request):
+    """Health check endpoint"""
+    return json_response(build_health_response())
+
+
+async def health_live(request):
+    """Liveness: event loop còn phục vụ request"""
+    return json_response({"status": "alive"})
+
+
+async def health_ready(request):
+    """Readiness: model đã load và đã warm-up"""
+    payload, status = build_readiness_response()
+    return json_response(payload, status=status)
+
+
+async def metrics_endpoint(request):
+    """Prometheus metrics"""
+    return web.Response(
+        body=metrics.render().encode("utf-8"),
+        headers={"Content-Type": metrics.CONTENT_TYPE},
+    )
+
+
+async def predict(request):
+    """Enhanced prediction endpoint"""
+    try:
+        filename, image_bytes, form = await read_upload(
+            request, ["file", "image"], PREDICT_LIMITS
+        )
+
+        if image_bytes is None:
+            return json_response(
+                {"success": False, "message": "No image file provided"}, status=400
+            )
+
+        if filename == "":
+            return json_response(
+                {"success": False, "message": "No image file selected"}, status=400
+            )
+
+        mode = form.get("mode", "enhanced")
+        if mode not in ["enhanced", "oxford", "visual"]:
+            mode = "enhanced"
+
+        metrics.set_request_mode(mode)
+        logger.info(f"Processing image: {filename} with mode: {mode}")
+
+        cache_key = prediction_cache.make_key(image_bytes, f"predict:{mode}")
+        cached_response = prediction_cache.get(cache_key)
+        if cached_response is not None:
+            return json_response(cached_response)
+
+        result = await run_prediction(
+            image_bytes, mode, SUPPORTED_MODES, PREDICT_LIMITS
+        )
+
+        response_data = build_predict_response(result, mode)
+        prediction_cache.put(cache_key, response_data)
+
+        return json_response(response_data)
+
+    except UnsupportedImageError as e:
+        logger.warning(str(e))
+        return json_response(
+            {"success": False, "message": e.public_message}, status=e.status
+        )
+    except BatcherOverloadedError as e:
+        logger.warning(str(e))
+        return json_response(
+            {"success": False, "message": e.public_message},
+            status=e.status,
+            headers=e.headers,
+        )
+    except Image.UnidentifiedImageError:
+        logger.warning("Invalid image file - cannot be identified")
+        return json_response(
+            {"success": False, "message": "Invalid image file"}, status=400
+        )
+    except Exception as e:
+        logger.error(f"Error in enhanced prediction: {str(e)}", exc_info=True)
+        return json_response(
+            {"success": False, "message": f"Error processing image: {str(e)}"},
+            status=500,
+        )
+
+
+async def search_by_image(request):
+    """Enhanced search-by-image endpoint for C# service compatibility"""
+    try:
+        filename, image_bytes, _ = await read_upload(
+            request, ["image", "imageFile"], SEARCH_LIMITS
+        )
+
+        if image_bytes is None:
+            return json_response({"error": "No image file"}, status=400)
+
+        if filename == "":
+            return json_response({"error": "No selected file"}, status=400)
+
+        metrics.set_request_mode("enhanced")
+        cache_key = prediction_cache.make_key(image_bytes, "search:enhanced")
+        cached_response = prediction_cache.get(cache_key)
+        if cached_response is not None:
+            return json_response(cached_response)
+
+        result = await run_prediction(
+            image_bytes, "enhanced", SUPPORTED_MODES, SEARCH_LIMITS
+        )
+
+        response_data = build_search_response(result)
+        prediction_cache.put(cache_key, response_data)
+
+        return json_response(response_data)
+
+    except UnsupportedImageError as e:
+        logger.warning(str(e))
+        return json_response({"error": e.public_message}, status=e.status)
+    except BatcherOverloadedError as e:
+        logger.warning(str(e))
+        return json_response(
+            {"error": e.public_message}, status=e.status, headers=e.headers
+        )
+    except Image.UnidentifiedImageError:
+        logger.warning("Invalid image file in search-by-image")
+        return json_response({"error": "Invalid image file"}, status=400)
+    except Exception as e:
+        logger.error(f"Error in enhanced search-by-image: {str(e)}", exc_info=True)
+        return json_response({"error": str(e)}, status=500)
+
+
+def create_app():
+    """Tạo aiohttp application"""
+    # Upload được đọc dạng stream với giới hạn theo endpoint (read_upload);
+    # client_max_size chặn các cách đọc body khác
+    app = web.Application(
+        client_max_size=max(PREDICT_LIMITS.max_bytes, SEARCH_LIMITS.max_bytes),
+        middlewares=[request_metrics],
+    )
+    app.router.add_get("/health", health)
+    app.router.add_get("/health/live", health_live)
+    app.router.add_get("/health/ready", health_ready)
+    app.router.add_get("/metrics", metrics_endpoint)
+    app.router.add_post("/predict", predict)
+    app.router.add_post("/search-by-image", search_by_image)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Async Flower Recognition API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    logger.info("=" * 60)
+    logger.info("Starting Async Enhanced Flower Recognition API")
+    logger.info("=" * 60)
+    logger.info(f"Decode threads: {DECODE_THREADS}")
+    logger.info("API Endpoints:")
+    logger.info("  - GET  /health - Health check")
+    logger.info("  - GET  /health/live - Liveness probe")
+    logger.info("  - GET  /health/ready - Readiness probe (model loaded + warm)")
+    logger.info("  - GET  /metrics - Prometheus metrics")
+    logger.info("  - POST /predict - Enhanced prediction (with mode param)")
+    logger.info("  - POST /search-by-image - Enhanced search (C# compatible)")
+    logger.info(f"Server starting on http://{args.host}:{args.port}")
+    logger.info("=" * 60)
+
+    web.run_app(create_app(), host=args.host, port=args.port, print=None)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark: model.predict vs ServingModel
+Đo overhead mỗi request (batch 1) trước và sau khi dùng serving entry point đã trace,
+gồm cả preprocessing/top-k bằng NumPy so với graph end-to-end nhận uint8
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from model_serving import MODEL_PATH, IMG_SIZE, load_serving_model
+
+
+def time_calls(fn, image_batch, iterations, warmup):
+    """Chạy fn nhiều lần, trả về danh sách thời gian (ms)"""
+    for _ in range(warmup):
+        fn(image_batch)
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(image_batch)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+
+def print_stats(label, timings):
+    print(
+        f"{label:<28} mean={timings.mean():8.2f}ms  "
+        f"p50={np.percentile(timings, 50):8.2f}ms  "
+        f"p95={np.percentile(timings, 95):8.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1)
+    args = parser.parse_args()
+
+    serving_model = load_serving_model(args.model)
+    keras_model = serving_model.keras_model
+
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (args.batch_size, *IMG_SIZE, 3), dtype=np.uint8)
+    image_batch = (pixels / 255.0).astype(np.float32)
+
+    print("=" * 70)
+    print(f"Model: {args.model} | batch size: {args.batch_size}")
+    print(f"Iterations: {args.iterations} (warmup {args.warmup})")
+    print("=" * 70)
+
+    before = time_calls(
+        lambda x: keras_model.predict(x, verbose=0),
+        image_batch,
+        args.iterations,
+        args.warmup,
+    )
+    after = time_calls(serving_model, image_batch, args.iterations, args.warmup)
+
+    def numpy_pipeline(batch):
+        probabilities = serving_model(batch / 255.0)
+        top_5 = np.argsort(probabilities, axis=1)[:, -5:][:, ::-1]
+        top_5_values = np.take_along_axis(probabilities, top_5, axis=1)
+        color_mean = batch.reshape(len(batch), -1, 3).mean(axis=1) / 255.0
+        return top_5_values, color_mean
+
+    numpy_end_to_end = time_calls(numpy_pipeline, pixels, args.iterations, args.warmup)
+    graph_end_to_end = time_calls(
+        serving_model.serve, pixels, args.iterations, args.warmup
+    )
+
+    print_stats("model.predict (before)", before)
+    print_stats("ServingModel (after)", after)
+    print_stats("NumPy pre/post + model", numpy_end_to_end)
+    print_stats("ServingModel.serve (uint8)", graph_end_to_end)
+    print("-" * 70)
+    print(
+        f"Overhead saved per request: {before.mean() - after.mean():.2f}ms "
+        f"({before.mean() / after.mean():.1f}x faster)"
+    )
+
+    # Kết quả phải giống nhau
+    max_diff = np.max(
+        np.abs(keras_model.predict(image_batch, verbose=0) - serving_model(image_batch))
+    )
+    print(f"Max abs difference between outputs: {max_diff:.2e}")
+
+    outputs = serving_model.serve(pixels)
+    top_5_values, color_mean = numpy_pipeline(pixels)
+    print(
+        "serve() vs NumPy: max top-5 difference "
+        f"{np.max(np.abs(outputs['top_k_values'] - top_5_values)):.2e}, "
+        f"max color mean difference {np.max(np.abs(outputs['color_mean'] - color_mean)):.2e}"
+    )
+
+
+if __name__ == "__main__":
+    main()
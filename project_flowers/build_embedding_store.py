@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Build Embedding Store
+Chạy backbone MobileNetV2 (ServingModel.embed) trên ảnh catalog và 8.189 ảnh Oxford,
+ghi embedding float16 + metadata vào một file memory-mapped (embedding_store.py)
+
+Chạy offline, sau khi train hoặc khi catalog thay đổi:
+    python build_embedding_store.py
+    python build_embedding_store.py --catalog-dir ../wwwroot/images --output oxford102_m2_embeddings.store
+
+Các API server tự mở file này (FLOWER_EMBEDDING_STORE) thay vì embed catalog lúc khởi động.
+"""
+
+import os
+import glob
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+import scipy.io as sio
+
+from embedding_store import EMBEDDING_STORE_PATH, write_embedding_store
+from image_decode import preprocess_pixels
+from model_serving import MODEL_PATH, load_serving_model
+from product_search import CATALOG_DIR, CATALOG_URL_PREFIX, CATALOG_EXTENSIONS
+
+
+def load_oxford_files(images_dir, labels_path, setid_path):
+    """(file, nhãn 0-101, split) cho mọi ảnh Oxford, theo thứ tự image_00001..."""
+    files = sorted(glob.glob(os.path.join(images_dir, "*.jpg")))
+    labels = sio.loadmat(labels_path)["labels"].flatten() - 1
+    if len(files) != len(labels):
+        raise ValueError(
+            f"{images_dir} has {len(files)} images but {labels_path} "
+            f"has {len(labels)} labels"
+        )
+
+    splits = [""] * len(files)
+    setid = sio.loadmat(setid_path)
+    for key, split in (("trnid", "trn"), ("valid", "val"), ("tstid", "tst")):
+        for i in setid[key].flatten() - 1:
+            splits[i] = split
+    return files, labels, splits
+
+
+def load_catalog_files(catalog_dir):
+    """Ảnh sản phẩm trong catalog_dir, sắp xếp theo tên"""
+    if not os.path.isdir(catalog_dir):
+        return []
+    return [
+        os.path.join(catalog_dir, name)
+        for name in sorted(os.listdir(catalog_dir))
+        if name.lower().endswith(CATALOG_EXTENSIONS)
+    ]
+
+
+def embed_files(model, files, batch_size):
+    """Embedding (N, dim) cho files; ảnh không đọc được bị bỏ qua.
+    Trả về (embeddings, index của các file hợp lệ)"""
+    embeddings, kept = [], []
+    for start in range(0, len(files), batch_size):
+        pixels = []
+        for i in range(start, min(start + batch_size, len(files))):
+            try:
+                pixels.append(preprocess_pixels(files[i]))
+                kept.append(i)
+            except Exception as e:
+                print(f"⚠️  Skipping {files[i]}: {e}")
+        if pixels:
+            embeddings.append(model.embed(np.stack(pixels)).astype(np.float16))
+        print(f"  {min(start + batch_size, len(files))}/{len(files)}", end="\r")
+    print()
+    if not embeddings:
+        return np.zeros((0, 0), np.float16), kept
+    return np.concatenate(embeddings), kept
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--images-dir", default="images/jpg")
+    parser.add_argument("--labels", default="imagelabels.mat")
+    parser.add_argument("--setid", default="setid.mat")
+    parser.add_argument("--catalog-dir", default=CATALOG_DIR)
+    parser.add_argument("--output", default=EMBEDDING_STORE_PATH)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument(
+        "--skip-oxford", action="store_true", help="Chỉ embed ảnh catalog"
+    )
+    args = parser.parse_args()
+
+    model = load_serving_model(args.model)
+    begin = time.perf_counter()
+
+    sections = {}
+    embeddings, ids, labels, splits = [], [], [], []
+
+    catalog_files = load_catalog_files(args.catalog_dir)
+    print(f"Catalog: {len(catalog_files)} images from {args.catalog_dir}")
+    catalog_embeddings, kept = embed_files(model, catalog_files, args.batch_size)
+    sections["catalog"] = (0, len(kept))
+    embeddings.append(catalog_embeddings)
+    ids += [CATALOG_URL_PREFIX + os.path.basename(catalog_files[i]) for i in kept]
+    labels += [-1] * len(kept)
+    splits += [""] * len(kept)
+
+    if not args.skip_oxford:
+        files, oxford_labels, oxford_splits = load_oxford_files(
+            args.images_dir, args.labels, args.setid
+        )
+        print(f"Oxford: {len(files)} images from {args.images_dir}")
+        oxford_embeddings, kept = embed_files(model, files, args.batch_size)
+        sections["oxford"] = (len(ids), len(ids) + len(kept))
+        embeddings.append(oxford_embeddings)
+        ids += [
+            os.path.relpath(files[i], os.path.dirname(args.images_dir)) for i in kept
+        ]
+        labels += [int(oxford_labels[i]) for i in kept]
+        splits += [oxford_splits[i] for i in kept]
+
+    if not ids:
+        parser.error("No images found")
+    embeddings = np.concatenate([e for e in embeddings if len(e)])
+    size = write_embedding_store(
+        args.output,
+        embeddings,
+        ids,
+        labels,
+        splits,
+        sections,
+        info={
+            "model": os.path.basename(args.model),
+            "backend": model.backend,
+            "catalog_dir": os.path.abspath(args.catalog_dir),
+            "created": datetime.now().isoformat(timespec="seconds"),
+        },
+    )
+
+    print("=" * 70)
+    for name, (start, stop) in sections.items():
+        print(f"{name}: {stop - start} embeddings (rows {start}-{stop})")
+    print(f"Store: {args.output} ({size / 1e6:.1f}MB, {embeddings.shape[1]}-d float16)")
+    print(f"Time: {time.perf_counter() - begin:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
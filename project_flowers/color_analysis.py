@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Color Analysis
+Phân tích màu sắc dùng chung (GUI, improved recognition): lấy mẫu ảnh xuống tối đa
+ANALYSIS_SIZE pixel mỗi cạnh, dựng histogram hue/saturation/value bằng một lần bincount
+rồi suy ra tỉ lệ từng nhóm màu và màu chủ đạo từ histogram đó
+
+Không cần OpenCV: bin HSV của mọi màu RGB (lượng tử hóa RGB_BITS bit mỗi kênh) được
+tính sẵn một lần thành bảng tra, mỗi pixel chỉ còn vài phép dịch bit và một lần tra
+bảng. Hue theo thang của OpenCV (0-179, độ / 2) nên các khoảng hue cũ (đỏ 0-10 và
+170-179, hồng 140-169, vàng 20-30) giữ nguyên ý nghĩa. Thời gian chạy bị chặn bởi
+ANALYSIS_SIZE, không phụ thuộc kích thước ảnh upload.
+"""
+
+import numpy as np
+from PIL import Image
+
+# Số pixel tối đa mỗi cạnh sau khi lấy mẫu (64x64 = 4096 pixel)
+ANALYSIS_SIZE = 64
+
+HUE_BINS = 180
+# Saturation/value (0-255) chia thành bin rộng 32
+SAT_BINS = 8
+VAL_BINS = 8
+# Số bit giữ lại mỗi kênh RGB khi tra bảng HSV (32768 màu)
+RGB_BITS = 5
+
+# Nhóm màu theo khoảng hue (thang OpenCV, đầu mút bao gồm); đỏ nằm ở hai đầu vòng hue
+HUE_RANGES = (
+    ("red", 0, 10),
+    ("orange", 11, 19),
+    ("yellow", 20, 30),
+    ("green", 31, 85),
+    ("blue", 86, 125),
+    ("purple", 126, 139),
+    ("pink", 140, 169),
+    ("red", 170, 179),
+)
+HUE_FAMILIES = ("red", "orange", "yellow", "green", "blue", "purple", "pink")
+# Pixel gần như không có màu (saturation < 32, hoặc value < 32 là black; white khi
+# value >= 192): tách riêng thay vì tính vào hue 0 (đỏ)
+ACHROMATIC = ("white", "gray", "black")
+WHITE_MIN_VAL_BIN = 6
+COLOR_NAMES = HUE_FAMILIES + ACHROMATIC
+
+# Nhóm màu của từng hue bin
+HUE_FAMILY = np.empty(HUE_BINS, np.int8)
+for _name, _low, _high in HUE_RANGES:
+    HUE_FAMILY[_low : _high + 1] = HUE_FAMILIES.index(_name)
+
+
+def downsample(image, max_side=ANALYSIS_SIZE):
+    """Lấy mẫu ảnh (PIL Image hoặc buffer uint8 (H, W, 3)) xuống tối đa max_side mỗi cạnh.
+
+    Lấy mẫu nearest/stride: chỉ đọc các pixel được giữ lại, đủ cho thống kê màu.
+    JPEG chưa decode dùng draft mode (giải mã 1/2, 1/4, 1/8 trong miền DCT) thay vì
+    decode full resolution rồi mới lấy mẫu.
+    """
+    if isinstance(image, Image.Image):
+        # No-op nếu ảnh đã được load hoặc không phải JPEG
+        image.draft("RGB", (max_side, max_side))
+        scale = max_side / max(image.size)
+        if scale < 1:
+            size = (
+                max(1, round(image.width * scale)),
+                max(1, round(image.height * scale)),
+            )
+            image = image.resize(size, Image.Resampling.NEAREST)
+        return np.asarray(image.convert("RGB"), dtype=np.uint8)
+
+    step = -(-max(image.shape[:2]) // max_side)
+    return image[::step, ::step]
+
+
+def rgb_to_hsv(pixels):
+    """Đổi buffer uint8 (..., 3) sang (h, s, v) theo quy ước cv2.COLOR_RGB2HSV:
+    h trong 0-179, s và v trong 0-255 (int)"""
+    rgb = pixels.reshape(-1, 3).astype(np.int32)
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    v = rgb.max(axis=1)
+    diff = v - rgb.min(axis=1)
+    s = np.where(v > 0, (diff * 255 + v // 2) // np.maximum(v, 1), 0)
+
+    # Hue theo độ / 2: 30 * (chênh lệch) / diff, lệch 60 cho G và 120 cho B
+    d = np.maximum(diff, 1)
+    h = np.where(
+        v == r,
+        30.0 * (g - b) / d,
+        np.where(v == g, 60.0 + 30.0 * (b - r) / d, 120.0 + 30.0 * (r - g) / d),
+    )
+    h = np.rint(h).astype(np.int32) % HUE_BINS
+    h[diff == 0] = 0
+    return h, s, v
+
+
+def _hsv_bin_table():
+    """Bin histogram của từng màu RGB đã lượng tử hóa (tính tại tâm mỗi ô màu)"""
+    levels = np.arange(1 << RGB_BITS, dtype=np.uint8)
+    grid = np.stack(np.meshgrid(levels, levels, levels, indexing="ij"), axis=-1)
+    centers = (grid << (8 - RGB_BITS)) + (1 << (7 - RGB_BITS))
+    h, s, v = rgb_to_hsv(centers)
+    bins = (h * SAT_BINS + s * SAT_BINS // 256) * VAL_BINS + v * VAL_BINS // 256
+    return bins.astype(np.int16)
+
+
+RGB_TO_HSV_BIN = _hsv_bin_table()
+
+
+def hsv_histogram(pixels):
+    """Histogram (HUE_BINS, SAT_BINS, VAL_BINS) số pixel, dựng bằng một lần bincount"""
+    rgb = (pixels >> (8 - RGB_BITS)).reshape(-1, 3).astype(np.intp)
+    index = (rgb[:, 0] << (2 * RGB_BITS)) | (rgb[:, 1] << RGB_BITS) | rgb[:, 2]
+    counts = np.bincount(
+        RGB_TO_HSV_BIN[index], minlength=HUE_BINS * SAT_BINS * VAL_BINS
+    )
+    return counts.reshape(HUE_BINS, SAT_BINS, VAL_BINS)
+
+
+def color_ratios(histogram):
+    """Tỉ lệ pixel của từng nhóm màu (COLOR_NAMES), tổng bằng 1.
+
+    black: value bin thấp nhất; white/gray: saturation bin thấp nhất (white từ value
+    bin WHITE_MIN_VAL_BIN); còn lại chia theo nhóm hue.
+    """
+    total = max(int(histogram.sum()), 1)
+    black = histogram[:, :, 0].sum()
+    low_saturation = histogram[:, 0, 1:].sum(axis=0)
+    white = low_saturation[WHITE_MIN_VAL_BIN - 1 :].sum()
+    gray = low_saturation[: WHITE_MIN_VAL_BIN - 1].sum()
+
+    chromatic = histogram[:, 1:, 1:].sum(axis=(1, 2))
+    families = np.bincount(HUE_FAMILY, weights=chromatic, minlength=len(HUE_FAMILIES))
+
+    counts = list(families) + [white, gray, black]
+    return {name: float(count) / total for name, count in zip(COLOR_NAMES, counts)}
+
+
+def analyze_colors(image, max_side=ANALYSIS_SIZE):
+    """Phân tích màu của ảnh: {"color_ratios": {nhóm màu: tỉ lệ}, "dominant_color": nhóm
+    chiếm tỉ lệ lớn nhất}"""
+    ratios = color_ratios(hsv_histogram(downsample(image, max_side)))
+    return {
+        "color_ratios": ratios,
+        "dominant_color": max(ratios, key=ratios.get),
+    }
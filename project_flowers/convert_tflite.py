@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Convert Keras Model to TFLite
+Xuất oxford102_m2_optimized.h5 thành file .tflite cho backend FLOWER_BACKEND=tflite
+
+Graph được export nhận pixel uint8 (N, 224, 224, 3), chuẩn hóa /255 và tính top-k
+ngay trong model, giống ServingModel.serve(); output "embedding" (GAP, chuẩn hóa L2)
+giống ServingModel.embed():
+    python convert_tflite.py
+    python convert_tflite.py --model oxford102_m2_optimized.h5 --output oxford102_m2_optimized.tflite
+"""
+
+import argparse
+import os
+import tempfile
+
+import tensorflow as tf
+
+from model_serving import (
+    MODEL_PATH,
+    TFLITE_MODEL_PATH,
+    IMG_SIZE,
+    TOP_K,
+    embedding_model,
+)
+
+
+def convert(model_path, output_path):
+    """Convert file .h5 và ghi file .tflite, trả về kích thước file (bytes)"""
+    keras_model = tf.keras.models.load_model(model_path)
+    # Một lần chạy backbone cho cả xác suất lẫn embedding GAP
+    joint_model = tf.keras.Model(
+        keras_model.inputs,
+        [keras_model.outputs[0], embedding_model(keras_model).outputs[0]],
+    )
+
+    def serve(images):
+        probabilities, embeddings = joint_model(
+            tf.cast(images, tf.float32) / 255.0, training=False
+        )
+        top_k = tf.math.top_k(probabilities, k=TOP_K)
+        return {
+            "top_k_indices": top_k.indices,
+            "top_k_values": top_k.values,
+            "probabilities": probabilities,
+            "embedding": tf.math.l2_normalize(embeddings, axis=1),
+        }
+
+    # ExportArchive track weights của Keras model; tf.function bọc trực tiếp sẽ
+    # bị converter bỏ mất variables
+    archive = tf.keras.export.ExportArchive()
+    archive.track(joint_model)
+    archive.add_endpoint(
+        "serving_default",
+        serve,
+        input_signature=[
+            tf.TensorSpec(shape=[None, *IMG_SIZE, 3], dtype=tf.uint8, name="images")
+        ],
+    )
+
+    with tempfile.TemporaryDirectory() as export_dir:
+        archive.write_out(export_dir)
+        tflite_model = tf.lite.TFLiteConverter.from_saved_model(export_dir).convert()
+
+    with open(output_path, "wb") as f:
+        f.write(tflite_model)
+    return len(tflite_model)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output", default=TFLITE_MODEL_PATH)
+    args = parser.parse_args()
+
+    size = convert(args.model, args.output)
+    print(f"Keras model:  {args.model} ({os.path.getsize(args.model) / 1e6:.1f}MB)")
+    print(f"TFLite model: {args.output} ({size / 1e6:.1f}MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Embedding Nearest-Neighbor Index
+Tìm ảnh giống nhau theo cosine similarity trên embedding GAP của MobileNetV2
+(ServingModel.embed() trả về vector đã chuẩn hóa L2 nên cosine = tích vô hướng)
+"""
+
+import os
+import threading
+
+import numpy as np
+
+# Loại index cho catalog search: "flat" (chính xác) hoặc "ivfpq" (xấp xỉ, ít RAM)
+INDEX_TYPE = os.environ.get("FLOWER_INDEX_TYPE", "flat")
+IVF_NLIST = int(os.environ.get("FLOWER_IVF_NLIST", "64"))
+IVF_NPROBE = int(os.environ.get("FLOWER_IVF_NPROBE", "8"))
+PQ_SUBVECTORS = int(os.environ.get("FLOWER_PQ_SUBVECTORS", "32"))
+IVF_REFINE_FACTOR = int(os.environ.get("FLOWER_IVF_REFINE_FACTOR", "16"))
+
+
+class EmbeddingIndex:
+    """Brute-force index: một phép nhân ma trận + argpartition cho top-k.
+
+    Với vài nghìn đến vài trăm nghìn vector (catalog sản phẩm) mỗi query chỉ tốn
+    vài ms. add() có thể chạy song song với search() (vd build index nền).
+    """
+
+    def __init__(self, dim, initial_capacity=1024):
+        self.dim = dim
+        self._vectors = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self._ids = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, ids, embeddings):
+        """Thêm các vector (N, dim) với id tương ứng (vd ImageUrl của sản phẩm)"""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        if len(ids) != len(embeddings):
+            raise ValueError(f"Got {len(ids)} ids for {len(embeddings)} embeddings")
+
+        with self._lock:
+            count = len(self._ids)
+            required = count + len(embeddings)
+            if required > len(self._vectors):
+                # Tăng gấp đôi capacity để add từng batch vẫn O(1) amortized
+                capacity = max(required, 2 * len(self._vectors))
+                vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+                vectors[:count] = self._vectors[:count]
+                self._vectors = vectors
+            self._vectors[count:required] = embeddings
+            self._ids.extend(ids)
+
+    def search(self, queries, k=10, nprobe=None):
+        """Trả về danh sách (id, similarity) giảm dần cho mỗi query (M, dim).
+
+        nprobe chỉ có để cùng interface với IVFPQIndex (index flat quét toàn bộ).
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            count = len(self._ids)
+            vectors = self._vectors[:count]
+            ids = self._ids[:count]
+
+        k = min(k, count)
+        if k == 0:
+            return [[] for _ in queries]
+
+        scores = queries @ vectors.T
+        if k < count:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(count), (len(queries), count))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [(ids[i], float(score)) for i, score in zip(row, row_scores)]
+            for row, row_scores in zip(top, top_scores)
+        ]
+
+    def save(self, path):
+        """Ghi index ra file .npz"""
+        with self._lock:
+            count = len(self._ids)
+            np.savez(
+                path,
+                vectors=self._vectors[:count],
+                ids=np.array(self._ids, dtype=str),
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Đọc index đã ghi bằng save()"""
+        with np.load(path) as data:
+            vectors = data["vectors"]
+            index = cls(vectors.shape[1], initial_capacity=max(1, len(vectors)))
+            index.add(data["ids"].tolist(), vectors)
+        return index
+
+
+def _squared_distances(vectors, centroids):
+    """Khoảng cách L2 bình phương (N, K) giữa vectors và centroids"""
+    return (
+        np.einsum("ij,ij->i", vectors, vectors)[:, np.newaxis]
+        - 2.0 * vectors @ centroids.T
+        + np.einsum("ij,ij->i", centroids, centroids)[np.newaxis, :]
+    )
+
+
+def _assign(vectors, centroids, chunk_size=4096):
+    """Index centroid gần nhất cho mỗi vector (chia chunk để giới hạn RAM)"""
+    return np.concatenate(
+        [
+            np.argmin(_squared_distances(vectors[i : i + chunk_size], centroids), 1)
+            for i in range(0, len(vectors), chunk_size)
+        ]
+    )
+
+
+def kmeans(vectors, n_clusters, n_iter=20, seed=0):
+    """K-means (Lloyd) bằng NumPy, trả về centroids (n_clusters, dim) float32"""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = _assign(vectors, centroids)
+        counts = np.bincount(labels, minlength=n_clusters)
+        non_empty = counts > 0
+        # Tổng theo cluster: sắp xếp theo label rồi cộng từng đoạn liên tiếp
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[non_empty]
+        sums = np.add.reduceat(vectors[np.argsort(labels, kind="stable")], starts)
+        centroids[non_empty] = sums / counts[non_empty, np.newaxis]
+        # Cluster rỗng: lấy lại một vector ngẫu nhiên
+        empty = np.flatnonzero(~non_empty)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty))]
+    return centroids
+
+
+class IVFPQIndex:
+    """Index xấp xỉ: inverted file (k-means coarse quantizer) + product quantization.
+
+    Mỗi vector chỉ lưu danh sách (cluster) và m byte code của residual
+    (vector - centroid), 16 byte thay vì 5120 byte float32 với dim=1280, m=16.
+    Search chỉ quét nprobe cluster gần query nhất; similarity (tích vô hướng)
+    = q·centroid + tổng lookup table q_j·codebook_j của từng subvector.
+
+    Cùng interface với EmbeddingIndex (add/search/save/load/len). Các vector add
+    trước khi đủ train_size được giữ nguyên và tìm chính xác; khi đủ, index tự
+    train rồi encode toàn bộ, các lần add sau được encode ngay.
+
+    refine_vectors (tùy chọn): mảng (N, dim) theo thứ tự add, vd np.memmap trên
+    đĩa; khi có, k * refine_factor ứng viên theo điểm PQ được tính lại chính xác.
+    Vector add sau khi gán refine_vectors được nối thêm (bản copy trong RAM).
+    """
+
+    def __init__(
+        self,
+        dim,
+        nlist=IVF_NLIST,
+        m=PQ_SUBVECTORS,
+        nprobe=IVF_NPROBE,
+        train_size=None,
+        ksub=256,
+        refine_vectors=None,
+        refine_factor=IVF_REFINE_FACTOR,
+    ):
+        if dim % m:
+            raise ValueError(f"dim={dim} is not divisible by m={m}")
+        self.dim = dim
+        self.nlist = nlist
+        self.m = m
+        self.ksub = ksub
+        self.nprobe = nprobe
+        self.train_size = train_size or max(ksub, 39 * nlist)
+        self.refine_vectors = refine_vectors
+        self.refine_factor = refine_factor
+
+        self.coarse_centroids = None  # (nlist, dim)
+        self.codebooks = None  # (m, ksub, dim // m)
+        self._list_codes = [np.zeros((m, 0), np.uint8) for _ in range(nlist)]
+        self._list_rows = [np.zeros(0, np.int64) for _ in range(nlist)]
+        self._list_sizes = [0] * nlist
+        self._pending = []  # vector chưa train, (N, dim)
+        self._ids = []
+        self._lock = threading.Lock()  # bảo vệ dữ liệu, giữ ngắn
+        self._add_lock = threading.Lock()  # tuần tự hóa add/train (encode ngoài _lock)
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def trained(self):
+        return self.coarse_centroids is not None
+
+    def _fit(self, vectors):
+        """Coarse centroids (nlist, dim) và codebook PQ (m, ksub, dim // m)"""
+        # K-means chỉ cần vài chục điểm mỗi centroid: train trên mẫu ngẫu nhiên
+        max_train = 40 * max(self.nlist, self.ksub)
+        if len(vectors) > max_train:
+            rng = np.random.default_rng(0)
+            vectors = vectors[rng.choice(len(vectors), max_train, replace=False)]
+        coarse_centroids = kmeans(vectors, min(self.nlist, len(vectors)))
+        residuals = vectors - coarse_centroids[_assign(vectors, coarse_centroids)]
+        dsub = self.dim // self.m
+        codebooks = np.stack(
+            [
+                kmeans(
+                    residuals[:, j * dsub : (j + 1) * dsub],
+                    min(self.ksub, len(vectors)),
+                    seed=j,
+                )
+                for j in range(self.m)
+            ]
+        )
+        return coarse_centroids, codebooks
+
+    def _encode(self, vectors, coarse_centroids, codebooks):
+        """List của mỗi vector (N,) và code PQ theo cột (m, N)"""
+        lists = _assign(vectors, coarse_centroids)
+        residuals = vectors - coarse_centroids[lists]
+        dsub = self.dim // self.m
+        codes = np.stack(
+            [
+                _assign(residuals[:, j * dsub : (j + 1) * dsub], codebooks[j])
+                for j in range(self.m)
+            ]
+        ).astype(np.uint8)
+        return lists, codes
+
+    def _append_codes(self, rows, lists, codes):
+        for list_id in np.unique(lists):
+            selected = lists == list_id
+            size = self._list_sizes[list_id]
+            required = size + int(selected.sum())
+            if required > len(self._list_rows[list_id]):
+                capacity = max(required, 2 * len(self._list_rows[list_id]), 16)
+                list_codes = np.zeros((self.m, capacity), np.uint8)
+                list_rows = np.zeros(capacity, np.int64)
+                list_codes[:, :size] = self._list_codes[list_id][:, :size]
+                list_rows[:size] = self._list_rows[list_id][:size]
+                self._list_codes[list_id] = list_codes
+                self._list_rows[list_id] = list_rows
+            self._list_codes[list_id][:, size:required] = codes[:, selected]
+            self._list_rows[list_id][size:required] = rows[selected]
+            self._list_sizes[list_id] = required
+
+    def _train_locked(self, vectors):
+        """Train từ vectors rồi encode các vector đang chờ (giữ _add_lock)"""
+        coarse_centroids, codebooks = self._fit(vectors)
+        with self._lock:
+            pending = (
+                np.concatenate(self._pending)
+                if self._pending
+                else np.zeros((0, self.dim), np.float32)
+            )
+        lists, codes = self._encode(pending, coarse_centroids, codebooks)
+
+        # Chuyển sang trạng thái đã train trong một lần giữ lock: search không bao
+        # giờ thấy index đã train mà thiếu các vector đang chờ
+        with self._lock:
+            self.nlist = len(coarse_centroids)
+            self._list_codes = [np.zeros((self.m, 0), np.uint8)] * self.nlist
+            self._list_rows = [np.zeros(0, np.int64)] * self.nlist
+            self._list_sizes = [0] * self.nlist
+            self._append_codes(np.arange(len(pending)), lists, codes)
+            self.coarse_centroids = coarse_centroids
+            self.codebooks = codebooks
+            self._pending = []
+
+    def train(self, vectors):
+        """Học coarse centroids và codebook PQ từ mẫu vectors (N, dim), thay vì
+        chờ add() đủ train_size vector"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._add_lock:
+            self._train_locked(vectors)
+
+    def add(self, ids, embeddings):
+        """Thêm các vector (N, dim) với id tương ứng"""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        if len(ids) != len(embeddings):
+            raise ValueError(f"Got {len(ids)} ids for {len(embeddings)} embeddings")
+
+        with self._add_lock:
+            if not self.trained:
+                with self._lock:
+                    self._extend_refine(embeddings)
+                    self._pending.append(embeddings)
+                    self._ids.extend(ids)
+                    if len(self._ids) < self.train_size:
+                        return
+                    pending = np.concatenate(self._pending)
+                self._train_locked(pending)
+                return
+
+            lists, codes = self._encode(
+                embeddings, self.coarse_centroids, self.codebooks
+            )
+            with self._lock:
+                self._extend_refine(embeddings)
+                rows = np.arange(len(self._ids), len(self._ids) + len(embeddings))
+                self._append_codes(rows, lists, codes)
+                self._ids.extend(ids)
+
+    def _extend_refine(self, embeddings):
+        """Nối các vector sắp add vào refine_vectors (giữ _lock, gọi trước khi thêm
+        ids) để row nào cũng có vector rerank; bỏ qua phần refine_vectors đã có sẵn
+        (vd memmap của store được gán trước khi add)"""
+        if self.refine_vectors is None:
+            return
+        total = len(self._ids) + len(embeddings)
+        missing = total - len(self.refine_vectors)
+        if missing <= 0:
+            return
+        if missing > len(embeddings):
+            raise ValueError(
+                f"refine_vectors has {len(self.refine_vectors)} rows, "
+                f"index would have {total} vectors"
+            )
+        self.refine_vectors = np.concatenate(
+            [
+                self.refine_vectors,
+                embeddings[-missing:].astype(self.refine_vectors.dtype),
+            ]
+        )
+
+    def _search_pending(self, queries, k, pending, ids):
+        scores = queries @ pending.T
+        top = np.argsort(-scores, axis=1)[:, :k]
+        return [
+            [(ids[i], float(row_scores[i])) for i in row]
+            for row, row_scores in zip(top, scores)
+        ]
+
+    def search(self, queries, k=10, nprobe=None):
+        """Trả về danh sách (id, similarity xấp xỉ) giảm dần cho mỗi query (M, dim).
+
+        nprobe: số cluster được quét (mặc định self.nprobe); lớn hơn thì recall
+        cao hơn nhưng chậm hơn, nprobe = nlist tương đương quét toàn bộ code.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            ids = self._ids[:]
+            refine_vectors = self.refine_vectors
+            if not self.trained:
+                pending = (
+                    np.concatenate(self._pending)
+                    if self._pending
+                    else np.zeros((0, self.dim), np.float32)
+                )
+                return self._search_pending(queries, min(k, len(ids)), pending, ids)
+            coarse_centroids, codebooks = self.coarse_centroids, self.codebooks
+            lists = [
+                (self._list_codes[i][:, :size], self._list_rows[i][:size])
+                for i, size in enumerate(self._list_sizes)
+            ]
+
+        nprobe = min(nprobe or self.nprobe, len(coarse_centroids))
+        coarse_scores = queries @ coarse_centroids.T
+        probe = np.argsort(-coarse_scores, axis=1)[:, :nprobe]
+        dsub = self.dim // self.m
+
+        results = []
+        for query, query_probe, query_coarse in zip(queries, probe, coarse_scores):
+            # Lookup table (m, ksub): tích vô hướng từng subvector với codebook
+            lut = np.einsum("jd,jkd->jk", query.reshape(self.m, dsub), codebooks)
+            probed = [lists[list_id] for list_id in query_probe]
+            rows = np.concatenate([list_rows for _, list_rows in probed])
+            if not len(rows):
+                results.append([])
+                continue
+
+            # Code lưu theo cột (m, n): mỗi subvector là một lần take liên tục
+            codes = np.concatenate([list_codes for list_codes, _ in probed], axis=1)
+            scores = np.repeat(
+                query_coarse[query_probe], [len(list_rows) for _, list_rows in probed]
+            )
+            for j in range(self.m):
+                scores += lut[j].take(codes[j])
+
+            if refine_vectors is not None:
+                scores, rows = self._refine(query, scores, rows, k, refine_vectors)
+            top_k = min(k, len(scores))
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            top = top[np.argsort(-scores[top])]
+            results.append([(ids[rows[i]], float(scores[i])) for i in top])
+        return results
+
+    def _refine(self, query, scores, rows, k, refine_vectors):
+        """Tính lại similarity chính xác cho các ứng viên tốt nhất theo PQ"""
+        count = min(k * self.refine_factor, len(scores))
+        candidates = np.sort(
+            rows[np.argpartition(-scores, count - 1)[:count]]
+        )  # đọc memmap theo thứ tự tăng dần
+        vectors = np.asarray(refine_vectors[candidates], dtype=np.float32)
+        return vectors @ query, candidates
+
+    def save(self, path):
+        """Ghi index ra file .npz (centroids, codebook, code theo list, ids,
+        refine_vectors nếu có)"""
+        with self._lock:
+            arrays = {
+                "ids": np.array(self._ids, dtype=str),
+                "params": np.array(
+                    [
+                        self.dim,
+                        self.nlist,
+                        self.m,
+                        self.ksub,
+                        self.nprobe,
+                        self.train_size,
+                    ]
+                ),
+                "pending": (
+                    np.concatenate(self._pending)
+                    if self._pending
+                    else np.zeros((0, self.dim), np.float32)
+                ),
+            }
+            if self.trained:
+                arrays["coarse_centroids"] = self.coarse_centroids
+                arrays["codebooks"] = self.codebooks
+                arrays["list_sizes"] = np.array(self._list_sizes)
+                arrays["codes"] = np.concatenate(
+                    [c[:, :n] for c, n in zip(self._list_codes, self._list_sizes)],
+                    axis=1,
+                )
+                arrays["rows"] = np.concatenate(
+                    [r[:n] for r, n in zip(self._list_rows, self._list_sizes)]
+                )
+            if self.refine_vectors is not None:
+                arrays["refine_vectors"] = np.asarray(self.refine_vectors)
+            np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Đọc index đã ghi bằng save()"""
+        with np.load(path) as data:
+            dim, nlist, m, ksub, nprobe, train_size = data["params"].tolist()
+            index = cls(dim, nlist, m, nprobe, train_size, ksub)
+            index._ids = data["ids"].tolist()
+            if len(data["pending"]):
+                index._pending = [data["pending"]]
+            if "refine_vectors" in data:
+                index.refine_vectors = data["refine_vectors"]
+            if "coarse_centroids" in data:
+                index.coarse_centroids = data["coarse_centroids"]
+                index.codebooks = data["codebooks"]
+                offsets = np.concatenate([[0], np.cumsum(data["list_sizes"])])
+                codes, rows = data["codes"], data["rows"]
+                for i in range(nlist):
+                    index._list_codes[i] = codes[:, offsets[i] : offsets[i + 1]].copy()
+                    index._list_rows[i] = rows[offsets[i] : offsets[i + 1]].copy()
+                    index._list_sizes[i] = int(offsets[i + 1] - offsets[i])
+        return index
+
+
+def create_index(dim, index_type=None):
+    """Index rỗng theo FLOWER_INDEX_TYPE (flat|ivfpq)"""
+    index_type = index_type or INDEX_TYPE
+    if index_type == "flat":
+        return EmbeddingIndex(dim)
+    if index_type == "ivfpq":
+        return IVFPQIndex(dim)
+    raise ValueError(f"Unknown index type: {index_type}")
+
+
+def load_index(path):
+    """Đọc file .npz ghi bởi EmbeddingIndex.save() hoặc IVFPQIndex.save()"""
+    with np.load(path) as data:
+        index_class = IVFPQIndex if "params" in data else EmbeddingIndex
+    return index_class.load(path)
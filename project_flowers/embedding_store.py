@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Memory-Mapped Embedding Store
+Một file chứa embedding float16 + metadata (id, nhãn, split), worker mở read-only bằng mmap
+
+File được ghi offline bởi build_embedding_store.py. Worker chỉ đọc header rồi map các
+mảng, nên thời gian khởi động không phụ thuộc số ảnh; các worker gunicorn dùng chung
+page cache của file thay vì mỗi process giữ một bản copy.
+
+Layout:
+    STORE_MAGIC | uint32 độ dài header | header JSON | padding | các mảng (căn 64 byte)
+"""
+
+import os
+import json
+import struct
+
+import numpy as np
+
+STORE_MAGIC = b"FLOWEREMB\x01"
+STORE_ALIGNMENT = 64
+EMBEDDING_STORE_PATH = os.environ.get(
+    "FLOWER_EMBEDDING_STORE", "oxford102_m2_embeddings.store"
+)
+
+
+def _align(offset):
+    return -(-offset // STORE_ALIGNMENT) * STORE_ALIGNMENT
+
+
+def write_embedding_store(path, embeddings, ids, labels, splits, sections, info=None):
+    """Ghi store ra path (ghi file tạm rồi os.replace, worker đang map file cũ
+    không bị ảnh hưởng).
+
+    sections: {"catalog": (start, stop), "oxford": (start, stop)}, mỗi nguồn ảnh
+    là một đoạn hàng liên tiếp
+    """
+    arrays = {
+        "embeddings": np.ascontiguousarray(embeddings, dtype=np.float16),
+        "ids": np.array([i.encode("utf-8") for i in ids], dtype=np.bytes_),
+        "labels": np.asarray(labels, dtype=np.int16),
+        "splits": np.array([s.encode("utf-8") for s in splits], dtype=np.bytes_),
+    }
+    count = len(arrays["embeddings"])
+    if any(len(array) != count for array in arrays.values()):
+        raise ValueError("embeddings, ids, labels and splits must have equal length")
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset = _align(offset + array.nbytes)
+
+    header = json.dumps(
+        {
+            "count": count,
+            "dim": int(arrays["embeddings"].shape[1]) if count else 0,
+            "arrays": layout,
+            "sections": {name: list(bounds) for name, bounds in sections.items()},
+            "info": info or {},
+        }
+    ).encode("utf-8")
+    data_start = _align(len(STORE_MAGIC) + 4 + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(STORE_MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+class EmbeddingStore:
+    """Store đã ghi bởi write_embedding_store(), các mảng là np.memmap read-only"""
+
+    def __init__(self, path=EMBEDDING_STORE_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(STORE_MAGIC)) != STORE_MAGIC:
+                raise ValueError(f"Not an embedding store: {path}")
+            (header_length,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_length))
+        data_start = _align(len(STORE_MAGIC) + 4 + header_length)
+
+        self.dim = header["dim"]
+        self.sections = {name: tuple(b) for name, b in header["sections"].items()}
+        self.info = header["info"]
+        self._arrays = {}
+        for name, spec in header["arrays"].items():
+            shape = tuple(spec["shape"])
+            if 0 in shape:
+                self._arrays[name] = np.zeros(shape, dtype=spec["dtype"])
+            else:
+                self._arrays[name] = np.memmap(
+                    path,
+                    dtype=spec["dtype"],
+                    mode="r",
+                    offset=data_start + spec["offset"],
+                    shape=shape,
+                )
+
+    def __len__(self):
+        return len(self._arrays["ids"])
+
+    @property
+    def embeddings(self):
+        """(N, dim) float16, chuẩn hóa L2 như ServingModel.embed()"""
+        return self._arrays["embeddings"]
+
+    @property
+    def labels(self):
+        """Class index Oxford (0-101), -1 với ảnh catalog"""
+        return self._arrays["labels"]
+
+    def id_at(self, row):
+        return self._arrays["ids"][row].decode("utf-8")
+
+    def split_at(self, row):
+        return self._arrays["splits"][row].decode("utf-8")
+
+    def section(self, name):
+        """(start, stop) của một nguồn ảnh, (0, 0) nếu store không có"""
+        return self.sections.get(name, (0, 0))
+
+    def index(self, section):
+        """Index read-only trên các hàng của section, không copy dữ liệu"""
+        start, stop = self.section(section)
+        return MemmapIndex(
+            self._arrays["embeddings"][start:stop], self._arrays["ids"][start:stop]
+        )
+
+
+class MemmapIndex:
+    """Brute-force cosine search trực tiếp trên embedding float16 memmap.
+
+    Cùng interface search() với EmbeddingIndex; mỗi lần search đổi từng chunk sang
+    float32 để dùng BLAS, nên RAM cố định theo CHUNK_ROWS thay vì theo số vector.
+    """
+
+    CHUNK_ROWS = 8192
+
+    def __init__(self, vectors, ids):
+        self.vectors = vectors
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries, k=10, nprobe=None):
+        """Trả về danh sách (id, similarity) giảm dần cho mỗi query (M, dim)"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(
+            -1, self.vectors.shape[1]
+        )
+        k = min(k, len(self.vectors))
+        if k == 0:
+            return [[] for _ in queries]
+
+        best_scores, best_rows = [], []
+        for start in range(0, len(self.vectors), self.CHUNK_ROWS):
+            chunk = np.asarray(
+                self.vectors[start : start + self.CHUNK_ROWS], dtype=np.float32
+            )
+            scores = queries @ chunk.T
+            top = np.argpartition(-scores, min(k, len(chunk)) - 1, axis=1)[:, :k]
+            best_scores.append(np.take_along_axis(scores, top, axis=1))
+            best_rows.append(top + start)
+
+        scores = np.concatenate(best_scores, axis=1)
+        rows = np.concatenate(best_rows, axis=1)
+        order = np.argsort(-scores, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, order, axis=1)
+        rows = np.take_along_axis(rows, order, axis=1)
+        return [
+            [
+                (self.ids[row].decode("utf-8"), float(score))
+                for row, score in zip(row_ids, row_scores)
+            ]
+            for row_ids, row_scores in zip(rows, scores)
+        ]
@@ -6,14 +6,39 @@ API service cải tiến với multiple analysis modes và accuracy cao hơn
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import tensorflow as tf
 import numpy as np
 from PIL import Image
-import io
 import os
 import logging
 from datetime import datetime
 
+from image_decode import (
+    preprocess_pixels,
+    channel_means,
+    UnsupportedImageError,
+    SUPPORTED_MODES,
+)
+from upload_limits import (
+    install_flask_limits,
+    PREDICT_LIMITS,
+    SEARCH_LIMITS,
+    SIMILAR_LIMITS,
+    BATCH_LIMITS,
+)
+from inference_batcher import shared_batcher, BatcherOverloadedError
+from model_serving import load_serving_model
+from prediction_cache import PredictionCache
+from flower_names import VietnameseNameTable
+from enhancement_rules import EnhancementRules, REASONS, RULE_NAMES, KEEP
+from fast_json import FastJSONProvider
+import metrics
+from metrics import stage
+from product_search import (
+    shared_catalog_search,
+    parse_search_k,
+    parse_search_nprobe,
+)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -21,13 +46,54 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 
+# Bảng tên cho kết quả enhanced; khi nhiều key cùng khớp, key đứng trước được chọn
+VIETNAMESE_NAMES = {
+    "tulip": "Hoa Tulip",
+    "rose": "Hoa Hồng",
+    "sunflower": "Hoa Hướng Dương",
+    "lily": "Hoa Lily",
+    "orchid": "Hoa Lan",
+    "carnation": "Hoa Cẩm Chướng",
+    "daffodil": "Hoa Thủy Tiên",
+    "iris": "Hoa Diên Vĩ",
+    "dahlia": "Hoa Thược Dược",
+    "magnolia": "Hoa Mộc Lan",
+    "marigold": "Hoa Vạn Thọ",
+    "poppy": "Hoa Anh Túc",
+    "lotus": "Hoa Sen",
+    "daisy": "Hoa Cúc",
+    "peony": "Hoa Mẫu Đơn",
+    "cherry blossom": "Hoa Anh Đào",
+    "jasmine": "Hoa Nhài",
+    "hibiscus": "Hoa Dâm Bụt",
+    "azalea": "Hoa Đỗ Quyên",
+    "camellia": "Hoa Trà",
+    "petunia": "Hoa Dạ Yến Thảo",
+    "geranium": "Hoa Phong Lữ",
+    "bougainvillea": "Hoa Giấy",
+    "morning glory": "Hoa Bìm Bìm",
+    "cyclamen": "Hoa Tiên Khách",
+    "cape flower": "Hoa Mũi Cape",
+    "hippeastrum": "Hoa Huệ Tây",
+    "buttercup": "Hoa Mao Lương",
+}
+
+
 class EnhancedFlowerRecognitionAPI:
     def __init__(self):
         self.oxford_model = None
+        self.batcher = None
+        self.embed_batcher = None
+        self.catalog_search = None
         self.class_names = self.load_class_names()
+        # Tên tiếng Việt theo class id tính sẵn, tên từ rules được memoize
+        self.vietnamese_names = VietnameseNameTable(VIETNAMESE_NAMES, self.class_names)
+        # Enhancement rules compile thành mask/bảng theo class id một lần
+        self.rules = EnhancementRules(self.class_names)
         self.load_model()
 
     def load_class_names(self):
@@ -140,25 +206,39 @@ class EnhancedFlowerRecognitionAPI:
     def load_model(self):
         """Load Oxford Flowers model"""
         try:
-            model_path = "oxford102_m2_optimized.h5"
-            if not os.path.exists(model_path):
-                logger.error(f"Model file not found: {model_path}")
-                return
-
-            self.oxford_model = tf.keras.models.load_model(model_path)
-            logger.info("Enhanced recognition model loaded successfully!")
+            # Backend keras/tflite theo FLOWER_BACKEND
+            self.oxford_model = load_serving_model(
+                "oxford102_m2_optimized.h5", warm_up=True
+            )
+            self.batcher = shared_batcher(self.oxford_model.serve)
+            self.embed_batcher = shared_batcher(self.oxford_model.embed)
+            # Index embedding ảnh sản phẩm cho /search-similar (build nền)
+            self.catalog_search = shared_catalog_search(self.oxford_model)
+            self.catalog_search.start()
+            logger.info(
+                f"Enhanced recognition model loaded successfully! "
+                f"(backend: {self.oxford_model.backend})"
+            )
 
         except Exception as e:
             logger.error(f"Failed to load model: {str(e)}")
 
-    def analyze_color_features(self, image):
-        """Phân tích đặc điểm màu sắc với độ chính xác cao hơn"""
-        img_array = np.array(image)
+    def search_similar(self, pixels, k, nprobe=None):
+        """Sản phẩm có ảnh giống nhất với ảnh uint8 224x224 đã preprocess"""
+        with stage("inference"):
+            embedding = self.embed_batcher.predict(pixels)
+        with stage("search"):
+            return self.catalog_search.search(embedding, k, nprobe)
+
+    def analyze_color_features(self, pixels):
+        """Phân tích đặc điểm màu sắc từ buffer uint8 224x224 đã preprocess"""
+        return self.color_features_from_means(*channel_means(pixels))
 
-        # RGB color analysis
-        red_ratio = np.mean(img_array[:, :, 0]) / 255.0
-        green_ratio = np.mean(img_array[:, :, 1]) / 255.0
-        blue_ratio = np.mean(img_array[:, :, 2]) / 255.0
+    def color_features_from_means(self, red_ratio, green_ratio, blue_ratio):
+        """Dựng color features từ trung bình từng kênh RGB (trong [0, 1])"""
+        red_ratio = float(red_ratio)
+        green_ratio = float(green_ratio)
+        blue_ratio = float(blue_ratio)
 
         # Advanced color classification
         dominant_color = self.classify_dominant_color_advanced(
@@ -248,210 +328,131 @@ class EnhancedFlowerRecognitionAPI:
 
         return confidence
 
-    def apply_enhancement_rules(self, flower_name, confidence, color_features):
-        """Áp dụng enhancement rules mạnh mẽ hơn để cải thiện accuracy"""
-        enhanced_name = flower_name
-        enhanced_confidence = confidence
-        enhancement_reason = "oxford_model"
-
-        # Get color info
-        dominant_color = color_features["dominant_color"]
-        color_confidence = color_features.get("color_confidence", 0.5)
-
-        # AGGRESSIVE RULE 1: Rose Detection
-        if (
-            dominant_color in ["red", "deep_red", "pink"] and color_confidence > 0.4
-        ) or (dominant_color == "mixed" and color_features.get("red_ratio", 0) > 0.35):
-            # Common Oxford misclassifications for roses
-            rose_indicators = [
-                "ball moss",
-                "bromelia",
-                "blanket flower",
-                "trumpet creeper",
-                "cyclamen",
-                "cape flower",
-                "hippeastrum",
-                "lenten rose",
-                "carnation",
-                "sweet william",
-                "geranium",
-                "passion flower",  # Added from test
-            ]
-
-            if any(indicator in flower_name.lower() for indicator in rose_indicators):
-                enhanced_name = "Hoa Hồng"
-                enhanced_confidence = min(0.85, max(0.7, color_confidence * 1.8))
-                enhancement_reason = "aggressive_rose_rule"
-                logger.info(
-                    f"AGGRESSIVE ROSE: {flower_name} -> Hoa Hồng (color: {dominant_color}, conf: {color_confidence:.3f})"
-                )
+    def enhanced_predict(self, pixels, mode="enhanced"):
+        """Enhanced prediction với multiple modes.
 
-        # AGGRESSIVE RULE 2: Sunflower/Yellow Daisy Detection
-        elif dominant_color in ["yellow", "bright_yellow"] and color_confidence > 0.5:
-            # Oxford often misclassifies yellow flowers
-            yellow_indicators = [
-                "prince of wales feathers",
-                "ball moss",
-                "blanket flower",
-                "trumpet creeper",
-                "english marigold",
-                "buttercup",
-                "corn poppy",
-                "gazania",
-                "osteospermum",
-            ]
+        pixels là buffer uint8 224x224 từ preprocess_pixels(); model input và
+        color features đều đọc từ buffer này.
+        """
+        if not self.oxford_model:
+            raise Exception("Model not loaded")
 
-            if any(indicator in flower_name.lower() for indicator in yellow_indicators):
-                if (
-                    color_features.get("red_ratio", 0) > 0.7
-                ):  # High red+yellow = sunflower
-                    enhanced_name = "sunflower"
-                    enhanced_confidence = min(0.90, color_confidence * 1.8)
-                    enhancement_reason = "aggressive_sunflower_rule"
-                else:  # Pure yellow = daisy
-                    enhanced_name = "oxeye daisy"
-                    enhanced_confidence = min(0.80, color_confidence * 1.6)
-                    enhancement_reason = "aggressive_daisy_rule"
-                logger.info(f"AGGRESSIVE YELLOW: {flower_name} -> {enhanced_name}")
-
-        # AGGRESSIVE RULE 3: Tulip Detection (Enhanced)
-        elif dominant_color in ["red", "pink", "deep_red"] and color_confidence > 0.4:
-            tulip_indicators = [
-                "cyclamen",
-                "cape flower",
-                "hippeastrum",
-                "lenten rose",
-                "desert-rose",
-                "ball moss",
-                "trumpet creeper",
-            ]
+        # Oxford prediction + thống kê màu (gom batch với các request đồng thời)
+        with stage("inference"):
+            outputs = self.batcher.predict(pixels)
 
-            if any(indicator in flower_name.lower() for indicator in tulip_indicators):
-                enhanced_name = "tulip"
-                enhanced_confidence = min(0.88, color_confidence * 2.0)
-                enhancement_reason = "aggressive_tulip_rule"
-                logger.info(f"AGGRESSIVE TULIP: {flower_name} -> tulip")
-
-        # AGGRESSIVE RULE 4: White Flower Detection
-        elif dominant_color == "white" and color_confidence > 0.6:
-            white_indicators = ["ball moss", "watercress", "blanket flower"]
-
-            if any(indicator in flower_name.lower() for indicator in white_indicators):
-                enhanced_name = "oxeye daisy"  # Default white flower
-                enhanced_confidence = min(0.75, color_confidence * 1.4)
-                enhancement_reason = "aggressive_white_rule"
-
-        # RULE 5: Very Low Confidence Override
-        elif confidence < 0.15:
-            # When Oxford is very uncertain, use pure color-based prediction
-            if dominant_color in ["red", "deep_red"]:
-                enhanced_name = "rose"
-                enhanced_confidence = min(0.70, color_confidence * 1.2)
-                enhancement_reason = "low_confidence_color_override"
-            elif dominant_color in ["yellow", "bright_yellow"]:
-                enhanced_name = "sunflower"
-                enhanced_confidence = min(0.75, color_confidence * 1.3)
-                enhancement_reason = "low_confidence_color_override"
-            elif dominant_color == "pink":
-                enhanced_name = "rose"
-                enhanced_confidence = min(0.65, color_confidence * 1.1)
-                enhancement_reason = "low_confidence_color_override"
+        with stage("rules"):
+            return self.build_prediction(outputs, mode)
 
-            logger.info(
-                f"LOW CONFIDENCE OVERRIDE: {flower_name} -> {enhanced_name} (original: {confidence:.3f})"
-            )
+    def admit(self, count=1):
+        """Raise BatcherOverloadedError nếu hàng đợi inference đã quá tải (gọi trước
+        khi decode để request bị từ chối không tốn thời gian decode)"""
+        if self.batcher is not None:
+            self.batcher.admit(count)
 
-        # RULE 6: Boost existing good predictions
-        elif confidence > 0.3:
-            if "rose" in flower_name.lower() and dominant_color in ["red", "pink"]:
-                enhanced_confidence = min(confidence * 1.5, 0.95)
-                enhancement_reason = "good_prediction_boost"
-            elif "sunflower" in flower_name.lower() and dominant_color == "yellow":
-                enhanced_confidence = min(confidence * 1.6, 0.95)
-                enhancement_reason = "good_prediction_boost"
-            elif "daisy" in flower_name.lower() and dominant_color in [
-                "white",
-                "yellow",
-            ]:
-                enhanced_confidence = min(confidence * 1.4, 0.90)
-                enhancement_reason = "good_prediction_boost"
-
-        return enhanced_confidence, enhanced_name, enhancement_reason
-
-    def enhanced_predict(self, image, mode="enhanced"):
-        """Enhanced prediction với multiple modes"""
+    def enhanced_predict_batch(self, pixel_buffers, mode="enhanced"):
+        """Dự đoán nhiều ảnh qua hàng đợi của batcher (được tính vào depth/delay)"""
         if not self.oxford_model:
             raise Exception("Model not loaded")
 
-        # Preprocess image
-        image_resized = image.resize((224, 224))
-        image_array = np.array(image_resized) / 255.0
-        image_array = np.expand_dims(image_array, axis=0)
+        with stage("inference"):
+            outputs = self.batcher.predict_many(pixel_buffers)
 
-        # Get color features
-        color_features = self.analyze_color_features(image_resized)
+        with stage("rules"):
+            return self.build_predictions(outputs, mode)
 
-        # Oxford prediction
-        oxford_predictions = self.oxford_model.predict(image_array, verbose=0)
-        top_5_indices = np.argsort(oxford_predictions[0])[-5:][::-1]
+    def build_prediction(self, outputs, mode):
+        """Dựng kết quả top 5 từ output của serving graph cho một ảnh"""
+        batch = {key: value[np.newaxis] for key, value in outputs.items()}
+        return self.build_predictions(batch, mode)[0]
 
-        results = []
+    def build_predictions(self, outputs, mode):
+        """Dựng kết quả top 5 cho từng ảnh từ output (có chiều batch) của serving graph.
+
+        Enhancement rules chấm lại top-k của cả batch một lần (EnhancementRules.score).
+        Giá trị numpy được đổi sang float/int Python ngay khi đưa vào kết quả, nên
+        response serialize thẳng được (fast_json) mà không cần duyệt lại.
+        """
+        color_features = [
+            self.color_features_from_means(*means) for means in outputs["color_mean"]
+        ]
+        indices = outputs["top_k_indices"].tolist()
+        confidences = outputs["top_k_values"].tolist()
 
         if mode == "enhanced":
-            # Apply enhancement rules
-            for idx in top_5_indices:
-                flower_name = self.class_names[idx]
-                confidence = oxford_predictions[0][idx]
-
-                enhanced_confidence, enhanced_name, reason = (
-                    self.apply_enhancement_rules(
-                        flower_name, confidence, color_features
+            name_ids, scores, reason_ids = self.rules.score(
+                outputs["top_k_indices"], outputs["top_k_values"], color_features
+            )
+
+        predictions = []
+        for i, features in enumerate(color_features):
+            top_5 = list(zip(indices[i], confidences[i]))
+            results = []
+
+            if mode == "enhanced":
+                for (idx, confidence), name_id, score, reason_id in zip(
+                    top_5, name_ids[i], scores[i], reason_ids[i]
+                ):
+                    flower_name = self.class_names[idx]
+                    reason = REASONS[reason_id]
+
+                    if name_id == KEEP:
+                        enhanced_name = flower_name
+                        vietnamese_name = self.vietnamese_names.for_class(idx)
+                    else:
+                        enhanced_name = RULE_NAMES[name_id]
+                        vietnamese_name = self.map_to_vietnamese(enhanced_name)
+                        logger.info(
+                            f"{reason}: {flower_name} -> {enhanced_name} "
+                            f"(color: {features['dominant_color']}, original: {confidence:.3f})"
+                        )
+
+                    results.append(
+                        {
+                            "className": vietnamese_name,
+                            "englishName": enhanced_name,
+                            "originalName": flower_name,
+                            "confidence": score,
+                            "originalConfidence": confidence,
+                            "enhancementReason": reason,
+                            "enhanced": enhanced_name != flower_name,
+                        }
                     )
-                )
 
-                results.append(
-                    {
-                        "className": self.map_to_vietnamese(enhanced_name),
-                        "englishName": enhanced_name,
-                        "originalName": flower_name,
-                        "confidence": enhanced_confidence,
-                        "originalConfidence": confidence,
-                        "enhancementReason": reason,
-                        "enhanced": enhanced_name != flower_name,
-                    }
-                )
+            elif mode == "oxford":
+                # Standard Oxford only
+                for idx, confidence in top_5:
+                    flower_name = self.class_names[idx]
+
+                    results.append(
+                        {
+                            "className": self.vietnamese_names.for_class(idx),
+                            "englishName": flower_name,
+                            "originalName": flower_name,
+                            "confidence": confidence,
+                            "originalConfidence": confidence,
+                            "enhancementReason": "oxford_model",
+                            "enhanced": False,
+                        }
+                    )
 
-        elif mode == "oxford":
-            # Standard Oxford only
-            for idx in top_5_indices:
-                flower_name = self.class_names[idx]
-                confidence = oxford_predictions[0][idx]
-
-                results.append(
-                    {
-                        "className": self.map_to_vietnamese(flower_name),
-                        "englishName": flower_name,
-                        "originalName": flower_name,
-                        "confidence": confidence,
-                        "originalConfidence": confidence,
-                        "enhancementReason": "oxford_model",
-                        "enhanced": False,
-                    }
-                )
+            elif mode == "visual":
+                # Visual rules only
+                results = self.visual_rules_predict(features)
 
-        elif mode == "visual":
-            # Visual rules only
-            results = self.visual_rules_predict(color_features)
+            # Sort by confidence
+            results.sort(key=lambda x: x["confidence"], reverse=True)
 
-        # Sort by confidence
-        results.sort(key=lambda x: x["confidence"], reverse=True)
+            predictions.append(
+                {
+                    "predictions": results[:5],
+                    "colorAnalysis": features,
+                    "analysisMode": mode,
+                    "timestamp": datetime.now().isoformat(),
+                }
+            )
 
-        return {
-            "predictions": results[:5],
-            "colorAnalysis": color_features,
-            "analysisMode": mode,
-            "timestamp": datetime.now().isoformat(),
-        }
+        return predictions
 
     def visual_rules_predict(self, color_features):
         """Prediction based on visual rules only"""
@@ -515,73 +516,37 @@ class EnhancedFlowerRecognitionAPI:
 
     def map_to_vietnamese(self, english_name):
         """Map English flower names to Vietnamese"""
-        flower_mapping = {
-            "tulip": "Hoa Tulip",
-            "rose": "Hoa Hồng",
-            "sunflower": "Hoa Hướng Dương",
-            "lily": "Hoa Lily",
-            "orchid": "Hoa Lan",
-            "carnation": "Hoa Cẩm Chướng",
-            "daffodil": "Hoa Thủy Tiên",
-            "iris": "Hoa Diên Vĩ",
-            "dahlia": "Hoa Thược Dược",
-            "magnolia": "Hoa Mộc Lan",
-            "marigold": "Hoa Vạn Thọ",
-            "poppy": "Hoa Anh Túc",
-            "lotus": "Hoa Sen",
-            "daisy": "Hoa Cúc",
-            "peony": "Hoa Mẫu Đơn",
-            "cherry blossom": "Hoa Anh Đào",
-            "jasmine": "Hoa Nhài",
-            "hibiscus": "Hoa Dâm Bụt",
-            "azalea": "Hoa Đỗ Quyên",
-            "camellia": "Hoa Trà",
-            "petunia": "Hoa Dạ Yến Thảo",
-            "geranium": "Hoa Phong Lữ",
-            "bougainvillea": "Hoa Giấy",
-            "morning glory": "Hoa Bìm Bìm",
-            "cyclamen": "Hoa Tiên Khách",
-            "cape flower": "Hoa Mũi Cape",
-            "hippeastrum": "Hoa Huệ Tây",
-            "buttercup": "Hoa Mao Lương",
-        }
-
-        english_lower = english_name.lower()
-        for eng_name, vi_name in flower_mapping.items():
-            if eng_name in english_lower:
-                return vi_name
-
-        return english_name.title()
+        return self.vietnamese_names.lookup(english_name)
 
 
 # Initialize the recognition system
 recognition_system = EnhancedFlowerRecognitionAPI()
 
-
-def convert_numpy_types(obj):
-    """Convert numpy types to JSON serializable types"""
-    import numpy as np
-
-    if isinstance(obj, dict):
-        return {key: convert_numpy_types(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_numpy_types(item) for item in obj]
-    elif isinstance(obj, np.float32):
-        return float(obj)
-    elif isinstance(obj, np.float64):
-        return float(obj)
-    elif isinstance(obj, np.int32):
-        return int(obj)
-    elif isinstance(obj, np.int64):
-        return int(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, np.bool_):
-        return bool(obj)
-    elif isinstance(obj, (bool, np.bool)):
-        return bool(obj)
-    else:
-        return obj
+# Cache kết quả theo hash nội dung ảnh + mode
+prediction_cache = PredictionCache()
+
+# Số ảnh tối đa trong một request /predict-batch
+MAX_BATCH_IMAGES = int(os.environ.get("FLOWER_MAX_BATCH_IMAGES", "32"))
+
+# /metrics: latency theo stage, request theo route/mode/status, batch, cache
+metrics.instrument_flask(app, "enhanced")
+metrics.register_cache("enhanced", prediction_cache)
+if recognition_system.oxford_model:
+    metrics.register_model(recognition_system.oxford_model)
+    metrics.register_batcher(recognition_system.batcher)
+    metrics.register_batcher(recognition_system.embed_batcher)
+
+# Giới hạn byte của request theo endpoint; pixel/format kiểm tra từ header khi decode
+install_flask_limits(
+    app,
+    {
+        "predict": PREDICT_LIMITS,
+        "predict_batch": BATCH_LIMITS,
+        "search_by_image": SEARCH_LIMITS,
+        "search_similar": SIMILAR_LIMITS,
+    },
+    error_endpoints={"search_by_image"},
+)
 
 
 # Helper functions for filtering
@@ -619,17 +584,101 @@ def get_search_message(confidence, flower_name):
         return "Không thể nhận dạng chính xác - Vui lòng thử ảnh rõ nét hơn"
 
 
+def build_predict_response(result, mode):
+    """Response format của /predict (dùng chung cho /predict-batch)"""
+    return {
+        "success": True,
+        "mode": mode,
+        "predictions": result["predictions"],
+        "colorAnalysis": result["colorAnalysis"],
+        "timestamp": result["timestamp"],
+        "message": "Enhanced prediction successful",
+    }
+
+
+def build_search_response(result):
+    """Response format của /search-by-image (tương thích C# service)"""
+    top_prediction = result["predictions"][0]
+
+    # Apply confidence filtering for C# service
+    confidence = top_prediction["confidence"]
+    should_filter = confidence >= 0.4  # Minimum threshold for search
+    max_results = get_max_results_by_confidence(confidence)
+    confidence_level = get_confidence_level(confidence)
+
+    logger.info(
+        f"Enhanced search result: {top_prediction['className']} ({confidence:.2%}) - Filter: {should_filter}"
+    )
+
+    # Return format compatible with existing C# service + filtering info
+    return {
+        "success": True,
+        "class_id": 0,  # Generic ID since we don't have specific mapping
+        "class_name": top_prediction["englishName"],
+        "vietnamese_name": top_prediction["className"],
+        "probability": confidence,
+        "enhanced": bool(top_prediction.get("enhanced", False)),
+        "enhancement_reason": top_prediction.get("enhancementReason", "oxford_model"),
+        "color_analysis": result["colorAnalysis"],
+        "predictions": result["predictions"],  # Add for C# compatibility
+        # NEW filtering fields for C# service
+        "should_filter": bool(should_filter),
+        "max_results": max_results,
+        "confidence_level": confidence_level,
+        "search_message": get_search_message(confidence, top_prediction["className"]),
+    }
+
+
+def build_health_response():
+    """Payload của /health"""
+    oxford_model = recognition_system.oxford_model
+    ready = bool(oxford_model and oxford_model.ready)
+    return {
+        "status": "healthy" if ready else "starting",
+        "ready": ready,
+        "model": "Enhanced Oxford Flowers 102",
+        "features": ["color_analysis", "visual_rules", "enhancement_engine"],
+        "modes": ["enhanced", "oxford", "visual"],
+        "backend": oxford_model.backend if oxford_model else None,
+        "cache": prediction_cache.stats(),
+        "catalog_index": (
+            recognition_system.catalog_search.stats()
+            if recognition_system.catalog_search
+            else None
+        ),
+    }
+
+
+def build_readiness_response():
+    """Payload và status code của /health/ready"""
+    oxford_model = recognition_system.oxford_model
+    ready = bool(oxford_model and oxford_model.ready)
+    return {
+        "status": "ready" if ready else "not_ready",
+        "model_loaded": bool(oxford_model and oxford_model.loaded),
+        "warm": bool(oxford_model and oxford_model.warmup_ms is not None),
+        "warmup_ms": oxford_model.warmup_ms if oxford_model else None,
+        "backend": oxford_model.backend if oxford_model else None,
+    }, (200 if ready else 503)
+
+
 @app.route("/health", methods=["GET"])
 def health():
     """Health check endpoint"""
-    return jsonify(
-        {
-            "status": "healthy",
-            "model": "Enhanced Oxford Flowers 102",
-            "features": ["color_analysis", "visual_rules", "enhancement_engine"],
-            "modes": ["enhanced", "oxford", "visual"],
-        }
-    )
+    return jsonify(build_health_response())
+
+
+@app.route("/health/live", methods=["GET"])
+def health_live():
+    """Liveness: process còn phục vụ request"""
+    return jsonify({"status": "alive"})
+
+
+@app.route("/health/ready", methods=["GET"])
+def health_ready():
+    """Readiness: model đã load và đã warm-up, kèm thời gian warm-up"""
+    payload, status = build_readiness_response()
+    return jsonify(payload), status
 
 
 @app.route("/predict", methods=["POST"])
@@ -655,41 +704,50 @@ def predict():
         mode = request.form.get("mode", "enhanced")
         if mode not in ["enhanced", "oxford", "visual"]:
             mode = "enhanced"
+        metrics.set_request_mode(mode)
 
         logger.info(f"Processing image: {file.filename} with mode: {mode}")
 
         # Process image
         image_bytes = file.read()
-        image = Image.open(io.BytesIO(image_bytes))
 
-        if image.mode not in ["RGB", "RGBA", "L"]:
-            return jsonify(
-                {"success": False, "message": "Unsupported image format"}
-            ), 400
+        cache_key = prediction_cache.make_key(image_bytes, f"predict:{mode}")
+        cached_response = prediction_cache.get(cache_key)
+        if cached_response is not None:
+            logger.info(f"Enhanced prediction served from cache. Mode: {mode}")
+            return jsonify(cached_response)
 
-        image = image.convert("RGB")
+        # Từ chối trước khi decode nếu hàng đợi inference đã quá tải
+        recognition_system.admit()
+        try:
+            pixels = preprocess_pixels(
+                image_bytes, allowed_modes=SUPPORTED_MODES, limits=PREDICT_LIMITS
+            )
+        except UnsupportedImageError as e:
+            logger.warning(str(e))
+            return jsonify({"success": False, "message": e.public_message}), e.status
 
         # Enhanced prediction
-        result = recognition_system.enhanced_predict(image, mode=mode)
+        result = recognition_system.enhanced_predict(pixels, mode=mode)
 
         logger.info(
             f"Enhanced prediction successful. Mode: {mode}, Top result: {result['predictions'][0]['className']}"
         )
 
-        # Convert numpy types and return result
-        response_data = convert_numpy_types(
-            {
-                "success": True,
-                "mode": mode,
-                "predictions": result["predictions"],
-                "colorAnalysis": result["colorAnalysis"],
-                "timestamp": result["timestamp"],
-                "message": "Enhanced prediction successful",
-            }
-        )
+        # Dựng response (kiểu Python thuần) và lưu cache
+        response_data = build_predict_response(result, mode)
+        prediction_cache.put(cache_key, response_data)
 
         return jsonify(response_data)
 
+    except BatcherOverloadedError as e:
+        logger.warning(str(e))
+        return jsonify(
+            {"success": False, "message": e.public_message}
+        ), e.status, e.headers
+    except Image.UnidentifiedImageError:
+        logger.warning("Invalid image file - cannot be identified")
+        return jsonify({"success": False, "message": "Invalid image file"}), 400
     except Exception as e:
         logger.error(f"Error in enhanced prediction: {str(e)}", exc_info=True)
         return jsonify(
@@ -717,54 +775,196 @@ def search_by_image():
             return jsonify({"error": "No selected file"}), 400
 
         # Always use enhanced mode for search
+        metrics.set_request_mode("enhanced")
         image_bytes = file.read()
-        image = Image.open(io.BytesIO(image_bytes))
-        image = image.convert("RGB")
+
+        cache_key = prediction_cache.make_key(image_bytes, "search:enhanced")
+        cached_response = prediction_cache.get(cache_key)
+        if cached_response is not None:
+            logger.info("Enhanced search result served from cache")
+            return jsonify(cached_response)
+
+        recognition_system.admit()
+        try:
+            pixels = preprocess_pixels(
+                image_bytes, allowed_modes=SUPPORTED_MODES, limits=SEARCH_LIMITS
+            )
+        except UnsupportedImageError as e:
+            logger.warning(str(e))
+            return jsonify({"error": e.public_message}), e.status
 
         # Enhanced prediction
-        result = recognition_system.enhanced_predict(image, mode="enhanced")
-        top_prediction = result["predictions"][0]
+        result = recognition_system.enhanced_predict(pixels, mode="enhanced")
+
+        response_data = build_search_response(result)
+        prediction_cache.put(cache_key, response_data)
+
+        return jsonify(response_data)
+
+    except BatcherOverloadedError as e:
+        logger.warning(str(e))
+        return jsonify({"error": e.public_message}), e.status, e.headers
+    except Image.UnidentifiedImageError:
+        logger.warning("Invalid image file in search-by-image")
+        return jsonify({"error": "Invalid image file"}), 400
+    except Exception as e:
+        logger.error(f"Error in enhanced search-by-image: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/search-similar", methods=["POST"])
+def search_similar():
+    """Tìm sản phẩm có ảnh giống ảnh upload nhất (embedding + nearest neighbor)"""
+    try:
+        file = request.files.get("image") or request.files.get("imageFile")
+        if file is None or file.filename == "":
+            return jsonify({"success": False, "message": "No image file provided"}), 400
+
+        try:
+            k = parse_search_k(request.values.get("k"))
+            nprobe = parse_search_nprobe(request.values.get("nprobe"))
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+
+        catalog_search = recognition_system.catalog_search
+        if catalog_search is None or not catalog_search.ready:
+            return jsonify(
+                {
+                    "success": False,
+                    "message": "Catalog index is not ready",
+                    "catalog_index": catalog_search.stats() if catalog_search else None,
+                }
+            ), 503
 
-        # Apply confidence filtering for C# service
-        confidence = top_prediction["confidence"]
-        should_filter = confidence >= 0.4  # Minimum threshold for search
-        max_results = get_max_results_by_confidence(confidence)
-        confidence_level = get_confidence_level(confidence)
+        recognition_system.embed_batcher.admit()
+        try:
+            pixels = preprocess_pixels(
+                file.read(), allowed_modes=SUPPORTED_MODES, limits=SIMILAR_LIMITS
+            )
+        except UnsupportedImageError as e:
+            logger.warning(str(e))
+            return jsonify({"success": False, "message": e.public_message}), e.status
+
+        results = recognition_system.search_similar(pixels, k, nprobe)
+        return jsonify(
+            {
+                "success": True,
+                "count": len(results),
+                "results": results,
+                "message": f"Found {len(results)} similar products",
+            }
+        )
+
+    except BatcherOverloadedError as e:
+        logger.warning(str(e))
+        return jsonify(
+            {"success": False, "message": e.public_message}
+        ), e.status, e.headers
+    except Image.UnidentifiedImageError:
+        logger.warning("Invalid image file in search-similar")
+        return jsonify({"success": False, "message": "Invalid image file"}), 400
+    except Exception as e:
+        logger.error(f"Error in search-similar: {str(e)}", exc_info=True)
+        return jsonify(
+            {"success": False, "message": f"Error processing image: {str(e)}"}
+        ), 500
+
+
+@app.route("/predict-batch", methods=["POST"])
+def predict_batch():
+    """Nhận dạng nhiều ảnh trong một multipart request, chạy theo batch qua batcher"""
+    try:
+        files = (
+            request.files.getlist("images")
+            + request.files.getlist("image")
+            + request.files.getlist("file")
+        )
+        files = [file for file in files if file.filename != ""]
+
+        if not files:
+            return jsonify({"success": False, "message": "No image file provided"}), 400
+
+        # Không vượt quá số ảnh hàng đợi của batcher có thể nhận
+        max_images = MAX_BATCH_IMAGES
+        if recognition_system.batcher is not None:
+            max_images = recognition_system.batcher.max_images(max_images)
+        if len(files) > max_images:
+            return jsonify(
+                {"success": False, "message": f"Too many images (max {max_images})"}
+            ), 400
+
+        mode = request.form.get("mode", "enhanced")
+        if mode not in ["enhanced", "oxford", "visual"]:
+            mode = "enhanced"
+        metrics.set_request_mode(mode)
 
         logger.info(
-            f"Enhanced search result: {top_prediction['className']} ({confidence:.2%}) - Filter: {should_filter}"
+            f"Received batch prediction request: {len(files)} images, mode: {mode}"
         )
 
-        # Return format compatible with existing C# service + filtering info
-        # Convert numpy types and return result
-        response_data = convert_numpy_types(
+        results = [None] * len(files)
+        pending = []  # (vị trí, cache key, buffer uint8) cần chạy model
+
+        for i, file in enumerate(files):
+            image_bytes = file.read()
+            cache_key = prediction_cache.make_key(image_bytes, f"predict:{mode}")
+            cached_response = prediction_cache.get(cache_key)
+            if cached_response is not None:
+                results[i] = dict(cached_response, filename=file.filename)
+                continue
+
+            try:
+                pixels = preprocess_pixels(
+                    image_bytes, allowed_modes=SUPPORTED_MODES, limits=BATCH_LIMITS
+                )
+                pending.append((i, cache_key, pixels))
+            except UnsupportedImageError as e:
+                results[i] = {
+                    "success": False,
+                    "filename": file.filename,
+                    "message": e.public_message,
+                }
+            except Image.UnidentifiedImageError:
+                results[i] = {
+                    "success": False,
+                    "filename": file.filename,
+                    "message": "Invalid image file",
+                }
+
+        if pending:
+            batch_results = recognition_system.enhanced_predict_batch(
+                [pixels for _, _, pixels in pending], mode=mode
+            )
+            for (i, cache_key, _), result in zip(pending, batch_results):
+                response_data = build_predict_response(result, mode)
+                prediction_cache.put(cache_key, response_data)
+                results[i] = dict(response_data, filename=files[i].filename)
+
+        logger.info(
+            f"Batch prediction successful: {len(files)} images "
+            f"({len(pending)} inferred, {len(files) - len(pending)} cached/invalid)"
+        )
+
+        return jsonify(
             {
                 "success": True,
-                "class_id": 0,  # Generic ID since we don't have specific mapping
-                "class_name": top_prediction["englishName"],
-                "vietnamese_name": top_prediction["className"],
-                "probability": confidence,
-                "enhanced": bool(top_prediction.get("enhanced", False)),
-                "enhancement_reason": top_prediction.get(
-                    "enhancementReason", "oxford_model"
-                ),
-                "color_analysis": result["colorAnalysis"],
-                "predictions": result["predictions"],  # Add for C# compatibility
-                # NEW filtering fields for C# service
-                "should_filter": bool(should_filter),
-                "max_results": max_results,
-                "confidence_level": confidence_level,
-                "search_message": get_search_message(
-                    confidence, top_prediction["className"]
-                ),
+                "mode": mode,
+                "count": len(results),
+                "results": results,
+                "message": "Batch prediction successful",
             }
         )
 
-        return jsonify(response_data)
-
+    except BatcherOverloadedError as e:
+        logger.warning(str(e))
+        return jsonify(
+            {"success": False, "message": e.public_message}
+        ), e.status, e.headers
     except Exception as e:
-        logger.error(f"Error in enhanced search-by-image: {str(e)}", exc_info=True)
-        return jsonify({"error": str(e)}), 500
+        logger.error(f"Error in batch prediction: {str(e)}", exc_info=True)
+        return jsonify(
+            {"success": False, "message": f"Error processing images: {str(e)}"}
+        ), 500
 
 
 if __name__ == "__main__":
@@ -778,9 +978,14 @@ if __name__ == "__main__":
     logger.info("  - Improved tulip detection")
     logger.info("API Endpoints:")
     logger.info("  - GET  /health - Health check")
+    logger.info("  - GET  /health/live - Liveness probe")
+    logger.info("  - GET  /health/ready - Readiness probe (model loaded + warm)")
+    logger.info("  - GET  /metrics - Prometheus metrics")
     logger.info("  - POST /predict - Enhanced prediction (with mode param)")
     logger.info("  - POST /search-by-image - Enhanced search (C# compatible)")
+    logger.info("  - POST /search-similar - Visually similar products (with k param)")
+    logger.info("  - POST /predict-batch - Batch prediction (with mode param)")
     logger.info("Server starting on http://0.0.0.0:8001")
     logger.info("=" * 60)
 
-    app.run(host="0.0.0.0", port=8001, debug=True)
+    app.run(host="0.0.0.0", port=8001, debug=True, threaded=True)
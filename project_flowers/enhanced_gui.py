@@ -7,11 +7,56 @@ Kết hợp Oxford Flowers + Visual Rules + Color Analysis cho accuracy cao hơn
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
-import tensorflow as tf
 import numpy as np
 import os
 from datetime import datetime
 
+from image_decode import preprocess_pixels
+from color_analysis import analyze_colors
+from model_serving import load_serving_model
+from flower_names import VietnameseNameTable
+
+# Tên tiếng Việt hiển thị trên GUI
+VIETNAMESE_NAMES = {
+    "tulip": "Hoa Tulip",
+    "rose": "Hoa Hồng",
+    "sunflower": "Hoa Hướng Dương",
+    "lily": "Hoa Lily",
+    "orchid": "Hoa Lan",
+    "carnation": "Hoa Cẩm Chướng",
+    "daffodil": "Hoa Thủy Tiên",
+    "iris": "Hoa Diên Vĩ",
+    "dahlia": "Hoa Thược Dược",
+    "magnolia": "Hoa Mộc Lan",
+    "marigold": "Hoa Vạn Thọ",
+    "poppy": "Hoa Anh Túc",
+    "lotus": "Hoa Sen",
+    "daisy": "Hoa Cúc",
+    "oxeye daisy": "Hoa Cúc Trắng",
+    "barbeton daisy": "Hoa Đồng Tiền",
+    "black-eyed susan": "Hoa Cúc Mắt Đen",
+    "primrose": "Hoa Anh Thảo",
+    "pink primrose": "Hoa Anh Thảo Hồng",
+    "canterbury bells": "Hoa Chuông Canterbury",
+    "sweet pea": "Hoa Đậu Hà Lan",
+    "english marigold": "Hoa Cúc Vạn Thọ Anh",
+    "tiger lily": "Hoa Lily Hổ",
+    "moon orchid": "Hoa Lan Trăng",
+    "bird of paradise": "Hoa Thiên Điểu",
+    "hibiscus": "Hoa Dâm Bụt",
+    "azalea": "Hoa Đỗ Quyên",
+    "camellia": "Hoa Trà",
+    "petunia": "Hoa Dạ Yến Thảo",
+    "geranium": "Hoa Phong Lữ",
+    "bougainvillea": "Hoa Giấy",
+    "morning glory": "Hoa Bìm Bìm",
+    "water lily": "Hoa Súng",
+    "anthurium": "Hoa Hồng Môn",
+    "cyclamen": "Hoa Tiên Khách",
+    "cape flower": "Hoa Mũi Cape",
+    "hippeastrum": "Hoa Huệ Tây",
+}
+
 
 class EnhancedFlowerRecognitionGUI:
     def __init__(self, root):
@@ -23,8 +68,10 @@ class EnhancedFlowerRecognitionGUI:
         # Initialize variables first
         self.oxford_model = None
         self.class_names = self.load_class_names()
+        self.vietnamese_names = VietnameseNameTable(VIETNAMESE_NAMES, self.class_names)
         self.current_image_path = None
         self.current_image = None
+        self.current_pixels = None
 
         # Setup GUI first (creates status_var)
         self.setup_gui()
@@ -153,7 +200,7 @@ class EnhancedFlowerRecognitionGUI:
                 self.update_status("Model loading failed: File not found")
                 return
 
-            self.oxford_model = tf.keras.models.load_model(model_path)
+            self.oxford_model = load_serving_model(model_path)
             print("Enhanced model loaded successfully!")
             self.update_status("🌸 Enhanced Recognition System Ready! ✓")
 
@@ -316,6 +363,9 @@ class EnhancedFlowerRecognitionGUI:
             self.current_image_path = file_path
             self.current_image = Image.open(file_path)
 
+            # Buffer uint8 224x224 dùng chung cho color analysis và model
+            self.current_pixels = preprocess_pixels(file_path)
+
             # Display image
             self.display_image(self.current_image)
 
@@ -358,36 +408,10 @@ class EnhancedFlowerRecognitionGUI:
         y = (canvas_height - new_height) // 2
         self.image_canvas.create_image(x, y, anchor=tk.NW, image=self.photo)
 
-    def analyze_color_features(self, image):
-        """Phân tích màu sắc của hình ảnh"""
-        # Convert to numpy array
-        img_array = np.array(image.resize((224, 224)))
-
-        # Color analysis in RGB space
-        red_ratio = np.mean(img_array[:, :, 0]) / 255.0
-        green_ratio = np.mean(img_array[:, :, 1]) / 255.0
-        blue_ratio = np.mean(img_array[:, :, 2]) / 255.0
-
-        # Determine dominant colors
-        dominant_color = "unknown"
-        if red_ratio > green_ratio and red_ratio > blue_ratio:
-            if red_ratio > 0.6:
-                dominant_color = "red"
-            elif red_ratio > 0.4:
-                dominant_color = "pink"
-        elif green_ratio > red_ratio and green_ratio > blue_ratio:
-            dominant_color = "green"
-        elif blue_ratio > red_ratio and blue_ratio > green_ratio:
-            dominant_color = "blue"
-        elif red_ratio > 0.5 and green_ratio > 0.5 and blue_ratio < 0.3:
-            dominant_color = "yellow"
-
-        return {
-            "red_ratio": red_ratio,
-            "green_ratio": green_ratio,
-            "blue_ratio": blue_ratio,
-            "dominant_color": dominant_color,
-        }
+    def analyze_color_features(self, pixels):
+        """Phân tích màu sắc từ buffer uint8 224x224 đã preprocess"""
+        # Tỉ lệ nhóm màu và màu chủ đạo từ histogram HSV của ảnh đã lấy mẫu
+        return analyze_colors(pixels)
 
     def update_image_info_enhanced(self):
         """Update enhanced image information display"""
@@ -411,11 +435,11 @@ class EnhancedFlowerRecognitionGUI:
             info += f"File Size: {file_size / (1024 * 1024):.1f} MB\n\n"
 
         # Color analysis
-        color_features = self.analyze_color_features(self.current_image)
+        color_features = self.analyze_color_features(self.current_pixels)
         info += f"🎨 COLOR ANALYSIS:\n"
-        info += f"Red: {color_features['red_ratio']:.1%}\n"
-        info += f"Green: {color_features['green_ratio']:.1%}\n"
-        info += f"Blue: {color_features['blue_ratio']:.1%}\n"
+        ratios = color_features["color_ratios"]
+        for color in sorted(ratios, key=ratios.get, reverse=True)[:3]:
+            info += f"{color.title()}: {ratios[color]:.1%}\n"
         info += f"Dominant: {color_features['dominant_color'].title()}\n\n"
 
         # Visual hints
@@ -446,19 +470,13 @@ class EnhancedFlowerRecognitionGUI:
             mode = self.analysis_mode.get()
             self.update_status(f"Analyzing image using {mode} mode...")
 
-            # Preprocess image
-            image = self.current_image.convert("RGB")
-            image_resized = image.resize((224, 224))
-            image_array = np.array(image_resized) / 255.0
-            image_array = np.expand_dims(image_array, axis=0)
-
             # Get color features
-            color_features = self.analyze_color_features(self.current_image)
+            color_features = self.analyze_color_features(self.current_pixels)
 
             if mode == "enhanced":
-                results = self.enhanced_predict(image_array, color_features)
+                results = self.enhanced_predict(self.current_pixels, color_features)
             elif mode == "oxford":
-                results = self.oxford_only_predict(image_array)
+                results = self.oxford_only_predict(self.current_pixels)
             else:  # visual
                 results = self.visual_rules_predict(color_features)
 
@@ -476,16 +494,16 @@ class EnhancedFlowerRecognitionGUI:
             messagebox.showerror("Error", f"Prediction failed: {str(e)}")
             self.update_status(f"Analysis error: {str(e)}")
 
-    def enhanced_predict(self, image_array, color_features):
+    def enhanced_predict(self, pixels, color_features):
         """Enhanced prediction combining Oxford + Visual Rules"""
-        # Oxford prediction
-        oxford_predictions = self.oxford_model.predict(image_array, verbose=0)
-        top_5_indices = np.argsort(oxford_predictions[0])[-5:][::-1]
+        # Oxford prediction (top-5 tính trong serving graph)
+        outputs = self.oxford_model.serve(np.expand_dims(pixels, axis=0))
 
         results = []
-        for i, idx in enumerate(top_5_indices):
+        for idx, confidence in zip(
+            outputs["top_k_indices"][0], outputs["top_k_values"][0]
+        ):
             flower_name = self.class_names[idx]
-            confidence = oxford_predictions[0][idx]
 
             # Apply enhancement rules
             enhanced_confidence, enhanced_name = self.apply_enhancement_rules(
@@ -506,20 +524,20 @@ class EnhancedFlowerRecognitionGUI:
         results.sort(key=lambda x: x["confidence"], reverse=True)
         return results
 
-    def oxford_only_predict(self, image_array):
+    def oxford_only_predict(self, pixels):
         """Standard Oxford prediction only"""
-        predictions = self.oxford_model.predict(image_array, verbose=0)
-        top_5_indices = np.argsort(predictions[0])[-5:][::-1]
+        outputs = self.oxford_model.serve(np.expand_dims(pixels, axis=0))
 
         results = []
-        for idx in top_5_indices:
+        for idx, confidence in zip(
+            outputs["top_k_indices"][0], outputs["top_k_values"][0]
+        ):
             flower_name = self.class_names[idx]
-            confidence = predictions[0][idx]
 
             results.append(
                 {
                     "english_name": flower_name,
-                    "vietnamese_name": self.map_flower_to_vietnamese(flower_name),
+                    "vietnamese_name": self.vietnamese_names.for_class(idx),
                     "confidence": confidence,
                     "original_confidence": confidence,
                     "enhanced": False,
@@ -688,7 +706,12 @@ class EnhancedFlowerRecognitionGUI:
         # Analysis summary
         results_text += "=" * 45 + "\n"
         results_text += "ANALYSIS SUMMARY:\n"
-        results_text += f"• Color Profile: R:{color_features['red_ratio']:.1%} G:{color_features['green_ratio']:.1%} B:{color_features['blue_ratio']:.1%}\n"
+        ratios = color_features["color_ratios"]
+        profile = " ".join(
+            f"{color.title()}:{ratios[color]:.1%}"
+            for color in sorted(ratios, key=ratios.get, reverse=True)[:3]
+        )
+        results_text += f"• Color Profile: {profile}\n"
         results_text += (
             f"• Enhancement: {'Active' if mode == 'enhanced' else 'Disabled'}\n"
         )
@@ -701,56 +724,12 @@ class EnhancedFlowerRecognitionGUI:
 
     def map_flower_to_vietnamese(self, english_name):
         """Enhanced Vietnamese mapping"""
-        flower_mapping = {
-            "tulip": "Hoa Tulip",
-            "rose": "Hoa Hồng",
-            "sunflower": "Hoa Hướng Dương",
-            "lily": "Hoa Lily",
-            "orchid": "Hoa Lan",
-            "carnation": "Hoa Cẩm Chướng",
-            "daffodil": "Hoa Thủy Tiên",
-            "iris": "Hoa Diên Vĩ",
-            "dahlia": "Hoa Thược Dược",
-            "magnolia": "Hoa Mộc Lan",
-            "marigold": "Hoa Vạn Thọ",
-            "poppy": "Hoa Anh Túc",
-            "lotus": "Hoa Sen",
-            "daisy": "Hoa Cúc",
-            "oxeye daisy": "Hoa Cúc Trắng",
-            "barbeton daisy": "Hoa Đồng Tiền",
-            "black-eyed susan": "Hoa Cúc Mắt Đen",
-            "primrose": "Hoa Anh Thảo",
-            "pink primrose": "Hoa Anh Thảo Hồng",
-            "canterbury bells": "Hoa Chuông Canterbury",
-            "sweet pea": "Hoa Đậu Hà Lan",
-            "english marigold": "Hoa Cúc Vạn Thọ Anh",
-            "tiger lily": "Hoa Lily Hổ",
-            "moon orchid": "Hoa Lan Trăng",
-            "bird of paradise": "Hoa Thiên Điểu",
-            "hibiscus": "Hoa Dâm Bụt",
-            "azalea": "Hoa Đỗ Quyên",
-            "camellia": "Hoa Trà",
-            "petunia": "Hoa Dạ Yến Thảo",
-            "geranium": "Hoa Phong Lữ",
-            "bougainvillea": "Hoa Giấy",
-            "morning glory": "Hoa Bìm Bìm",
-            "water lily": "Hoa Súng",
-            "anthurium": "Hoa Hồng Môn",
-            "cyclamen": "Hoa Tiên Khách",
-            "cape flower": "Hoa Mũi Cape",
-            "hippeastrum": "Hoa Huệ Tây",
-        }
-
-        english_lower = english_name.lower()
-        for eng_name, vi_name in flower_mapping.items():
-            if eng_name in english_lower:
-                return vi_name
-
-        return english_name.title()
+        return self.vietnamese_names.lookup(english_name)
 
     def clear_all(self):
         """Clear all data"""
         self.current_image = None
+        self.current_pixels = None
         self.current_image_path = None
 
         # Clear displays
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Enhancement Rules Engine
+Enhancement rules của enhanced API dạng bảng: indicator lists được compile một lần thành
+bảng quyết định table[trạng thái màu của ảnh, confidence < 0.15, confidence > 0.3,
+class id] -> action, rồi chấm lại top-k của cả batch (hoặc cả 102 class) bằng một lần
+tra bảng NumPy thay cho việc quét chuỗi con từng class
+
+Trạng thái màu của ảnh giữ đúng thứ tự if/elif của rules cũ:
+  1-4. Rule "aggressive" (rose, yellow -> sunflower/daisy, tulip, white): chọn theo
+       dominant_color/color_confidence/red_ratio, chỉ đổi class khớp indicator của rule
+  5-6. Không rule nào ở trên được chọn: trạng thái là nhóm màu (COLOR_BUCKETS), action
+       theo confidence từng class: < 0.15 đổi theo màu (low_confidence_color_override),
+       > 0.3 tăng confidence khi tên class khớp màu (good_prediction_boost)
+Rule tulip không bao giờ được chọn vì điều kiện của nó nằm trong rule rose; vẫn giữ
+trong bảng để kết quả đúng như logic cũ.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+COLOR_BUCKETS = (
+    "deep_red",
+    "red",
+    "pink",
+    "bright_yellow",
+    "yellow",
+    "orange",
+    "white",
+    "purple",
+    "green",
+    "mixed",
+)
+BUCKET_INDEX = {name: i for i, name in enumerate(COLOR_BUCKETS)}
+
+# Các class Oxford hay nhận nhầm, theo từng rule (so khớp chuỗi con của tên viết thường)
+ROSE_INDICATORS = (
+    "ball moss",
+    "bromelia",
+    "blanket flower",
+    "trumpet creeper",
+    "cyclamen",
+    "cape flower",
+    "hippeastrum",
+    "lenten rose",
+    "carnation",
+    "sweet william",
+    "geranium",
+    "passion flower",
+)
+YELLOW_INDICATORS = (
+    "prince of wales feathers",
+    "ball moss",
+    "blanket flower",
+    "trumpet creeper",
+    "english marigold",
+    "buttercup",
+    "corn poppy",
+    "gazania",
+    "osteospermum",
+)
+TULIP_INDICATORS = (
+    "cyclamen",
+    "cape flower",
+    "hippeastrum",
+    "lenten rose",
+    "desert-rose",
+    "ball moss",
+    "trumpet creeper",
+)
+WHITE_INDICATORS = ("ball moss", "watercress", "blanket flower")
+
+# Tên kết quả theo name id (KEEP = giữ tên class gốc)
+KEEP = 0
+RULE_NAMES = (None, "Hoa Hồng", "sunflower", "oxeye daisy", "tulip", "rose")
+HOA_HONG, SUNFLOWER, OXEYE_DAISY, TULIP, ROSE = range(1, 6)
+
+REASONS = (
+    "oxford_model",
+    "aggressive_rose_rule",
+    "aggressive_sunflower_rule",
+    "aggressive_daisy_rule",
+    "aggressive_tulip_rule",
+    "aggressive_white_rule",
+    "low_confidence_color_override",
+    "good_prediction_boost",
+)
+(
+    OXFORD_MODEL,
+    ROSE_RULE,
+    SUNFLOWER_RULE,
+    DAISY_RULE,
+    TULIP_RULE,
+    WHITE_RULE,
+    LOW_CONFIDENCE_OVERRIDE,
+    GOOD_PREDICTION_BOOST,
+) = range(len(REASONS))
+
+# Action trong bảng quyết định: (name id, reason id, hệ số, trần).
+# Hệ số None: confidence mới là giá trị theo ảnh (tính từ color_confidence, xem
+# image_state); còn lại confidence mới = min(confidence * hệ số, trần).
+ACTIONS = (
+    (KEEP, OXFORD_MODEL, 1.0, float("inf")),
+    (HOA_HONG, ROSE_RULE, None, None),
+    (SUNFLOWER, SUNFLOWER_RULE, None, None),
+    (OXEYE_DAISY, DAISY_RULE, None, None),
+    (TULIP, TULIP_RULE, None, None),
+    (OXEYE_DAISY, WHITE_RULE, None, None),
+    (ROSE, LOW_CONFIDENCE_OVERRIDE, None, None),
+    (SUNFLOWER, LOW_CONFIDENCE_OVERRIDE, None, None),
+    (KEEP, GOOD_PREDICTION_BOOST, 1.5, 0.95),
+    (KEEP, GOOD_PREDICTION_BOOST, 1.6, 0.95),
+    (KEEP, GOOD_PREDICTION_BOOST, 1.4, 0.90),
+)
+(
+    KEEP_ACTION,
+    ROSE_ACTION,
+    SUNFLOWER_ACTION,
+    DAISY_ACTION,
+    TULIP_ACTION,
+    WHITE_ACTION,
+    LOW_ROSE_ACTION,
+    LOW_SUNFLOWER_ACTION,
+    BOOST_ROSE_ACTION,
+    BOOST_SUNFLOWER_ACTION,
+    BOOST_DAISY_ACTION,
+) = range(len(ACTIONS))
+
+ACTION_NAME = np.array([action[0] for action in ACTIONS], np.int8)
+ACTION_REASON = np.array([action[1] for action in ACTIONS], np.int8)
+ACTION_FIXED = np.array([action[2] is None for action in ACTIONS])
+ACTION_FACTOR = np.array([action[2] or 1.0 for action in ACTIONS])
+ACTION_CAP = np.array([action[3] or float("inf") for action in ACTIONS])
+
+# Trạng thái màu 0-4: rule aggressive (indicators, action cho class khớp)
+AGGRESSIVE_RULES = (
+    (ROSE_INDICATORS, ROSE_ACTION),
+    (YELLOW_INDICATORS, SUNFLOWER_ACTION),
+    (YELLOW_INDICATORS, DAISY_ACTION),
+    (TULIP_INDICATORS, TULIP_ACTION),
+    (WHITE_INDICATORS, WHITE_ACTION),
+)
+ROSE_STATE, SUNFLOWER_STATE, DAISY_STATE, TULIP_STATE, WHITE_STATE = range(5)
+# Trạng thái còn lại: BUCKET_STATE + chỉ số nhóm màu
+BUCKET_STATE = len(AGGRESSIVE_RULES)
+
+LOW_CONFIDENCE = 0.15
+BOOST_CONFIDENCE = 0.3
+
+# Rule 5 theo nhóm màu: (action, hệ số nhân color_confidence, trần)
+LOW_CONFIDENCE_RULES = {
+    "red": (LOW_ROSE_ACTION, 1.2, 0.70),
+    "deep_red": (LOW_ROSE_ACTION, 1.2, 0.70),
+    "yellow": (LOW_SUNFLOWER_ACTION, 1.3, 0.75),
+    "bright_yellow": (LOW_SUNFLOWER_ACTION, 1.3, 0.75),
+    "pink": (LOW_ROSE_ACTION, 1.1, 0.65),
+}
+
+# Rule 6: (chuỗi con trong tên class, các nhóm màu, action), khớp đầu tiên thắng
+BOOST_RULES = (
+    ("rose", ("red", "pink"), BOOST_ROSE_ACTION),
+    ("sunflower", ("yellow",), BOOST_SUNFLOWER_ACTION),
+    ("daisy", ("white", "yellow"), BOOST_DAISY_ACTION),
+)
+
+# Dưới số phần tử này (vài ảnh top-5) tra bảng bằng vòng lặp Python nhanh hơn overhead
+# cố định của các lệnh NumPy; batch lớn và cả 102 class đi đường NumPy
+NUMPY_MIN_SIZE = 64
+
+
+def image_state(color_features):
+    """(trạng thái màu, confidence của action dùng giá trị theo ảnh) cho một ảnh"""
+    dominant_color = color_features["dominant_color"]
+    color_confidence = color_features.get("color_confidence", 0.5)
+    red_ratio = color_features.get("red_ratio", 0)
+
+    if (dominant_color in ("red", "deep_red", "pink") and color_confidence > 0.4) or (
+        dominant_color == "mixed" and red_ratio > 0.35
+    ):
+        return ROSE_STATE, min(0.85, max(0.7, color_confidence * 1.8))
+    if dominant_color in ("yellow", "bright_yellow") and color_confidence > 0.5:
+        if red_ratio > 0.7:  # High red+yellow = sunflower
+            return SUNFLOWER_STATE, min(0.90, color_confidence * 1.8)
+        return DAISY_STATE, min(0.80, color_confidence * 1.6)
+    if dominant_color in ("red", "pink", "deep_red") and color_confidence > 0.4:
+        return TULIP_STATE, min(0.88, color_confidence * 2.0)
+    if dominant_color == "white" and color_confidence > 0.6:
+        return WHITE_STATE, min(0.75, color_confidence * 1.4)
+
+    state = BUCKET_STATE + BUCKET_INDEX[dominant_color]
+    if dominant_color in LOW_CONFIDENCE_RULES:
+        _, factor, cap = LOW_CONFIDENCE_RULES[dominant_color]
+        return state, min(cap, color_confidence * factor)
+    return state, 0.0
+
+
+@lru_cache(maxsize=None)
+def _dtype_constants(dtype):
+    """(dtype tính toán, ACTION_FACTOR, ACTION_CAP, ngưỡng low, ngưỡng high) cho
+    confidence kiểu dtype.
+
+    Rules cũ tính trên từng scalar numpy với float Python (NumPy 2 giữ float32,
+    NumPy 1.x đổi lên float64): nhân và so sánh trong cùng dtype để ra đúng giá trị
+    như trước. Ngưỡng là float Python đã làm tròn về dtype, so sánh được trực tiếp
+    với confidence.tolist().
+    """
+    dtype = (dtype.type(1) * 1.0).dtype
+    return (
+        dtype,
+        ACTION_FACTOR.astype(dtype),
+        ACTION_CAP.astype(dtype),
+        float(dtype.type(LOW_CONFIDENCE)),
+        float(dtype.type(BOOST_CONFIDENCE)),
+    )
+
+
+class EnhancementRules:
+    """Enhancement rules compile sẵn cho một danh sách class.
+
+    table[state, is_low, is_high, class_id] là action cho class đó khi ảnh ở trạng
+    thái màu state và confidence < LOW_CONFIDENCE (is_low) / > BOOST_CONFIDENCE
+    (is_high); được dựng một lần khi khởi tạo.
+    """
+
+    def __init__(self, class_names):
+        lower_names = [name.lower() for name in class_names]
+        states = BUCKET_STATE + len(COLOR_BUCKETS)
+        self.table = np.full((states, 2, 2, len(class_names)), KEEP_ACTION, np.int8)
+
+        for state, (indicators, action) in enumerate(AGGRESSIVE_RULES):
+            for class_id, name in enumerate(lower_names):
+                if any(indicator in name for indicator in indicators):
+                    self.table[state, :, :, class_id] = action
+
+        for bucket_id, bucket in enumerate(COLOR_BUCKETS):
+            state = BUCKET_STATE + bucket_id
+            if bucket in LOW_CONFIDENCE_RULES:
+                self.table[state, 1, 0, :] = LOW_CONFIDENCE_RULES[bucket][0]
+            for class_id, name in enumerate(lower_names):
+                for key, colors, action in BOOST_RULES:
+                    if key in name and bucket in colors:
+                        self.table[state, 0, 1, class_id] = action
+                        break
+
+        # Bản list lồng của bảng cho vòng lặp Python (tra list nhanh hơn scalar numpy)
+        self._rows = self.table.tolist()
+
+    def score(self, class_ids, confidences, color_features):
+        """Chấm lại top-k của cả batch.
+
+        class_ids, confidences: mảng numpy (N, K); color_features: N dict của
+        color_features_from_means. Trả về (name_ids, confidences, reason_ids) dạng
+        list lồng (N, K) kiểu Python; name id KEEP nghĩa là giữ tên class gốc.
+        """
+        states, values = zip(*map(image_state, color_features))
+        if class_ids.size < NUMPY_MIN_SIZE:
+            return self._score_loop(states, values, class_ids, confidences)
+
+        dtype, factors, caps, _, _ = _dtype_constants(confidences.dtype)
+        confidences = confidences.astype(dtype, copy=False)
+        is_low = (confidences < LOW_CONFIDENCE).view(np.uint8)
+        is_high = (confidences > BOOST_CONFIDENCE).view(np.uint8)
+        actions = self.table[np.array(states)[:, None], is_low, is_high, class_ids]
+
+        boosted = confidences * factors[actions]
+        scores = np.where(caps[actions] < boosted, ACTION_CAP[actions], boosted)
+        scores = np.where(ACTION_FIXED[actions], np.array(values)[:, None], scores)
+        return (
+            ACTION_NAME[actions].tolist(),
+            scores.tolist(),
+            ACTION_REASON[actions].tolist(),
+        )
+
+    def _score_loop(self, states, values, class_ids, confidences):
+        """Cùng kết quả với đường NumPy, tra bảng từng phần tử"""
+        _, _, _, low, high = _dtype_constants(confidences.dtype)
+        name_ids, scores, reason_ids = [], [], []
+        for state, value, ids, row, row_values in zip(
+            states, values, class_ids.tolist(), confidences, confidences.tolist()
+        ):
+            rows = self._rows[state]
+            names, row_scores, reasons = [], [], []
+            for j, (class_id, confidence) in enumerate(zip(ids, row_values)):
+                if confidence < low:
+                    action = rows[1][0][class_id]
+                elif confidence > high:
+                    action = rows[0][1][class_id]
+                else:
+                    action = rows[0][0][class_id]
+                name_id, reason_id, factor, cap = ACTIONS[action]
+                names.append(name_id)
+                reasons.append(reason_id)
+                if action == KEEP_ACTION:
+                    row_scores.append(confidence)
+                elif factor is None:
+                    row_scores.append(value)
+                else:
+                    # Boost: nhân trên scalar numpy như rules cũ
+                    row_scores.append(float(min(row[j] * factor, cap)))
+            name_ids.append(names)
+            scores.append(row_scores)
+            reason_ids.append(reasons)
+        return name_ids, scores, reason_ids
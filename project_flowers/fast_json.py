@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Fast JSON Responses
+Serialize response bằng orjson (ghi thẳng ra bytes, hiểu kiểu numpy), fallback về json
+của thư viện chuẩn khi chưa cài orjson
+
+Response được dựng từ kiểu Python thuần ngay từ đầu (xem build_prediction), nên không
+cần duyệt đệ quy để đổi kiểu numpy trước khi serialize; giá trị numpy còn sót vẫn được
+orjson (OPT_SERIALIZE_NUMPY) hoặc hook default xử lý.
+"""
+
+import json
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson là tùy chọn, chỉ ảnh hưởng tốc độ
+    orjson = None
+
+ORJSON_OPTIONS = (
+    orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+)
+CONTENT_TYPE = "application/json"
+
+
+def _default(obj):
+    """Chỉ được gọi cho object mà encoder không biết (không duyệt cả response)"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return DefaultJSONProvider.default(obj)
+
+
+def dumps(obj):
+    """Serialize obj thành JSON bytes (UTF-8, compact)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(
+        obj, default=_default, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider cho Flask (app.json) dùng dumps() ở trên cho jsonify.
+
+    Key không được sắp xếp (khác DefaultJSONProvider); debug mode vẫn in JSON có
+    indent như mặc định của Flask.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault("default", _default)
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode("utf-8")
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b"\n", mimetype=self.mimetype)
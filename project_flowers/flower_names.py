@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Vietnamese Flower Name Tables
+Bảng tên tiếng Việt dựng một lần khi load: tra theo class id bằng index, tra theo tên
+tự do (tên do enhancement rules trả về) có memoize
+
+Quy tắc giữ nguyên như các hàm map cũ: key đầu tiên (theo thứ tự trong mapping) là
+chuỗi con của tên viết thường thắng, không khớp key nào thì trả về tên gốc dạng Title.
+"""
+
+from functools import lru_cache
+
+# Số tên tự do được nhớ mỗi bảng (tên từ rules chỉ có vài chục giá trị khác nhau)
+NAME_CACHE_SIZE = 1024
+
+
+class VietnameseNameTable:
+    """Bảng tên tiếng Việt cho một mapping {chuỗi con tiếng Anh: tên tiếng Việt}.
+
+    by_class[i] là tên tiếng Việt của class_names[i], tính sẵn khi khởi tạo.
+    """
+
+    def __init__(self, mapping, class_names=()):
+        self._entries = tuple(mapping.items())
+        self.lookup = lru_cache(maxsize=NAME_CACHE_SIZE)(self._match)
+        self.by_class = tuple(self._match(name) for name in class_names)
+
+    def _match(self, english_name):
+        english_lower = english_name.lower()
+        for key, name in self._entries:
+            if key in english_lower:
+                return name
+        return english_name.title()
+
+    def for_class(self, class_id):
+        """Tên tiếng Việt theo class id (O(1))"""
+        return self.by_class[class_id]
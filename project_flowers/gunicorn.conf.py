@@ -0,0 +1,54 @@
+"""
+Gunicorn configuration cho production serving
+Master preload code + TensorFlow, sau đó fork N worker; mỗi worker load model ngay sau khi fork
+
+Chạy:  gunicorn -c gunicorn.conf.py app:app
+       gunicorn -c gunicorn.conf.py enhanced_api:app
+       FLOWER_BIND=0.0.0.0:8000,0.0.0.0:8001 gunicorn -c gunicorn.conf.py unified_api:app
+"""
+
+import os
+import multiprocessing
+
+# Số worker process và số thread mỗi worker (thread giúp micro-batching gom request)
+workers = int(os.environ.get("FLOWER_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("FLOWER_WORKER_THREADS", "4"))
+worker_class = "gthread"
+
+# Có thể bind nhiều địa chỉ, phân cách bằng dấu phẩy (unified_api chọn contract theo port)
+bind = os.environ.get("FLOWER_BIND", "0.0.0.0:8000").split(",")
+timeout = int(os.environ.get("FLOWER_WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+# Import app (Flask, NumPy, TensorFlow) một lần trong master, worker dùng chung
+# các trang bộ nhớ này theo copy-on-write
+preload_app = True
+
+# TF runtime không an toàn khi fork: master chỉ import, model được load trong worker
+os.environ["FLOWER_DEFER_MODEL_LOAD"] = "1"
+
+# Chia core cho các worker: mặc định mỗi worker dùng cpu_count / workers thread TF
+os.environ.setdefault(
+    "FLOWER_TF_INTRA_OP_THREADS",
+    str(max(1, multiprocessing.cpu_count() // workers)),
+)
+os.environ.setdefault("FLOWER_TF_INTER_OP_THREADS", "1")
+
+accesslog = "-"
+errorlog = "-"
+loglevel = "info"
+
+
+def post_worker_init(worker):
+    """Load model trong worker vừa fork, rồi build catalog index (thread nền)"""
+    import model_serving
+    import product_search
+
+    model_serving.load_deferred_models()
+    product_search.start_catalog_searches()
+    worker.log.info(
+        f"Worker {os.getpid()} ready "
+        f"(intra_op={os.environ['FLOWER_TF_INTRA_OP_THREADS']}, "
+        f"inter_op={os.environ['FLOWER_TF_INTER_OP_THREADS']})"
+    )
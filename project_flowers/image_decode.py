@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Shared Image Decode Stage
+Decode ảnh upload thẳng về kích thước nhỏ nhất >= 224x224 (JPEG DCT scaling) trước khi resize;
+preprocess_pixels() trả về một buffer uint8 duy nhất cho model input và các color feature
+"""
+
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from metrics import stage
+
+IMG_SIZE = (224, 224)
+SUPPORTED_MODES = ["RGB", "RGBA", "L"]
+
+# Backend decode: "pil" (mặc định) hoặc "tf" (tf.io.decode_jpeg với ratio)
+DECODE_BACKEND = os.environ.get("FLOWER_DECODE_BACKEND", "pil")
+
+
+class UnsupportedImageError(ValueError):
+    """Ảnh có format hoặc color mode không được hỗ trợ (HTTP 400)"""
+
+    status = 400
+    public_message = "Unsupported image format"
+
+
+class InvalidImageError(UnsupportedImageError):
+    """Dữ liệu không phải ảnh, hoặc header/dữ liệu ảnh bị cắt hay hỏng (HTTP 400)"""
+
+    public_message = "Invalid image file"
+
+
+class ImageTooLargeError(UnsupportedImageError):
+    """Upload hoặc kích thước ảnh vượt giới hạn của endpoint (HTTP 413)"""
+
+    status = 413
+
+    @property
+    def public_message(self):
+        return str(self)
+
+
+def _as_file(source):
+    """Nhận bytes hoặc đường dẫn file"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+
+def probe_image(source, limits=None, allowed_modes=None):
+    """Mở ảnh chỉ đọc header (format, kích thước, color mode) và kiểm tra giới hạn.
+
+    Image.open() không decode pixel, nên ảnh sai format hoặc quá lớn (kể cả
+    decompression bomb) bị từ chối trước khi cấp phát buffer. limits là
+    upload_limits.UploadLimits (max_pixels, formats) của endpoint. Trả về ảnh PIL
+    chưa decode.
+    """
+    try:
+        image = Image.open(_as_file(source))
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError("Image too large (possible decompression bomb)") from e
+    except (FileNotFoundError, PermissionError, IsADirectoryError):
+        raise
+    except OSError as e:  # UnidentifiedImageError, header bị cắt/hỏng
+        raise InvalidImageError(f"Invalid image file: {e}") from e
+
+    if allowed_modes is not None and image.mode not in allowed_modes:
+        raise UnsupportedImageError(f"Unsupported image mode: {image.mode}")
+    if limits is not None:
+        if image.format not in limits.formats:
+            raise UnsupportedImageError(f"Unsupported image format: {image.format}")
+        if image.width * image.height > limits.max_pixels:
+            raise ImageTooLargeError(
+                f"Image too large: {image.width}x{image.height} pixels "
+                f"(max {limits.max_pixels} pixels)"
+            )
+    return image
+
+
+def open_reduced(source, size=IMG_SIZE, allowed_modes=None, limits=None):
+    """Mở ảnh và decode ở độ phân giải nhỏ nhất vẫn >= size (chưa resize cuối).
+
+    JPEG dùng draft mode (downscale 1/2, 1/4, 1/8 ngay trong miền DCT nên không
+    bao giờ decode full resolution); các format khác dùng reduce() theo hệ số nguyên.
+    """
+    image = probe_image(source, limits, allowed_modes)
+
+    # reduce()/convert() mới decode pixel: header hợp lệ nhưng dữ liệu bị cắt/hỏng
+    # cũng trả về 400
+    try:
+        if image.format == "JPEG":
+            image.draft("RGB", size)
+        else:
+            factor = min(image.width // size[0], image.height // size[1])
+            if factor >= 2:
+                image = image.reduce(factor)
+        return image.convert("RGB")
+    except OSError as e:
+        raise InvalidImageError(f"Invalid image data: {e}") from e
+
+
+def _decode_tf(data, size):
+    """Decode JPEG bằng tf.io.decode_jpeg với ratio lớn nhất vẫn giữ >= size"""
+    import tensorflow as tf
+
+    width, height = Image.open(io.BytesIO(data)).size
+    ratio = 1
+    while (
+        ratio < 8
+        and width // (ratio * 2) >= size[0]
+        and height // (ratio * 2) >= size[1]
+    ):
+        ratio *= 2
+
+    image = tf.io.decode_jpeg(data, channels=3, ratio=ratio)
+    image = tf.image.resize(image, size, method="bicubic", antialias=True)
+    image = tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8)
+    return Image.fromarray(np.asarray(image))
+
+
+def decode_image(source, size=IMG_SIZE, backend=None, allowed_modes=None, limits=None):
+    """Decode ảnh (bytes hoặc đường dẫn) thành ảnh RGB đúng kích thước size.
+
+    Header được kiểm tra theo limits (probe_image) trước khi decode.
+    """
+    backend = backend or DECODE_BACKEND
+
+    if backend == "tf":
+        if not isinstance(source, (bytes, bytearray)):
+            with open(source, "rb") as f:
+                source = f.read()
+        header = probe_image(source, limits, allowed_modes)
+        if header.format == "JPEG":
+            with stage("decode"):
+                return _decode_tf(bytes(source), size)
+
+    with stage("decode"):
+        image = open_reduced(source, size, allowed_modes, limits)
+    if image.size != size:
+        with stage("resize"):
+            image = image.resize(size)
+    return image
+
+
+def preprocess_pixels(
+    source, size=IMG_SIZE, backend=None, allowed_modes=None, limits=None
+):
+    """Decode ảnh thành buffer uint8 (H, W, 3) dùng chung cho model và color features"""
+    image = decode_image(source, size, backend, allowed_modes, limits)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def channel_means(pixels):
+    """Trung bình từng kênh RGB trong [0, 1] bằng một lần reduction trên buffer uint8.
+
+    Tổng được tính bằng một phép nhân vector float32 (BLAS), nhanh hơn nhiều so với
+    reduction theo trục có stride; kết quả chính xác tuyệt đối khi tổng mỗi kênh
+    < 2^24 (luôn đúng với ảnh 224x224).
+    """
+    flat = pixels.reshape(-1, 3)
+    if len(flat) * 255 < 2**24:
+        sums = np.ones(len(flat), dtype=np.float32) @ flat
+    else:
+        sums = flat.sum(axis=0, dtype=np.float64)
+    return sums.astype(np.float64) / (255.0 * len(flat))
@@ -4,11 +4,25 @@ Improved Flower Recognition with Multiple Models
 Kết hợp Oxford Flowers với mapping rule-based cho accuracy cao hơn
 """
 
-import tensorflow as tf
 import numpy as np
-from PIL import Image
 import os
 
+from image_decode import decode_image
+from model_serving import load_serving_model
+from flower_names import VietnameseNameTable
+from color_analysis import analyze_colors
+
+# Mapping tên tiếng Việt
+VIETNAMESE_NAMES = {
+    "tulip": "Hoa Tulip",
+    "rose": "Hoa Hồng",
+    "sunflower": "Hoa Hướng Dương",
+    "cyclamen": "Hoa Tiên Khách",
+    "cape flower": "Hoa Mũi Cape",
+    "hippeastrum": "Hoa Huệ Tây",
+    # Add more mappings...
+}
+
 
 class ImprovedFlowerRecognition:
     def __init__(self):
@@ -130,51 +144,33 @@ class ImprovedFlowerRecognition:
             "trumpet creeper",
             "blackberry lily",
         ]
+        self.vietnamese_names = VietnameseNameTable(
+            VIETNAMESE_NAMES, self.oxford_classes
+        )
 
     def load_oxford_model(self):
         """Load Oxford Flowers model"""
         try:
             script_dir = os.path.dirname(os.path.abspath(__file__))
             model_path = os.path.join(script_dir, "oxford102_m2_optimized.h5")
-            self.oxford_model = tf.keras.models.load_model(model_path)
+            self.oxford_model = load_serving_model(model_path)
             print("Oxford model loaded successfully!")
         except Exception as e:
             print(f"Failed to load Oxford model: {e}")
 
     def analyze_visual_features(self, image):
         """Phân tích đặc điểm visual của hình ảnh"""
-        # Convert to HSV để phân tích màu sắc
-        import cv2
-
-        image_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2HSV)
-
-        # Phân tích màu sắc dominant
-        dominant_colors = self.get_dominant_colors(image_cv)
+        # Tỉ lệ nhóm màu từ histogram HSV (ảnh được lấy mẫu xuống trước khi phân tích)
+        color_analysis = analyze_colors(image)
 
         # Phân tích hình dạng (basic shape detection)
         shape_features = self.analyze_shape(image)
 
-        return {"dominant_colors": dominant_colors, "shape_features": shape_features}
-
-    def get_dominant_colors(self, hsv_image):
-        """Lấy màu sắc chủ đạo"""
-        # Simplified color analysis
-        h_channel = hsv_image[:, :, 0]
-
-        # Red range (0-10, 170-180)
-        red_mask = ((h_channel >= 0) & (h_channel <= 10)) | (
-            (h_channel >= 170) & (h_channel <= 180)
-        )
-        red_ratio = np.sum(red_mask) / h_channel.size
-
-        # Other color ranges...
-        pink_mask = (h_channel >= 140) & (h_channel <= 170)
-        pink_ratio = np.sum(pink_mask) / h_channel.size
-
-        yellow_mask = (h_channel >= 20) & (h_channel <= 30)
-        yellow_ratio = np.sum(yellow_mask) / h_channel.size
-
-        return {"red": red_ratio, "pink": pink_ratio, "yellow": yellow_ratio}
+        return {
+            "dominant_colors": color_analysis["color_ratios"],
+            "dominant_color": color_analysis["dominant_color"],
+            "shape_features": shape_features,
+        }
 
     def analyze_shape(self, image):
         """Phân tích hình dạng cơ bản"""
@@ -187,12 +183,14 @@ class ImprovedFlowerRecognition:
             return None
 
         # Chuẩn bị image cho Oxford model
-        image_resized = image.resize((224, 224))
+        image_resized = image
+        if image.size != (224, 224):
+            image_resized = image.resize((224, 224))
         image_array = np.array(image_resized) / 255.0
         image_array = np.expand_dims(image_array, axis=0)
 
         # Oxford prediction
-        oxford_predictions = self.oxford_model.predict(image_array, verbose=0)
+        oxford_predictions = self.oxford_model(image_array)
         top_5_indices = np.argsort(oxford_predictions[0])[-5:][::-1]
 
         # Visual analysis
@@ -228,7 +226,7 @@ class ImprovedFlowerRecognition:
                 results.append(
                     {
                         "class_name": class_name,
-                        "vietnamese_name": self.map_to_vietnamese(class_name),
+                        "vietnamese_name": self.vietnamese_names.for_class(idx),
                         "confidence": confidence,
                         "source": "oxford_model",
                     }
@@ -254,21 +252,7 @@ class ImprovedFlowerRecognition:
 
     def map_to_vietnamese(self, english_name):
         """Map tên hoa sang tiếng Việt"""
-        mapping = {
-            "tulip": "Hoa Tulip",
-            "rose": "Hoa Hồng",
-            "sunflower": "Hoa Hướng Dương",
-            "cyclamen": "Hoa Tiên Khách",
-            "cape flower": "Hoa Mũi Cape",
-            "hippeastrum": "Hoa Huệ Tây",
-            # Add more mappings...
-        }
-
-        for eng, viet in mapping.items():
-            if eng in english_name.lower():
-                return viet
-
-        return english_name.title()
+        return self.vietnamese_names.lookup(english_name)
 
 
 # Test function
@@ -278,7 +262,7 @@ def test_improved_recognition():
     # Test với image
     test_image_path = "test_tulip.jpg"  # Your tulip image
     if os.path.exists(test_image_path):
-        image = Image.open(test_image_path)
+        image = decode_image(test_image_path)
         results = recognizer.enhanced_predict(image)
 
         print("IMPROVED RECOGNITION RESULTS:")
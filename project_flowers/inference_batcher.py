@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Dynamic Micro-Batching Inference Scheduler
+Gom các request đồng thời thành một batch để chạy model một lần
+
+Admission control: hàng đợi bị giới hạn theo số ảnh đang chờ và theo thời gian chờ
+ước tính; vượt giới hạn thì submit() từ chối ngay (BatcherOverloadedError -> 503 kèm
+Retry-After) thay vì để request xếp hàng đến khi client timeout
+"""
+
+import os
+import math
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future, InvalidStateError
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Cấu hình mặc định (có thể override bằng biến môi trường)
+DEFAULT_MAX_BATCH_SIZE = int(os.environ.get("FLOWER_BATCH_MAX_SIZE", "16"))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get("FLOWER_BATCH_MAX_WAIT_MS", "5"))
+# Số ảnh tối đa đang chờ trong hàng đợi và thời gian chờ tối đa (0 = không giới hạn)
+DEFAULT_MAX_QUEUE_DEPTH = int(os.environ.get("FLOWER_QUEUE_MAX_DEPTH", "64"))
+DEFAULT_MAX_QUEUE_DELAY_MS = float(os.environ.get("FLOWER_QUEUE_MAX_DELAY_MS", "2000"))
+# Trọng số của batch mới nhất trong trung bình thời gian chạy một batch
+BATCH_SECONDS_SMOOTHING = 0.2
+
+# Một batcher cho mỗi predict_fn trong process (xem shared_batcher)
+_shared_batchers = {}
+_shared_lock = threading.Lock()
+
+
+class BatcherOverloadedError(RuntimeError):
+    """Hàng đợi inference đầy hoặc chờ quá lâu: request bị từ chối (503)"""
+
+    status = 503
+    public_message = "Server is busy, please retry later"
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        # Số giây client nên chờ trước khi thử lại (header Retry-After)
+        self.retry_after = retry_after
+
+    @property
+    def headers(self):
+        return {"Retry-After": str(self.retry_after)}
+
+
+class InferenceBatcher:
+    """Gom các ảnh đơn lẻ thành batch trước khi gọi predict_fn.
+
+    predict_fn nhận một mảng (N, ...) và trả về mảng (N, ...) theo cùng thứ tự,
+    hoặc dict các mảng (N, ...); khi đó mỗi Future nhận dict các phần tử thứ i.
+    Worker thread được khởi động lazily ở lần submit đầu tiên trong mỗi process,
+    nên batcher vẫn dùng được sau khi process bị fork.
+    """
+
+    def __init__(
+        self,
+        predict_fn,
+        max_batch_size=None,
+        max_wait_ms=None,
+        max_queue_depth=None,
+        max_queue_delay_ms=None,
+    ):
+        self.predict_fn = predict_fn
+        self.fn_name = getattr(predict_fn, "__name__", "predict")
+        self.max_batch_size = max(1, max_batch_size or DEFAULT_MAX_BATCH_SIZE)
+        self.max_wait = (
+            DEFAULT_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+        ) / 1000.0
+        self.max_queue_depth = (
+            DEFAULT_MAX_QUEUE_DEPTH if max_queue_depth is None else max_queue_depth
+        )
+        self.max_queue_delay = (
+            DEFAULT_MAX_QUEUE_DELAY_MS
+            if max_queue_delay_ms is None
+            else max_queue_delay_ms
+        ) / 1000.0
+        # Trung bình thời gian chạy một batch (None khi chưa chạy batch nào)
+        self.batch_seconds = None
+
+        self._lock = threading.Lock()
+        # Kiểm tra giới hạn và đưa vào hàng đợi là một bước (không vượt max_queue_depth)
+        self._admit_lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        """Khởi động worker thread nếu chưa có (hoặc sau khi fork)"""
+        if self._pid == os.getpid() and self._worker is not None:
+            return
+
+        with self._lock:
+            if self._pid == os.getpid() and self._worker is not None:
+                return
+
+            self._queue = queue.Queue()
+            self._worker = threading.Thread(
+                target=self._run, name="inference-batcher", daemon=True
+            )
+            self._pid = os.getpid()
+            self._worker.start()
+            logger.info(
+                f"Inference batcher started (max_batch_size={self.max_batch_size}, "
+                f"max_wait_ms={self.max_wait * 1000:.1f}, "
+                f"max_queue_depth={self.max_queue_depth}, "
+                f"max_queue_delay_ms={self.max_queue_delay * 1000:.0f})"
+            )
+
+    def submit(self, sample):
+        """Đưa một ảnh (không có batch dimension) vào hàng đợi, trả về Future.
+
+        Raise BatcherOverloadedError ngay (không xếp hàng) nếu hàng đợi đầy.
+        """
+        return self.submit_many([sample])[0]
+
+    def submit_many(self, samples):
+        """Đưa nhiều ảnh vào hàng đợi, trả về list Future theo cùng thứ tự.
+
+        Cả nhóm được nhận hoặc bị từ chối cùng lúc (BatcherOverloadedError).
+        """
+        self._ensure_worker()
+        futures = [Future() for _ in samples]
+        with self._admit_lock:
+            self.admit(len(samples))
+            enqueued = time.monotonic()
+            for sample, future in zip(samples, futures):
+                self._queue.put((sample, future, enqueued))
+        return futures
+
+    def max_images(self, limit):
+        """Số ảnh tối đa của một request nhiều ảnh: request lớn hơn max_queue_depth
+        không bao giờ được nhận, nên phải bị từ chối bằng 400 thay vì 503"""
+        if self.max_queue_depth:
+            return min(limit, self.max_queue_depth)
+        return limit
+
+    def queue_depth(self):
+        """Số ảnh đang chờ trong hàng đợi (0 nếu worker chưa chạy)"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def estimated_delay(self):
+        """Thời gian chờ (giây) ước tính của ảnh mới vào hàng đợi: batch đang chạy
+        + các batch đang chờ phía trước"""
+        if self.batch_seconds is None:
+            return 0.0
+        return (self.queue_depth() // self.max_batch_size + 1) * self.batch_seconds
+
+    def admit(self, count=1):
+        """Kiểm tra hàng đợi còn nhận thêm count ảnh, nếu không raise
+        BatcherOverloadedError. Endpoint gọi hàm này trước khi decode ảnh để request
+        bị từ chối không tốn thời gian decode."""
+        depth = self.queue_depth()
+        delay = self.estimated_delay()
+        if self.max_queue_depth and depth + count > self.max_queue_depth:
+            reason = "queue_full"
+        elif self.max_queue_delay and delay > self.max_queue_delay:
+            reason = "queue_delay"
+        else:
+            return
+        metrics.BATCHER_REJECTED.inc(self.fn_name, reason)
+        raise BatcherOverloadedError(
+            f"Inference queue overloaded ({reason}): {depth} waiting, "
+            f"estimated delay {delay * 1000:.0f}ms",
+            retry_after=max(1, math.ceil(delay)),
+        )
+
+    def predict(self, sample, timeout=None):
+        """Blocking: chờ kết quả của một ảnh"""
+        return self.submit(sample).result(timeout=timeout)
+
+    def predict_many(self, samples, timeout=None):
+        """Blocking: chạy nhiều ảnh qua hàng đợi, trả về output (N, ...) như
+        predict_fn (dict các mảng nếu predict_fn trả về dict)"""
+        futures = self.submit_many(samples)
+        try:
+            outputs = [future.result(timeout=timeout) for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        if isinstance(outputs[0], dict):
+            return {key: np.stack([out[key] for out in outputs]) for key in outputs[0]}
+        return np.stack(outputs)
+
+    def _collect_batch(self):
+        """Lấy item đầu tiên rồi gom thêm cho đến khi đủ batch hoặc hết thời gian chờ"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _expire(self, batch):
+        """Bỏ các ảnh đã chờ quá max_queue_delay (client nhiều khả năng đã timeout):
+        Future của chúng nhận BatcherOverloadedError thay vì chiếm chỗ trong batch"""
+        now = time.monotonic()
+        admitted = []
+        for sample, future, enqueued in batch:
+            waited = now - enqueued
+            metrics.QUEUE_WAIT.observe(waited, self.fn_name)
+            if self.max_queue_delay and waited > self.max_queue_delay:
+                metrics.BATCHER_REJECTED.inc(self.fn_name, "expired")
+                _resolve(
+                    future,
+                    exception=BatcherOverloadedError(
+                        f"Request waited {waited * 1000:.0f}ms in inference queue",
+                        retry_after=max(1, math.ceil(self.estimated_delay())),
+                    ),
+                )
+            else:
+                admitted.append((sample, future))
+        return admitted
+
+    def _run(self):
+        """Vòng lặp của worker thread: lỗi của một batch không được làm dừng thread
+        (mọi request sau đó sẽ treo)"""
+        while True:
+            try:
+                self._run_batch()
+            except Exception as e:
+                logger.error(f"Inference batcher loop error: {str(e)}", exc_info=True)
+
+    def _run_batch(self):
+        """Gom và chạy một batch"""
+        # Chỉ giữ Future chưa bị hủy; sau set_running_or_notify_cancel() client
+        # (predict_many, asyncio.wrap_future) không hủy được nữa
+        batch = self._expire(
+            [
+                item
+                for item in self._collect_batch()
+                if item[1].set_running_or_notify_cancel()
+            ]
+        )
+        if not batch:
+            return
+
+        samples = [sample for sample, _ in batch]
+        futures = [future for _, future in batch]
+
+        fn = self.fn_name
+        metrics.BATCH_SIZE.observe(len(samples), fn)
+        start = time.perf_counter()
+        try:
+            outputs = self.predict_fn(np.stack(samples))
+            elapsed = time.perf_counter() - start
+            metrics.BATCH_DURATION.observe(elapsed, fn)
+            self._record_batch_seconds(elapsed)
+        except Exception as e:
+            logger.error(f"Batched inference failed: {str(e)}", exc_info=True)
+            for future in futures:
+                _resolve(future, exception=e)
+            return
+
+        for i, future in enumerate(futures):
+            if isinstance(outputs, dict):
+                _resolve(future, {key: value[i] for key, value in outputs.items()})
+            else:
+                _resolve(future, outputs[i])
+
+    def _record_batch_seconds(self, elapsed):
+        """Cập nhật trung bình thời gian chạy một batch (dùng để ước tính delay)"""
+        if self.batch_seconds is None:
+            self.batch_seconds = elapsed
+        else:
+            self.batch_seconds += BATCH_SECONDS_SMOOTHING * (
+                elapsed - self.batch_seconds
+            )
+
+
+def _resolve(future, result=None, exception=None):
+    """Trả kết quả cho một Future; Future đã có kết quả (InvalidStateError) được bỏ
+    qua để không ảnh hưởng các Future khác trong batch"""
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        logger.warning("Inference result dropped: future already resolved")
+
+
+def shared_batcher(predict_fn):
+    """Trả về InferenceBatcher dùng chung cho predict_fn, để các API chạy chung
+    process (unified_api.py) gom request vào cùng một batch"""
+    with _shared_lock:
+        batcher = _shared_batchers.get(predict_fn)
+        if batcher is None:
+            batcher = InferenceBatcher(predict_fn)
+            _shared_batchers[predict_fn] = batcher
+        return batcher
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Load Test
+Phát tải đồng thời tới API server bằng ảnh trong images/jpg: throughput, p50/p95/p99/max
+và tỉ lệ lỗi theo endpoint + mode, lưu kết quả JSON để so sánh giữa các lần chạy
+
+Hai kiểu tải:
+    closed-loop  --concurrency N: N client, mỗi client gửi request kế tiếp ngay khi
+                 nhận response (đo throughput tối đa)
+    open-loop    --rate R: request đến theo tiến trình Poisson R req/s bất kể server
+                 trả lời nhanh hay chậm; latency tính từ thời điểm request lẽ ra được
+                 gửi, nên thời gian chờ phía client khi server quá tải cũng được tính
+
+Ví dụ:
+    python load_test.py --scenario /predict:enhanced --scenario /search-by-image \\
+                        --target http://localhost:8001 --concurrency 16 --requests 1000
+    python load_test.py --target dev=http://localhost:8000 --target prod=http://localhost:9000
+    python load_test.py --rate 40 --duration 60 --output results/rate40.json \\
+                        --compare results/baseline.json
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+import aiohttp
+
+PERCENTILES = (50, 95, 99)
+
+
+class Scenario:
+    """Một loại request: endpoint + mode (form field "mode") + tên field ảnh"""
+
+    def __init__(self, spec, field=None):
+        path, _, mode = spec.partition(":")
+        self.path = path if path.startswith("/") else "/" + path
+        self.mode = mode or None
+        # app.py nhận "image" ở /predict và "imageFile" ở /search-by-image;
+        # enhanced_api nhận cả hai nên mặc định này dùng được cho mọi server
+        self.field = field or ("imageFile" if "search" in self.path else "image")
+        self.name = f"{self.path} [{self.mode}]" if self.mode else self.path
+
+    def form(self, filename, data):
+        form = aiohttp.FormData()
+        form.add_field(self.field, data, filename=filename, content_type="image/jpeg")
+        if self.mode:
+            form.add_field("mode", self.mode)
+        return form
+
+
+class Recorder:
+    """Kết quả thô của từng request theo scenario"""
+
+    def __init__(self, scenarios):
+        self.latencies = {s.name: [] for s in scenarios}
+        self.errors = {s.name: {} for s in scenarios}
+        self.server_timing = {s.name: {} for s in scenarios}
+
+    def record(self, scenario, latency, outcome, server_timing=None):
+        if outcome == "ok":
+            self.latencies[scenario.name].append(latency)
+            for stage, duration in (server_timing or {}).items():
+                self.server_timing[scenario.name].setdefault(stage, []).append(duration)
+        else:
+            errors = self.errors[scenario.name]
+            errors[outcome] = errors.get(outcome, 0) + 1
+
+
+def parse_server_timing(header):
+    """Header Server-Timing -> {stage: ms}, vd "decode;dur=12.3" -> {"decode": 12.3}"""
+    timings = {}
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                try:
+                    timings[name] = float(value)
+                except ValueError:
+                    pass
+    return timings
+
+
+def load_images(images_dir, limit, seed):
+    """(tên file, bytes) của tối đa limit ảnh, xáo trộn cố định theo seed"""
+    paths = sorted(Path(images_dir).glob("*.jpg"))
+    random.Random(seed).shuffle(paths)
+    return [(path.name, path.read_bytes()) for path in paths[:limit]]
+
+
+class LoadTest:
+    def __init__(self, url, scenarios, images, args):
+        self.url = url.rstrip("/")
+        self.scenarios = scenarios
+        self.images = images
+        self.args = args
+        self.sent = 0
+
+    def next_request(self):
+        """Scenario và ảnh cho request kế tiếp (xoay vòng, trộn đều các scenario)"""
+        i = self.sent
+        self.sent += 1
+        scenario = self.scenarios[i % len(self.scenarios)]
+        filename, data = self.images[i % len(self.images)]
+        if self.args.bust_cache:
+            # Byte thừa sau JPEG EOI bị decoder bỏ qua nhưng đổi cache key
+            data = data + os.urandom(16)
+        return scenario, filename, data
+
+    async def send(self, session, recorder, scheduled=None):
+        scenario, filename, data = self.next_request()
+        start = scheduled if scheduled is not None else time.perf_counter()
+        server_timing = None
+        try:
+            async with session.post(
+                self.url + scenario.path, data=scenario.form(filename, data)
+            ) as response:
+                await response.read()
+                outcome = "ok" if response.status == 200 else str(response.status)
+                server_timing = parse_server_timing(
+                    response.headers.get("Server-Timing")
+                )
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+        except aiohttp.ClientError as e:
+            outcome = type(e).__name__
+        if recorder is not None:
+            recorder.record(
+                scenario, (time.perf_counter() - start) * 1000, outcome, server_timing
+            )
+
+    def finished(self, deadline):
+        if deadline is not None:
+            return time.perf_counter() >= deadline
+        return self.sent >= self.args.warmup + self.args.requests
+
+    async def closed_loop(self, session, recorder, deadline):
+        async def client():
+            while not self.finished(deadline):
+                await self.send(session, recorder)
+
+        await asyncio.gather(*(client() for _ in range(self.args.concurrency)))
+
+    async def open_loop(self, session, recorder, deadline):
+        rng = random.Random(self.args.seed)
+        tasks = set()
+        next_send = time.perf_counter()
+        while not self.finished(deadline):
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(self.send(session, recorder, next_send))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            next_send += rng.expovariate(self.args.rate)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def run(self):
+        """Warm-up rồi chạy tải, trả về (Recorder, thời gian chạy giây)"""
+        timeout = aiohttp.ClientTimeout(total=self.args.timeout)
+        limit = 0 if self.args.rate else self.args.concurrency
+        connector = aiohttp.TCPConnector(limit=limit)
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout
+        ) as session:
+            for _ in range(self.args.warmup):
+                await self.send(session, None)
+
+            recorder = Recorder(self.scenarios)
+            start = time.perf_counter()
+            deadline = start + self.args.duration if self.args.duration else None
+            if self.args.rate:
+                await self.open_loop(session, recorder, deadline)
+            else:
+                await self.closed_loop(session, recorder, deadline)
+            return recorder, time.perf_counter() - start
+
+
+def summarize(latencies, errors, server_timing, elapsed):
+    """Thống kê của một scenario (hoặc tổng)"""
+    total = len(latencies) + sum(errors.values())
+    summary = {
+        "requests": total,
+        "ok": len(latencies),
+        "errors": errors,
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+    if latencies:
+        values = np.asarray(latencies)
+        summary["latency_ms"] = {
+            "mean": round(float(values.mean()), 2),
+            **{f"p{p}": round(float(np.percentile(values, p)), 2) for p in PERCENTILES},
+            "max": round(float(values.max()), 2),
+        }
+    if server_timing:
+        summary["server_timing_ms"] = {
+            stage: round(float(np.mean(values)), 2)
+            for stage, values in server_timing.items()
+        }
+    return summary
+
+
+def summarize_run(recorder, elapsed):
+    scenarios = {
+        name: summarize(
+            recorder.latencies[name],
+            recorder.errors[name],
+            recorder.server_timing[name],
+            elapsed,
+        )
+        for name in recorder.latencies
+    }
+    errors = {}
+    for scenario_errors in recorder.errors.values():
+        for outcome, count in scenario_errors.items():
+            errors[outcome] = errors.get(outcome, 0) + count
+    overall = summarize(
+        [latency for values in recorder.latencies.values() for latency in values],
+        errors,
+        {},
+        elapsed,
+    )
+    return {"elapsed": round(elapsed, 2), "overall": overall, "scenarios": scenarios}
+
+
+def print_results(label, result):
+    print(f"\n{label}  ({result['elapsed']}s)")
+    print(
+        f"{'scenario':<28}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}"
+        f"{'max':>9}{'errors':>9}"
+    )
+    rows = list(result["scenarios"].items())
+    if len(rows) > 1:
+        rows.append(("overall", result["overall"]))
+    for name, summary in rows:
+        latency = summary.get("latency_ms", {})
+        print(
+            f"{name:<28}{summary['throughput']:>9.1f}"
+            + "".join(
+                f"{latency.get(key, float('nan')):>9.1f}"
+                for key in ("p50", "p95", "p99", "max")
+            )
+            + f"{summary['error_rate']:>8.1%}"
+        )
+    for name, summary in result["scenarios"].items():
+        if summary["errors"]:
+            print(f"  {name} errors: {summary['errors']}")
+        if summary.get("server_timing_ms"):
+            stages = ", ".join(
+                f"{stage}={value}"
+                for stage, value in summary["server_timing_ms"].items()
+            )
+            print(f"  {name} server (mean ms): {stages}")
+
+
+def print_comparison(results, baseline_path):
+    """So sánh throughput / p50 / p99 với một file kết quả trước đó"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["targets"]
+
+    def change(new, old):
+        return f"{(new - old) / old:+.1%}" if old else "n/a"
+
+    print(f"\nCompared with {baseline_path}")
+    print(f"{'target / scenario':<40}{'req/s':>10}{'p50':>10}{'p99':>10}")
+    for label, result in results.items():
+        for name, summary in result["scenarios"].items():
+            old = baseline.get(label, {}).get("scenarios", {}).get(name)
+            if old is None or "latency_ms" not in old or "latency_ms" not in summary:
+                continue
+            print(
+                f"{label + ' ' + name:<40}"
+                f"{change(summary['throughput'], old['throughput']):>10}"
+                f"{change(summary['latency_ms']['p50'], old['latency_ms']['p50']):>10}"
+                f"{change(summary['latency_ms']['p99'], old['latency_ms']['p99']):>10}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--target",
+        action="append",
+        help="url hoặc label=url, có thể lặp lại (mặc định http://localhost:8000)",
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        help="endpoint[:mode], có thể lặp lại để trộn tải (mặc định /predict)",
+    )
+    parser.add_argument("--field", help="Tên field ảnh (mặc định theo endpoint)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, help="Open-loop: số request/giây")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--duration", type=float, help="Chạy theo thời gian (giây)")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--images-dir", default="images/jpg")
+    parser.add_argument("--images", type=int, default=500)
+    parser.add_argument(
+        "--bust-cache",
+        action="store_true",
+        help="Thêm byte ngẫu nhiên vào mỗi ảnh để không trúng prediction cache",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    parser.add_argument("--compare", help="File JSON của lần chạy trước để so sánh")
+    args = parser.parse_args()
+
+    images = load_images(args.images_dir, args.images, args.seed)
+    if not images:
+        parser.error(f"No images found in {args.images_dir}")
+    scenarios = [Scenario(spec, args.field) for spec in args.scenario or ["/predict"]]
+    targets = []
+    for target in args.target or ["http://localhost:8000"]:
+        label, sep, url = target.partition("=")
+        if not sep or "://" in label:
+            label = url = target
+        targets.append((label, url))
+
+    load = f"rate {args.rate} req/s" if args.rate else f"concurrency {args.concurrency}"
+    amount = f"{args.duration}s" if args.duration else f"{args.requests} requests"
+    print("=" * 82)
+    print(f"{load} | {amount} | images: {len(images)} | cache bust: {args.bust_cache}")
+    print("Scenarios: " + ", ".join(s.name for s in scenarios))
+    print("=" * 82)
+
+    results = {}
+    for label, url in targets:
+        recorder, elapsed = asyncio.run(LoadTest(url, scenarios, images, args).run())
+        results[label] = summarize_run(recorder, elapsed)
+        print_results(label, results[label])
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    "config": {
+                        "targets": dict((label, url) for label, url in targets),
+                        "scenarios": [s.name for s in scenarios],
+                        "concurrency": None if args.rate else args.concurrency,
+                        "rate": args.rate,
+                        "requests": None if args.duration else args.requests,
+                        "duration": args.duration,
+                        "warmup": args.warmup,
+                        "images": len(images),
+                        "bust_cache": args.bust_cache,
+                    },
+                    "targets": results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
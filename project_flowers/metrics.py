@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Prometheus-Style Metrics
+Counter / histogram / gauge tối giản (không cần prometheus_client) và endpoint /metrics
+
+Mỗi observe chỉ là một bisect + cộng dưới lock, đủ rẻ để bật thường trực trong
+production. Các stage của một request (multipart, decode, resize, inference, rules,
+serialize) được đo bằng `with stage("decode"):` và gắn nhãn service/route của
+request hiện tại (begin_request/end_request, gọi bởi instrument_flask hoặc middleware
+của async_api); end_request trả về header Server-Timing của request đó.
+
+Với gunicorn nhiều worker, mỗi worker có registry riêng: /metrics trả về số liệu
+của worker nhận request scrape.
+"""
+
+import os
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Bucket latency (giây): 0.5ms -> 10s
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_metrics = []
+_registered = set()  # (loại, id) đã register, unified_api dùng chung batcher/model
+# ContextVar thay vì threading.local: dùng được cho cả thread của Flask lẫn task asyncio
+_request_context = contextvars.ContextVar("flower_request_context", default=None)
+
+# Thêm header Server-Timing (thời gian từng stage, ms) vào mọi response
+SERVER_TIMING = os.environ.get("FLOWER_SERVER_TIMING", "1") == "1"
+# Tên stage trong Server-Timing (resize = preprocess)
+SERVER_TIMING_NAMES = {"resize": "preprocess"}
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in pairs
+    )
+    return "{" + body + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Counter theo tổ hợp nhãn"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Histogram cumulative theo tổ hợp nhãn (giống prometheus_client)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [counts theo bucket (+Inf cuối), sum]
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = [
+                (labels, counts[:], total)
+                for labels, (counts, total) in self._series.items()
+            ]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(
+                        self.labelnames, labels, [("le", _format_value(float(bound)))]
+                    ),
+                    cumulative,
+                )
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _format_labels(
+                self.labelnames, labels
+            ), cumulative
+
+
+class Gauge:
+    """Metric đọc giá trị lúc scrape: callback trả về {tuple nhãn: giá trị}.
+
+    kind="counter" cho giá trị tích lũy có sẵn ở nơi khác (vd hit/miss của cache).
+    """
+
+    def __init__(self, name, documentation, labelnames=(), kind="gauge"):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._callbacks = []
+        _metrics.append(self)
+
+    def add_callback(self, callback):
+        self._callbacks.append(callback)
+
+    def samples(self):
+        for callback in self._callbacks:
+            for labels, value in callback().items():
+                yield self.name, _format_labels(self.labelnames, labels), value
+
+
+# Metric dùng chung cho mọi service trong process
+REQUESTS = Counter(
+    "flower_requests_total",
+    "HTTP requests by route, mode and status",
+    ("service", "route", "mode", "status"),
+)
+REQUEST_DURATION = Histogram(
+    "flower_request_duration_seconds",
+    "End-to-end request handling time",
+    ("service", "route"),
+)
+STAGE_DURATION = Histogram(
+    "flower_stage_duration_seconds",
+    "Time spent per request stage",
+    ("service", "route", "stage"),
+)
+BATCH_SIZE = Histogram(
+    "flower_batch_size",
+    "Images per batched model call",
+    ("fn",),
+    buckets=BATCH_SIZE_BUCKETS,
+)
+BATCH_DURATION = Histogram(
+    "flower_batch_inference_seconds",
+    "Model time per batched call",
+    ("fn",),
+)
+QUEUE_DEPTH = Gauge(
+    "flower_batcher_queue_depth", "Images waiting in the inference batcher", ("fn",)
+)
+QUEUE_WAIT = Histogram(
+    "flower_batcher_queue_wait_seconds",
+    "Time an image waited in the inference batcher queue",
+    ("fn",),
+)
+BATCHER_REJECTED = Counter(
+    "flower_batcher_rejected_total",
+    "Images rejected by batcher admission control (queue_full, queue_delay, expired)",
+    ("fn", "reason"),
+)
+CACHE_LOOKUPS = Gauge(
+    "flower_cache_lookups_total",
+    "Prediction cache lookups by result",
+    ("service", "result"),
+    kind="counter",
+)
+CACHE_HIT_RATIO = Gauge(
+    "flower_cache_hit_ratio", "Prediction cache hit ratio", ("service",)
+)
+CACHE_ENTRIES = Gauge("flower_cache_entries", "Prediction cache entries", ("service",))
+MODEL_READY = Gauge(
+    "flower_model_ready", "1 when the model is loaded and warm", ("backend",)
+)
+
+
+def render():
+    """Toàn bộ metric theo text exposition format của Prometheus"""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class RequestContext:
+    """Nhãn và thời gian từng stage của request đang xử lý"""
+
+    __slots__ = ("service", "route", "mode", "start", "timings")
+
+    def __init__(self, service, route):
+        self.service = service
+        self.route = route
+        self.mode = ""
+        self.start = time.perf_counter()
+        self.timings = {}
+
+
+def begin_request(service, route):
+    """Bắt đầu đo một request (gọi ở đầu request, trong thread/task xử lý nó)"""
+    context = RequestContext(service, route)
+    _request_context.set(context)
+    return context
+
+
+def end_request(status):
+    """Ghi request count + latency, trả về giá trị header Server-Timing"""
+    context = _request_context.get()
+    if context is None:
+        return None
+    _request_context.set(None)
+
+    total = time.perf_counter() - context.start
+    REQUEST_DURATION.observe(total, context.service, context.route)
+    REQUESTS.inc(context.service, context.route, context.mode, str(status))
+    return server_timing_header(context.timings, total)
+
+
+def server_timing_header(timings, total):
+    """Server-Timing: decode;dur=12.1, preprocess;dur=0.8, ..., total;dur=45.0 (ms)"""
+    durations = {}
+    for name, seconds in timings.items():
+        name = SERVER_TIMING_NAMES.get(name, name)
+        durations[name] = durations.get(name, 0.0) + seconds
+    durations["total"] = total
+    return ", ".join(
+        f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items()
+    )
+
+
+def set_request_mode(mode):
+    """Gán nhãn mode cho request hiện tại (enhanced/oxford/visual/...)"""
+    context = _request_context.get()
+    if context is not None:
+        context.mode = mode
+
+
+@contextmanager
+def stage(name):
+    """Đo thời gian một stage: ghi vào flower_stage_duration_seconds và vào
+    Server-Timing của request hiện tại (~4µs)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        context = _request_context.get()
+        if context is None:
+            STAGE_DURATION.observe(duration, "", "", name)
+        else:
+            STAGE_DURATION.observe(duration, context.service, context.route, name)
+            context.timings[name] = context.timings.get(name, 0.0) + duration
+
+
+def _register_once(kind, obj):
+    key = (kind, id(obj))
+    if key in _registered:
+        return False
+    _registered.add(key)
+    return True
+
+
+def register_cache(service, cache):
+    """Xuất thống kê của một PredictionCache"""
+    if not _register_once("cache", cache):
+        return
+
+    def lookups():
+        stats = cache.stats()
+        return {
+            (service, "hit"): stats["hits"],
+            (service, "miss"): stats["misses"],
+        }
+
+    CACHE_LOOKUPS.add_callback(lookups)
+    CACHE_HIT_RATIO.add_callback(lambda: {(service,): cache.stats()["hit_rate"]})
+    CACHE_ENTRIES.add_callback(lambda: {(service,): cache.stats()["entries"]})
+
+
+def register_batcher(batcher):
+    """Xuất độ dài hàng đợi của một InferenceBatcher"""
+    if not _register_once("batcher", batcher):
+        return
+    fn = getattr(batcher.predict_fn, "__name__", "predict")
+    QUEUE_DEPTH.add_callback(lambda: {(fn,): batcher.queue_depth()})
+
+
+def register_model(model):
+    """Xuất trạng thái ready của serving model"""
+    if not _register_once("model", model):
+        return
+    MODEL_READY.add_callback(lambda: {(model.backend,): int(model.ready)})
+
+
+def instrument_flask(app, service):
+    """Đếm request / đo latency cho mọi route của app và thêm route /metrics"""
+    from flask import Response, request
+
+    @app.before_request
+    def _start_request_timer():
+        begin_request(
+            service, request.url_rule.rule if request.url_rule else "unmatched"
+        )
+
+    @app.after_request
+    def _record_request(response):
+        header = end_request(response.status_code)
+        if header is not None and SERVER_TIMING:
+            response.headers["Server-Timing"] = header
+        return response
+
+    @app.before_request
+    def _parse_multipart():
+        # Đo riêng thời gian parse multipart (Flask parse lazily ở lần đầu đọc files)
+        if request.mimetype == "multipart/form-data":
+            with stage("multipart"):
+                request.files
+
+    # jsonify đi qua app.json.response: đo thời gian dựng JSON response
+    json_response = app.json.response
+
+    def timed_json_response(*args, **kwargs):
+        with stage("serialize"):
+            return json_response(*args, **kwargs)
+
+    app.json.response = timed_json_response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(render(), content_type=CONTENT_TYPE)
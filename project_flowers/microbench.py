@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: Python Hot Path
+Đo riêng từng hàm trên đường xử lý request (không cần server đang chạy) với input thật,
+so sánh với file baseline để phát hiện regression ngay sau mỗi thay đổi
+
+Ví dụ (chạy trong thư mục có model và images/jpg, giống API server):
+    python microbench.py                                  # so với microbench_baseline.json
+    python microbench.py --filter rules --filter decode   # chỉ chạy một số benchmark
+    python microbench.py --save microbench_baseline.json  # ghi baseline mới
+
+Thoát với mã 1 nếu min µs của benchmark nào (chuẩn hóa theo tốc độ máy đo bằng
+benchmark "reference") chậm hơn baseline quá --threshold.
+Baseline phụ thuộc máy: ghi lại baseline trên máy dùng để so sánh.
+"""
+
+import io
+import os
+import json
+import time
+import logging
+import platform
+import argparse
+import statistics
+from itertools import cycle
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+BASELINE_PATH = "microbench_baseline.json"
+REFERENCE = "reference"
+
+# Import các API như server (load model một lần, model dùng chung giữa app và enhanced_api)
+import app as classic_api
+import enhanced_api
+import fast_json
+from color_analysis import analyze_colors
+from embedding_index import EmbeddingIndex
+from image_decode import preprocess_pixels
+from model_serving import EMBEDDING_DIM, TOP_K
+
+# Log INFO của enhancement rules ghi ra stderr mỗi lần gọi: tắt để chỉ đo phần tính toán
+logging.getLogger().setLevel(logging.WARNING)
+
+api = enhanced_api.recognition_system
+
+
+def wait_for_background_work():
+    """Chờ catalog index build xong, tránh thread nền tranh CPU với benchmark"""
+    search = classic_api.catalog_search
+    while search.status in ("pending", "building") and search.model.loaded:
+        time.sleep(0.5)
+
+
+def load_inputs(images_dir, count):
+    """Input thật: bytes JPEG Oxford, buffer 224x224 và color features của chúng"""
+    paths = sorted(Path(images_dir).glob("*.jpg"))[:count]
+    if not paths:
+        raise SystemExit(f"No images found in {images_dir}")
+    jpegs = [path.read_bytes() for path in paths]
+    pixels = [preprocess_pixels(data) for data in jpegs]
+    features = [api.analyze_color_features(p) for p in pixels]
+
+    # Ảnh chụp điện thoại 12MP, cùng nội dung với ảnh Oxford đầu tiên
+    large = io.BytesIO()
+    Image.open(io.BytesIO(jpegs[0])).convert("RGB").resize((4032, 3024)).save(
+        large, format="JPEG", quality=90
+    )
+    return jpegs, large.getvalue(), pixels, features
+
+
+def serving_outputs(rng, count):
+    """Output của serving graph cho một ảnh: top-k numpy như model.serve() trả về"""
+    outputs = []
+    for _ in range(count):
+        probabilities = rng.dirichlet(np.full(102, 0.1)).astype(np.float32)
+        indices = np.argsort(-probabilities)[:TOP_K].astype(np.int32)
+        outputs.append(
+            {
+                "top_k_indices": indices,
+                "top_k_values": probabilities[indices],
+                "color_mean": rng.uniform(0.2, 0.9, 3).astype(np.float32),
+            }
+        )
+    return outputs
+
+
+def build_benchmarks(images_dir, image_count):
+    """{tên: hàm không tham số}, mỗi lần gọi tương ứng phần việc của một request"""
+    jpegs, large_jpeg, pixels, features = load_inputs(images_dir, image_count)
+    rng = np.random.default_rng(0)
+    outputs = serving_outputs(rng, 64)
+    names = api.class_names
+
+    jpeg_iter = cycle(jpegs)
+    pixel_iter = cycle(pixels)
+    ratio_iter = cycle(
+        [(f["red_ratio"], f["green_ratio"], f["blue_ratio"]) for f in features]
+    )
+    # Top-5 của một request (mảng (1, K) như serving graph) + color features của ảnh
+    rules_iter = cycle(
+        [
+            (o["top_k_indices"][None], o["top_k_values"][None], [feature])
+            for o, feature in zip(outputs, cycle(features))
+        ]
+    )
+    # Top-5 của cả batch MAX_BATCH_IMAGES ảnh trong một lần chấm
+    batch_size = enhanced_api.MAX_BATCH_IMAGES
+    rules_batch = (
+        np.stack([o["top_k_indices"] for o in outputs[:batch_size]]),
+        np.stack([o["top_k_values"] for o in outputs[:batch_size]]),
+        [feature for _, feature in zip(range(batch_size), cycle(features))],
+    )
+    # Cả 102 class của một ảnh
+    probabilities = rng.dirichlet(np.full(len(names), 0.1)).astype(np.float32)
+    rules_all = (
+        np.arange(len(names))[None],
+        probabilities[None],
+        [features[0]],
+    )
+    name_iter = cycle(names)
+    output_iter = cycle(outputs)
+    results = [api.build_prediction(o, "enhanced") for o in outputs]
+    # Payload /search-by-image (lồng predictions + color_analysis)
+    search_payloads = cycle([enhanced_api.build_search_response(r) for r in results])
+    result_iter = cycle(results)
+
+    large_pixels = np.asarray(Image.open(io.BytesIO(large_jpeg)).convert("RGB"))
+
+    catalog = EmbeddingIndex(EMBEDDING_DIM)
+    vectors = rng.standard_normal((668, EMBEDDING_DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    catalog.add([f"/images/{i}.jpg" for i in range(len(vectors))], vectors)
+    query_iter = cycle(vectors[:32])
+
+    return {
+        "decode_resize_oxford": lambda: preprocess_pixels(next(jpeg_iter)),
+        "decode_resize_12mp": lambda: preprocess_pixels(large_jpeg),
+        "analyze_color_features": lambda: api.analyze_color_features(next(pixel_iter)),
+        "analyze_colors": lambda: analyze_colors(next(pixel_iter)),
+        "analyze_colors_12mp": lambda: analyze_colors(large_pixels),
+        "classify_dominant_color_advanced": lambda: api.classify_dominant_color_advanced(
+            *next(ratio_iter)
+        ),
+        "apply_enhancement_rules_top5": lambda: api.rules.score(*next(rules_iter)),
+        "apply_enhancement_rules_batch": lambda: api.rules.score(*rules_batch),
+        "apply_enhancement_rules_all_classes": lambda: api.rules.score(*rules_all),
+        "map_to_vietnamese": lambda: api.map_to_vietnamese(next(name_iter)),
+        "map_flower_to_vietnamese": lambda: classic_api.map_flower_to_vietnamese(
+            next(name_iter)
+        ),
+        "serialize_search_response": lambda: fast_json.dumps(next(search_payloads)),
+        "build_search_response": lambda: enhanced_api.build_search_response(
+            next(result_iter)
+        ),
+        "build_prediction_enhanced": lambda: api.build_prediction(
+            next(output_iter), "enhanced"
+        ),
+        "build_top_predictions_classic": lambda: classic_api.build_top_predictions(
+            next(output_iter)
+        ),
+        "catalog_topk_search": lambda: catalog.search(next(query_iter), 10),
+    }
+
+
+def reference_workload(values=np.arange(4096, dtype=np.float64)):
+    """Việc cố định (Python + NumPy nhỏ) dùng làm đơn vị đo tốc độ máy"""
+    total = 0.0
+    for i in range(200):
+        total += float(values[i]) * 0.5
+    return total + float(values.sum())
+
+
+def calibrate(fn, min_time):
+    """Số vòng gọi fn để một lần đo >= min_time (giống timeit.autorange)"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return loops
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)))
+
+
+def measure(benchmarks, min_time, repeats):
+    """Đo µs/lần gọi của mọi benchmark. Các lần lặp chạy xen kẽ giữa các benchmark
+    nên máy chậm đi tạm thời ảnh hưởng đều lên tất cả (kể cả REFERENCE)"""
+    loops = {name: calibrate(fn, min_time) for name, fn in benchmarks.items()}
+    timings = {name: [] for name in benchmarks}
+    for _ in range(repeats):
+        for name, fn in benchmarks.items():
+            start = time.perf_counter()
+            for _ in range(loops[name]):
+                fn()
+            timings[name].append((time.perf_counter() - start) / loops[name] * 1e6)
+    return {
+        name: {
+            "median_us": round(statistics.median(values), 3),
+            "min_us": round(min(values), 3),
+            "loops": loops[name],
+        }
+        for name, values in timings.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--images-dir", default="images/jpg")
+    parser.add_argument("--images", type=int, default=32)
+    parser.add_argument(
+        "--filter", action="append", help="Chỉ chạy benchmark có tên chứa chuỗi này"
+    )
+    parser.add_argument("--min-time", type=float, default=0.2, help="Giây mỗi lần đo")
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument(
+        "--compare", default=BASELINE_PATH, help="File baseline để so sánh"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="Tỉ lệ min mới/baseline (đã chuẩn hóa) bị coi là regression",
+    )
+    parser.add_argument(
+        "--save", help="Ghi kết quả ra file (vd microbench_baseline.json)"
+    )
+    args = parser.parse_args()
+
+    wait_for_background_work()
+    benchmarks = build_benchmarks(args.images_dir, args.images)
+    if args.filter:
+        benchmarks = {
+            name: fn
+            for name, fn in benchmarks.items()
+            if any(pattern in name for pattern in args.filter)
+        }
+
+    baseline = {}
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    benchmarks[REFERENCE] = reference_workload
+    results = measure(benchmarks, args.min_time, args.repeats)
+
+    # So sánh min (ít nhiễu nhất, như timeit) sau khi chia cho min của REFERENCE
+    # cùng lần chạy: loại bỏ phần chênh lệch do tốc độ máy / máy đang bận
+    scale = 1.0
+    if REFERENCE in baseline:
+        scale = baseline[REFERENCE]["min_us"] / results[REFERENCE]["min_us"]
+
+    print("=" * 79)
+    print(
+        f"{'benchmark':<36}{'median µs':>12}{'min µs':>12}{'baseline':>10}{'ratio':>9}"
+    )
+    print("=" * 79)
+    regressions = []
+    for name, result in results.items():
+        line = f"{name:<36}{result['median_us']:>12.2f}{result['min_us']:>12.2f}"
+        if name in baseline and name != REFERENCE:
+            ratio = result["min_us"] * scale / baseline[name]["min_us"]
+            flag = "  <-- regression" if ratio > args.threshold else ""
+            if flag:
+                regressions.append(name)
+            line += f"{baseline[name]['min_us']:>10.2f}{ratio:>8.2f}x{flag}"
+        print(line)
+    if baseline:
+        print(f"(ratio normalized by {REFERENCE}: machine speed x{scale:.2f} baseline)")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    "machine": {
+                        "platform": platform.platform(),
+                        "processor": platform.processor() or platform.machine(),
+                        "python": platform.python_version(),
+                        "numpy": np.__version__,
+                        "backend": (
+                            api.oxford_model.backend if api.oxford_model else None
+                        ),
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"\nResults saved to {args.save}")
+
+    if regressions:
+        print(
+            f"\n{len(regressions)} regression(s) over {args.threshold}x baseline: "
+            + ", ".join(regressions)
+        )
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Low-Overhead Model Serving Entry Point
+Bọc Keras model trong tf.function với signature cố định để tránh overhead của model.predict;
+serve() nhận thẳng pixel uint8 và trả về top-k cùng thống kê màu trong một lần chạy graph.
+FLOWER_BACKEND=tflite chuyển sang TFLite interpreter (XNNPACK) với cùng interface
+"""
+
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+from image_decode import channel_means
+from inference_batcher import DEFAULT_MAX_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = "oxford102_m2_optimized.h5"
+TFLITE_MODEL_PATH = "oxford102_m2_optimized.tflite"
+IMG_SIZE = (224, 224)
+TOP_K = 5
+EMBEDDING_DIM = 1280
+
+# Backend inference: "keras" (mặc định) hoặc "tflite"
+BACKEND = os.environ.get("FLOWER_BACKEND", "keras")
+
+# Batch của TFLite backend được pad lên bucket gần nhất để dùng tensor đã allocate sẵn
+TFLITE_BATCH_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+
+def _warmup_batch_sizes():
+    """Batch size cần warm-up: FLOWER_WARMUP_BATCH_SIZES hoặc mặc định là các bucket
+    lũy thừa 2 nhỏ hơn FLOWER_BATCH_MAX_SIZE cộng với chính max batch size"""
+    configured = os.environ.get("FLOWER_WARMUP_BATCH_SIZES", "")
+    sizes = [int(size) for size in configured.split(",") if size.strip()]
+    if not sizes:
+        sizes = [size for size in TFLITE_BATCH_BUCKETS if size < DEFAULT_MAX_BATCH_SIZE]
+        sizes.append(DEFAULT_MAX_BATCH_SIZE)
+    return sizes
+
+
+WARMUP_BATCH_SIZES = _warmup_batch_sizes()
+
+# Các model được hoãn load đến khi worker khởi động (xem gunicorn.conf.py),
+# giá trị là cờ warm-up
+_deferred_models = {}
+
+# Mỗi (file, backend) chỉ load một lần trong process: app.py và enhanced_api.py chạy
+# chung process (unified_api.py) dùng chung một bản weights
+_loaded_models = {}
+_registry_lock = threading.Lock()
+
+
+def embedding_model(keras_model):
+    """Model con trả về output GlobalAveragePooling2D của backbone MobileNetV2
+    (layer ngay trước Dropout/Dense trong train_optimized.py)"""
+    pooling_layer = next(
+        layer
+        for layer in keras_model.layers
+        if isinstance(layer, tf.keras.layers.GlobalAveragePooling2D)
+    )
+    return tf.keras.Model(keras_model.inputs, pooling_layer.output)
+
+
+def configure_tf_threads():
+    """Áp dụng số thread TF từ biến môi trường (trước khi TF runtime khởi tạo)"""
+    intra_op = int(os.environ.get("FLOWER_TF_INTRA_OP_THREADS", "0"))
+    inter_op = int(os.environ.get("FLOWER_TF_INTER_OP_THREADS", "0"))
+
+    try:
+        if intra_op:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        if inter_op:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    except RuntimeError as e:
+        logger.warning(f"Cannot change TF thread settings: {str(e)}")
+
+
+class _WarmUpMixin:
+    """Warm-up lúc khởi động và trạng thái readiness, dùng chung cho các backend"""
+
+    warmup_ms = None
+
+    def warm_up(self, batch_sizes=None):
+        """Chạy serve() ở mỗi batch size và embed() ở batch 1 để trace graph / khởi
+        tạo kernel trước khi nhận request; trả về thời gian (ms) của từng lần chạy"""
+        timings = {}
+        for batch_size in batch_sizes or WARMUP_BATCH_SIZES:
+            pixels = np.zeros((batch_size, *IMG_SIZE, 3), dtype=np.uint8)
+            start = time.perf_counter()
+            self.serve(pixels)
+            timings[str(batch_size)] = round((time.perf_counter() - start) * 1000, 2)
+
+        # /search-similar: embed() là graph riêng, trace lần đầu mất ~1s
+        start = time.perf_counter()
+        try:
+            self.embed(np.zeros((1, *IMG_SIZE, 3), dtype=np.uint8))
+            timings["embed:1"] = round((time.perf_counter() - start) * 1000, 2)
+        except RuntimeError as e:  # file TFLite cũ không có output embedding
+            logger.warning(f"Embedding warm-up skipped: {str(e)}")
+
+        self.warmup_ms = timings
+        logger.info(f"Model warm-up done (pid {os.getpid()}): {timings} ms")
+        return timings
+
+    @property
+    def ready(self):
+        """Model đã load và đã warm-up"""
+        return self.loaded and self.warmup_ms is not None
+
+
+class ServingModel(_WarmUpMixin):
+    """Gọi Keras model qua một graph đã trace sẵn.
+
+    model.predict dựng tf.data pipeline và callbacks ở mỗi lần gọi; ở đây
+    input_signature cố định (batch động, 224x224x3 float32) nên graph chỉ
+    trace một lần và các lần gọi sau chạy thẳng concrete function.
+    """
+
+    backend = "keras"
+
+    def __init__(self, model_path=MODEL_PATH):
+        self.model_path = model_path
+        self.keras_model = None
+        self._serve = None
+        self._serve_uint8 = None
+        self._embed_uint8 = None
+        self._embedding_model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load file .h5 và dựng serving function (chỉ chạy một lần)"""
+        with self._lock:
+            if self._serve is not None:
+                return self
+
+            configure_tf_threads()
+            self.keras_model = tf.keras.models.load_model(self.model_path)
+            self._serve = tf.function(
+                self._forward,
+                input_signature=[
+                    tf.TensorSpec(shape=[None, *IMG_SIZE, 3], dtype=tf.float32)
+                ],
+            )
+            self._serve_uint8 = tf.function(
+                self._forward_uint8,
+                input_signature=[
+                    tf.TensorSpec(shape=[None, None, None, 3], dtype=tf.uint8)
+                ],
+            )
+            self._embedding_model = embedding_model(self.keras_model)
+            self._embed_uint8 = tf.function(
+                self._embed_forward_uint8,
+                input_signature=[
+                    tf.TensorSpec(shape=[None, None, None, 3], dtype=tf.uint8)
+                ],
+            )
+            logger.info(f"Serving model loaded: {self.model_path} (pid {os.getpid()})")
+            return self
+
+    @property
+    def loaded(self):
+        return self._serve is not None
+
+    def _forward(self, images):
+        return self.keras_model(images, training=False)
+
+    def _forward_uint8(self, images):
+        images = tf.image.resize(tf.cast(images, tf.float32), IMG_SIZE)
+        probabilities = self.keras_model(images / 255.0, training=False)
+        top_k = tf.math.top_k(probabilities, k=TOP_K)
+        # float64 để các color rule nhận đúng giá trị như khi tính bằng NumPy
+        color_mean = tf.reduce_mean(tf.cast(images, tf.float64), axis=[1, 2])
+        return {
+            "top_k_indices": top_k.indices,
+            "top_k_values": top_k.values,
+            "color_mean": color_mean / 255.0,
+        }
+
+    def _embed_forward_uint8(self, images):
+        images = tf.image.resize(tf.cast(images, tf.float32), IMG_SIZE)
+        embeddings = self._embedding_model(images / 255.0, training=False)
+        return tf.math.l2_normalize(embeddings, axis=1)
+
+    def __call__(self, image_batch):
+        """Nhận batch (N, 224, 224, 3) giá trị [0, 1], trả về xác suất (N, 102)"""
+        if self._serve is None:
+            self.load()
+        images = tf.convert_to_tensor(image_batch, dtype=tf.float32)
+        return self._serve(images).numpy()
+
+    def serve(self, image_batch):
+        """Nhận batch pixel uint8 (N, H, W, 3), trả về dict numpy:
+        top_k_indices / top_k_values (N, TOP_K) và color_mean (N, 3) RGB trong [0, 1]
+        """
+        if self._serve_uint8 is None:
+            self.load()
+        images = tf.convert_to_tensor(image_batch, dtype=tf.uint8)
+        outputs = self._serve_uint8(images)
+        return {key: value.numpy() for key, value in outputs.items()}
+
+    def embed(self, image_batch):
+        """Nhận batch pixel uint8 (N, H, W, 3), trả về embedding GAP (N, 1280)
+        float32 đã chuẩn hóa L2 (tích vô hướng = cosine similarity)"""
+        if self._embed_uint8 is None:
+            self.load()
+        images = tf.convert_to_tensor(image_batch, dtype=tf.uint8)
+        return self._embed_uint8(images).numpy()
+
+
+class TFLiteServingModel(_WarmUpMixin):
+    """Chạy model đã convert bằng convert_tflite.py trên TFLite interpreter.
+
+    File .tflite nhận pixel uint8 (N, 224, 224, 3) và trả về top-k cùng xác suất;
+    color_mean được tính bằng channel_means() nên output giống hệt ServingModel.serve().
+    Mỗi batch bucket có interpreter riêng với tensor đã allocate sẵn; interpreter
+    không thread-safe nên mỗi bucket có lock riêng.
+    """
+
+    backend = "tflite"
+
+    def __init__(self, model_path=TFLITE_MODEL_PATH):
+        self.model_path = model_path
+        self.keras_model = None
+        self._model_content = None
+        self._interpreters = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Đọc file .tflite và allocate interpreter cho batch 1 (chỉ chạy một lần)"""
+        with self._lock:
+            if self._model_content is not None:
+                return self
+
+            with open(self.model_path, "rb") as f:
+                self._model_content = f.read()
+            self._interpreters[1] = self._create_interpreter(1)
+            logger.info(
+                f"TFLite serving model loaded: {self.model_path} (pid {os.getpid()})"
+            )
+            return self
+
+    @property
+    def loaded(self):
+        return self._model_content is not None
+
+    def _create_interpreter(self, batch_size):
+        """Tạo interpreter với input cố định (batch_size, 224, 224, 3)"""
+        num_threads = int(os.environ.get("FLOWER_TF_INTRA_OP_THREADS", "0")) or None
+        interpreter = tf.lite.Interpreter(
+            model_content=self._model_content, num_threads=num_threads
+        )
+        # Chỉ dùng signature runner để lấy tensor index theo tên output
+        runner = interpreter.get_signature_runner()
+        input_index = runner.get_input_details()["images"]["index"]
+        output_indices = {
+            name: details["index"]
+            for name, details in runner.get_output_details().items()
+        }
+        del runner
+
+        interpreter.resize_tensor_input(input_index, [batch_size, *IMG_SIZE, 3])
+        interpreter.allocate_tensors()
+        return interpreter, input_index, output_indices, threading.Lock()
+
+    def _get_interpreter(self, batch_size):
+        if batch_size not in self._interpreters:
+            with self._lock:
+                if batch_size not in self._interpreters:
+                    self._interpreters[batch_size] = self._create_interpreter(
+                        batch_size
+                    )
+        return self._interpreters[batch_size]
+
+    def _invoke(self, image_batch):
+        """Chạy interpreter theo từng bucket, trả về dict output (N, ...)"""
+        if self._model_content is None:
+            self.load()
+
+        image_batch = np.asarray(image_batch, dtype=np.uint8)
+        outputs = {}
+        for start in range(0, len(image_batch), TFLITE_BATCH_BUCKETS[-1]):
+            chunk = image_batch[start : start + TFLITE_BATCH_BUCKETS[-1]]
+            count = len(chunk)
+            bucket = next(size for size in TFLITE_BATCH_BUCKETS if size >= count)
+            if bucket != count:
+                padding = np.zeros((bucket - count, *chunk.shape[1:]), np.uint8)
+                chunk = np.concatenate([chunk, padding])
+
+            interpreter, input_index, output_indices, lock = self._get_interpreter(
+                bucket
+            )
+            with lock:
+                interpreter.set_tensor(input_index, chunk)
+                interpreter.invoke()
+                for name, index in output_indices.items():
+                    result = interpreter.get_tensor(index)[:count]
+                    outputs.setdefault(name, []).append(result)
+
+        return {name: np.concatenate(results) for name, results in outputs.items()}
+
+    def __call__(self, image_batch):
+        """Nhận batch (N, 224, 224, 3) giá trị [0, 1], trả về xác suất (N, 102).
+
+        Input được lượng tử hóa về uint8; chính xác với ảnh đã chuẩn hóa từ uint8 / 255.
+        """
+        pixels = np.round(np.clip(image_batch, 0.0, 1.0) * 255.0).astype(np.uint8)
+        return self._invoke(pixels)["probabilities"]
+
+    def serve(self, image_batch):
+        """Cùng output với ServingModel.serve(): top_k_indices, top_k_values, color_mean"""
+        image_batch = np.asarray(image_batch, dtype=np.uint8)
+        outputs = self._invoke(image_batch)
+        return {
+            "top_k_indices": outputs["top_k_indices"],
+            "top_k_values": outputs["top_k_values"],
+            "color_mean": np.stack([channel_means(pixels) for pixels in image_batch]),
+        }
+
+    def embed(self, image_batch):
+        """Cùng output với ServingModel.embed(): embedding (N, 1280) đã chuẩn hóa L2"""
+        outputs = self._invoke(np.asarray(image_batch, dtype=np.uint8))
+        if "embedding" not in outputs:
+            raise RuntimeError(
+                f"{self.model_path} không có output 'embedding', "
+                f"hãy chạy lại convert_tflite.py"
+            )
+        return outputs["embedding"]
+
+
+def load_serving_model(model_path=MODEL_PATH, backend=None, warm_up=False):
+    """Trả về serving model cho backend đã cấu hình (FLOWER_BACKEND).
+
+    warm_up=True (các API server) chạy warm-up ngay sau khi load để request đầu
+    tiên không phải trả chi phí trace graph / khởi tạo kernel.
+
+    Backend "tflite" dùng file .tflite cùng tên với model_path (hoặc
+    FLOWER_TFLITE_MODEL_PATH). Khi FLOWER_DEFER_MODEL_LOAD=1 (master process của
+    gunicorn) model chưa được load: TF runtime không an toàn khi fork, nên mỗi
+    worker tự load trong load_deferred_models() ngay sau khi fork.
+
+    Gọi lại với cùng file và backend trả về cùng một instance.
+    """
+    backend = backend or BACKEND
+    if backend == "tflite":
+        model_path = os.environ.get(
+            "FLOWER_TFLITE_MODEL_PATH", os.path.splitext(model_path)[0] + ".tflite"
+        )
+        model_class = TFLiteServingModel
+    elif backend == "keras":
+        model_class = ServingModel
+    else:
+        raise ValueError(f"Unknown model backend: {backend}")
+
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+
+    with _registry_lock:
+        key = (os.path.abspath(model_path), backend)
+        serving_model = _loaded_models.get(key)
+        if serving_model is None:
+            serving_model = model_class(model_path)
+            _loaded_models[key] = serving_model
+
+        if model_load_deferred():
+            _deferred_models[serving_model] = (
+                _deferred_models.get(serving_model, False) or warm_up
+            )
+            logger.info(f"Model load deferred until worker start: {model_path}")
+        else:
+            serving_model.load()
+            if warm_up and serving_model.warmup_ms is None:
+                serving_model.warm_up()
+
+    return serving_model
+
+
+def model_load_deferred():
+    """FLOWER_DEFER_MODEL_LOAD=1: process hiện tại là master của gunicorn (preload),
+    việc nặng được làm trong worker sau khi fork"""
+    return os.environ.get("FLOWER_DEFER_MODEL_LOAD") == "1"
+
+
+def load_deferred_models():
+    """Load (và warm-up) các model đã bị hoãn (gọi trong worker sau khi fork)"""
+    for serving_model, warm_up in _deferred_models.items():
+        serving_model.load()
+        if warm_up:
+            serving_model.warm_up()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Content-Hash LRU Prediction Cache
+Cache kết quả dự đoán theo hash nội dung ảnh + mode, có giới hạn số entry, bộ nhớ và TTL
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import fast_json
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("FLOWER_CACHE_MAX_ENTRIES", "1024"))
+DEFAULT_MAX_BYTES = int(
+    os.environ.get("FLOWER_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+DEFAULT_TTL_SECONDS = float(os.environ.get("FLOWER_CACHE_TTL_SECONDS", "600"))
+
+
+class PredictionCache:
+    """LRU cache thread-safe cho response của các endpoint dự đoán.
+
+    Giá trị lưu là dict JSON-serializable; kích thước mỗi entry được ước lượng
+    bằng số byte JSON (fast_json, orjson nếu có) để giới hạn tổng bộ nhớ.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl_seconds=None):
+        self.max_entries = max_entries or DEFAULT_MAX_ENTRIES
+        self.max_bytes = max_bytes or DEFAULT_MAX_BYTES
+        self.ttl_seconds = DEFAULT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(image_bytes, mode):
+        """Key = sha256(nội dung ảnh) + mode"""
+        return f"{hashlib.sha256(image_bytes).hexdigest()}:{mode}"
+
+    def get(self, key):
+        """Trả về response đã cache hoặc None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, _, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Lưu response, evict entry cũ nhất nếu vượt giới hạn"""
+        size = len(fast_json.dumps(value))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+            self.current_bytes += size
+
+            while (
+                len(self._entries) > self.max_entries
+                or self.current_bytes > self.max_bytes
+            ):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def stats(self):
+        """Thống kê hit/miss cho /health"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
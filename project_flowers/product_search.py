@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Visual-Similarity Product Search
+Tìm sản phẩm có ảnh giống ảnh upload nhất, dựa trên embedding của backbone MobileNetV2
+
+Index được dựng trong process (thread nền) từ ảnh catalog của website
+(wwwroot/images, id = "/images/<file>" giống Product.ImageUrl bên C#). Nếu đã có
+embedding store (build_embedding_store.py), catalog được đọc từ file memmap thay vì
+chạy model lúc khởi động.
+"""
+
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+
+from embedding_index import INDEX_TYPE, IVFPQIndex, create_index
+from embedding_store import EMBEDDING_STORE_PATH, EmbeddingStore
+from image_decode import preprocess_pixels
+from model_serving import EMBEDDING_DIM, model_load_deferred
+
+logger = logging.getLogger(__name__)
+
+CATALOG_DIR = os.environ.get(
+    "FLOWER_CATALOG_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "wwwroot", "images"),
+)
+CATALOG_URL_PREFIX = os.environ.get("FLOWER_CATALOG_URL_PREFIX", "/images/")
+CATALOG_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+CATALOG_BATCH_SIZE = 32
+STORE_CHUNK_ROWS = 4096
+
+DEFAULT_SEARCH_K = 10
+MAX_SEARCH_K = 50
+
+# Một catalog index cho mỗi model trong process (xem shared_catalog_search)
+_shared_searches = {}
+_shared_lock = threading.Lock()
+
+
+class CatalogSearch:
+    """Index embedding của ảnh catalog + tìm kiếm top-k.
+
+    Thread build được khởi động lazily (start()) khi model đã load trong process
+    hiện tại, nên vẫn dùng được với gunicorn (model load sau khi fork).
+    """
+
+    def __init__(
+        self,
+        model,
+        catalog_dir=CATALOG_DIR,
+        url_prefix=CATALOG_URL_PREFIX,
+        store_path=EMBEDDING_STORE_PATH,
+    ):
+        self.model = model
+        self.catalog_dir = catalog_dir
+        self.url_prefix = url_prefix
+        self.store_path = store_path
+        self.index = create_index(EMBEDDING_DIM)
+
+        self.source = None
+        self.status = "pending"
+        self.error = None
+        self.build_seconds = None
+        self._lock = threading.Lock()
+        self._pid = None
+
+    @property
+    def ready(self):
+        return self.status == "ready"
+
+    def start(self):
+        """Bắt đầu build index nền (một lần mỗi process, khi model đã load).
+
+        Với embedding store và index flat, index là view memmap của store: sẵn sàng
+        ngay, không copy. Trong master của gunicorn (FLOWER_DEFER_MODEL_LOAD=1) không
+        làm gì: thread build không được chạy trước khi fork, mỗi worker tự start()
+        trong post_worker_init sau khi load model.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if not self.model.loaded and model_load_deferred():
+                return
+            store = self._open_store()
+            if store is None and not self.model.loaded:
+                return
+            self._pid = os.getpid()
+            self.source = "store" if store is not None else "model"
+
+            if store is not None and INDEX_TYPE == "flat":
+                self.index = store.index("catalog")
+                self.build_seconds = 0.0
+                self.status = "ready"
+                logger.info(
+                    f"Catalog index mapped from {self.store_path}: "
+                    f"{len(self.index)} images"
+                )
+                return
+
+            self.index = create_index(EMBEDDING_DIM)
+            self.status = "building"
+            threading.Thread(
+                target=self._build, args=(store,), name="catalog-index", daemon=True
+            ).start()
+
+    def _open_store(self):
+        if not os.path.exists(self.store_path):
+            return None
+        try:
+            return EmbeddingStore(self.store_path)
+        except Exception as e:
+            logger.warning(f"Cannot open embedding store {self.store_path}: {e}")
+            return None
+
+    def _catalog_files(self):
+        if not os.path.isdir(self.catalog_dir):
+            raise FileNotFoundError(f"Catalog directory not found: {self.catalog_dir}")
+        return sorted(
+            name
+            for name in os.listdir(self.catalog_dir)
+            if name.lower().endswith(CATALOG_EXTENSIONS)
+        )
+
+    def _build_from_store(self, store):
+        """Nạp embedding catalog từ store vào index (vd IVF-PQ), không chạy model"""
+        start, stop = store.section("catalog")
+        if isinstance(self.index, IVFPQIndex):
+            # Rerank bằng vector float16 trên memmap thay vì giữ bản copy trong RAM
+            self.index.refine_vectors = store.embeddings[start:stop]
+        for chunk_start in range(start, stop, STORE_CHUNK_ROWS):
+            chunk_stop = min(chunk_start + STORE_CHUNK_ROWS, stop)
+            self.index.add(
+                [store.id_at(i) for i in range(chunk_start, chunk_stop)],
+                np.asarray(store.embeddings[chunk_start:chunk_stop], np.float32),
+            )
+        return 0
+
+    def _build(self, store=None):
+        start_time = time.perf_counter()
+        try:
+            if store is not None:
+                skipped = self._build_from_store(store)
+            else:
+                skipped = self._build_from_model()
+
+            self.build_seconds = time.perf_counter() - start_time
+            self.status = "ready"
+            logger.info(
+                f"Catalog index ready: {len(self.index)} images "
+                f"({skipped} skipped) in {self.build_seconds:.1f}s"
+            )
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            logger.error(f"Catalog index build failed: {e}")
+
+    def _build_from_model(self):
+        """Embed từng batch ảnh trong catalog_dir, trả về số ảnh bị bỏ qua"""
+        files = self._catalog_files()
+        skipped = 0
+        # Không có store: IVF-PQ giữ embedding (float16, như store) trong RAM để rerank
+        # chính xác, nếu không kết quả chỉ theo điểm PQ xấp xỉ
+        embeddings = [] if isinstance(self.index, IVFPQIndex) else None
+        for start in range(0, len(files), CATALOG_BATCH_SIZE):
+            ids, pixels = [], []
+            for name in files[start : start + CATALOG_BATCH_SIZE]:
+                try:
+                    pixels.append(
+                        preprocess_pixels(os.path.join(self.catalog_dir, name))
+                    )
+                    ids.append(self.url_prefix + name)
+                except Exception as e:
+                    skipped += 1
+                    logger.warning(f"Skipping catalog image {name}: {e}")
+            if pixels:
+                batch = self.model.embed(np.stack(pixels))
+                self.index.add(ids, batch)
+                if embeddings is not None:
+                    embeddings.append(batch.astype(np.float16))
+        if embeddings:
+            self.index.refine_vectors = np.concatenate(embeddings)
+        return skipped
+
+    def search(self, embedding, k=DEFAULT_SEARCH_K, nprobe=None):
+        """Nhận embedding (1280,) của ảnh query (model.embed), trả về
+        [{"imageUrl", "similarity"}, ...] theo similarity giảm dần.
+
+        nprobe: số cluster được quét khi FLOWER_INDEX_TYPE=ivfpq (None = mặc định)
+        """
+        return [
+            {"imageUrl": image_id, "similarity": round(similarity, 4)}
+            for image_id, similarity in self.index.search(embedding, k, nprobe)[0]
+        ]
+
+    def stats(self):
+        """Thông tin index cho /health"""
+        return {
+            "status": self.status,
+            "images": len(self.index),
+            "index_type": type(self.index).__name__,
+            "source": self.source,
+            "build_seconds": (
+                round(self.build_seconds, 2) if self.build_seconds is not None else None
+            ),
+            "error": self.error,
+        }
+
+
+def shared_catalog_search(model):
+    """Trả về CatalogSearch dùng chung cho model, để các API chạy chung process
+    (unified_api.py) chỉ build index một lần"""
+    with _shared_lock:
+        search = _shared_searches.get(model)
+        if search is None:
+            search = CatalogSearch(model)
+            _shared_searches[model] = search
+        return search
+
+
+def start_catalog_searches():
+    """Build các catalog index đã đăng ký (gọi trong worker sau khi load model)"""
+    for search in list(_shared_searches.values()):
+        search.start()
+
+
+def parse_search_nprobe(value):
+    """Đọc tham số nprobe (tùy chọn) của request"""
+    if value in (None, ""):
+        return None
+    try:
+        nprobe = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"nprobe must be an integer (got {value!r})")
+    if nprobe < 1:
+        raise ValueError(f"nprobe must be positive (got {nprobe})")
+    return nprobe
+
+
+def parse_search_k(value):
+    """Đọc tham số k của request, giới hạn trong [1, MAX_SEARCH_K]"""
+    try:
+        k = int(value) if value not in (None, "") else DEFAULT_SEARCH_K
+    except (TypeError, ValueError):
+        raise ValueError(f"k must be an integer (got {value!r})")
+    return max(1, min(k, MAX_SEARCH_K))
@@ -0,0 +1,62 @@
+#!/bin/bash
+# Production launcher: gunicorn master + N worker process (thay cho start_api.sh /
+# start_enhanced_api.sh khi deploy)
+#
+# Usage: ./start_production.sh [app|enhanced|unified]
+#
+# unified: một process (model load một lần) phục vụ contract classic trên 8000 và
+# enhanced trên 8001 (xem unified_api.py)
+#
+# Biến môi trường:
+#   FLOWER_WORKERS               Số worker process (mặc định: số CPU)
+#   FLOWER_WORKER_THREADS        Số thread mỗi worker (mặc định: 4)
+#   FLOWER_TF_INTRA_OP_THREADS   Số thread TF intra-op mỗi worker (mặc định: CPU / workers)
+#   FLOWER_TF_INTER_OP_THREADS   Số thread TF inter-op mỗi worker (mặc định: 1)
+#   FLOWER_BIND                  Địa chỉ bind, phân cách bằng dấu phẩy
+#                                (mặc định: 0.0.0.0:8000 / 0.0.0.0:8001 / cả hai cho unified)
+
+SERVICE="${1:-app}"
+
+case "$SERVICE" in
+    app)
+        APP_MODULE="app:app"
+        DEFAULT_BIND="0.0.0.0:8000"
+        ;;
+    enhanced)
+        APP_MODULE="enhanced_api:app"
+        DEFAULT_BIND="0.0.0.0:8001"
+        ;;
+    unified)
+        APP_MODULE="unified_api:app"
+        DEFAULT_BIND="0.0.0.0:8000,0.0.0.0:8001"
+        ;;
+    *)
+        echo "Usage: $0 [app|enhanced|unified]"
+        exit 1
+        ;;
+esac
+
+# Check if model file exists
+if [ ! -f "oxford102_m2_optimized.h5" ]; then
+    echo "Error: Model file oxford102_m2_optimized.h5 not found!"
+    exit 1
+fi
+
+# Check gunicorn
+python3 -c "import gunicorn" 2>/dev/null
+if [ $? -ne 0 ]; then
+    echo "Installing requirements..."
+    pip3 install -q -r requirements.txt
+fi
+
+export FLOWER_BIND="${FLOWER_BIND:-$DEFAULT_BIND}"
+
+echo "=============================================="
+echo "Oxford Flowers API - production mode"
+echo "=============================================="
+echo "App module: $APP_MODULE"
+echo "Bind:       $FLOWER_BIND"
+echo "Workers:    ${FLOWER_WORKERS:-$(python3 -c 'import os; print(os.cpu_count())')}"
+echo "=============================================="
+
+exec gunicorn -c gunicorn.conf.py "$APP_MODULE"
@@ -7,12 +7,53 @@ Sử dụng tkinter để test việc nhận dạng hoa từ hình ảnh
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
-import tensorflow as tf
 import numpy as np
 import os
 import sys
 from datetime import datetime
 
+from image_decode import decode_image
+from model_serving import load_serving_model
+from flower_names import VietnameseNameTable
+
+# Tên tiếng Việt hiển thị trên GUI
+VIETNAMESE_NAMES = {
+    "rose": "Hoa Hồng",
+    "sunflower": "Hoa Hướng Dương",
+    "tulip": "Hoa Tulip",
+    "lily": "Hoa Lily",
+    "orchid": "Hoa Lan",
+    "carnation": "Hoa Cẩm Chướng",
+    "daffodil": "Hoa Thủy Tiên",
+    "iris": "Hoa Diên Vĩ",
+    "dahlia": "Hoa Thược Dược",
+    "magnolia": "Hoa Mộc Lan",
+    "marigold": "Hoa Vạn Thọ",
+    "poppy": "Hoa Anh Túc",
+    "lotus": "Hoa Sen",
+    "daisy": "Hoa Cúc",
+    "oxeye daisy": "Hoa Cúc Trắng",
+    "barbeton daisy": "Hoa Đồng Tiền",
+    "black-eyed susan": "Hoa Cúc Mắt Đen",
+    "primrose": "Hoa Anh Thảo",
+    "pink primrose": "Hoa Anh Thảo Hồng",
+    "canterbury bells": "Hoa Chuông Canterbury",
+    "sweet pea": "Hoa Đậu Hà Lan",
+    "english marigold": "Hoa Cúc Vạn Thọ Anh",
+    "tiger lily": "Hoa Lily Hổ",
+    "moon orchid": "Hoa Lan Trăng",
+    "bird of paradise": "Hoa Thiên Điểu",
+    "hibiscus": "Hoa Dâm Bụt",
+    "azalea": "Hoa Đỗ Quyên",
+    "camellia": "Hoa Trà",
+    "petunia": "Hoa Dạ Yến Thảo",
+    "geranium": "Hoa Phong Lữ",
+    "bougainvillea": "Hoa Giấy",
+    "morning glory": "Hoa Bìm Bìm",
+    "water lily": "Hoa Súng",
+    "anthurium": "Hoa Hồng Môn",
+}
+
 
 class FlowerRecognitionGUI:
     def __init__(self, root):
@@ -24,6 +65,7 @@ class FlowerRecognitionGUI:
         # Initialize variables first
         self.model = None
         self.class_names = self.load_class_names()
+        self.vietnamese_names = VietnameseNameTable(VIETNAMESE_NAMES, self.class_names)
         self.current_image_path = None
         self.current_image = None
 
@@ -158,7 +200,7 @@ class FlowerRecognitionGUI:
                 return
 
             print("Loading TensorFlow model...")
-            self.model = tf.keras.models.load_model(model_path)
+            self.model = load_serving_model(model_path)
             print("Model loaded successfully!")
             self.update_status("Model loaded successfully! ✓")
 
@@ -369,14 +411,13 @@ class FlowerRecognitionGUI:
         try:
             self.update_status("Analyzing image...")
 
-            # Preprocess image
-            image = self.current_image.convert("RGB")
-            image = image.resize((224, 224))
+            # Preprocess image (decode lại ở kích thước nhỏ thay vì resize ảnh gốc)
+            image = decode_image(self.current_image_path)
             image_array = np.array(image) / 255.0
             image_array = np.expand_dims(image_array, axis=0)
 
             # Predict
-            predictions = self.model.predict(image_array, verbose=0)
+            predictions = self.model(image_array)
 
             # Get top 5 predictions
             top_5_indices = np.argsort(predictions[0])[-5:][::-1]
@@ -392,7 +433,7 @@ class FlowerRecognitionGUI:
 
             for i, idx in enumerate(top_5_indices, 1):
                 flower_name = self.class_names[idx]
-                vietnamese_name = self.map_flower_to_vietnamese(flower_name)
+                vietnamese_name = self.vietnamese_names.for_class(idx)
                 confidence = predictions[0][idx] * 100
 
                 results += f"{i}. {vietnamese_name}\n"
@@ -414,9 +455,7 @@ class FlowerRecognitionGUI:
             self.results_text.insert(1.0, results)
 
             # Update status
-            best_match = self.map_flower_to_vietnamese(
-                self.class_names[top_5_indices[0]]
-            )
+            best_match = self.vietnamese_names.for_class(top_5_indices[0])
             best_confidence = predictions[0][top_5_indices[0]] * 100
             self.update_status(
                 f"Analysis complete! Best match: {best_match} ({best_confidence:.1f}%)"
@@ -428,49 +467,7 @@ class FlowerRecognitionGUI:
 
     def map_flower_to_vietnamese(self, english_name):
         """Map English flower names to Vietnamese"""
-        flower_mapping = {
-            "rose": "Hoa Hồng",
-            "sunflower": "Hoa Hướng Dương",
-            "tulip": "Hoa Tulip",
-            "lily": "Hoa Lily",
-            "orchid": "Hoa Lan",
-            "carnation": "Hoa Cẩm Chướng",
-            "daffodil": "Hoa Thủy Tiên",
-            "iris": "Hoa Diên Vĩ",
-            "dahlia": "Hoa Thược Dược",
-            "magnolia": "Hoa Mộc Lan",
-            "marigold": "Hoa Vạn Thọ",
-            "poppy": "Hoa Anh Túc",
-            "lotus": "Hoa Sen",
-            "daisy": "Hoa Cúc",
-            "oxeye daisy": "Hoa Cúc Trắng",
-            "barbeton daisy": "Hoa Đồng Tiền",
-            "black-eyed susan": "Hoa Cúc Mắt Đen",
-            "primrose": "Hoa Anh Thảo",
-            "pink primrose": "Hoa Anh Thảo Hồng",
-            "canterbury bells": "Hoa Chuông Canterbury",
-            "sweet pea": "Hoa Đậu Hà Lan",
-            "english marigold": "Hoa Cúc Vạn Thọ Anh",
-            "tiger lily": "Hoa Lily Hổ",
-            "moon orchid": "Hoa Lan Trăng",
-            "bird of paradise": "Hoa Thiên Điểu",
-            "hibiscus": "Hoa Dâm Bụt",
-            "azalea": "Hoa Đỗ Quyên",
-            "camellia": "Hoa Trà",
-            "petunia": "Hoa Dạ Yến Thảo",
-            "geranium": "Hoa Phong Lữ",
-            "bougainvillea": "Hoa Giấy",
-            "morning glory": "Hoa Bìm Bìm",
-            "water lily": "Hoa Súng",
-            "anthurium": "Hoa Hồng Môn",
-        }
-
-        english_lower = english_name.lower()
-        for eng_name, vi_name in flower_mapping.items():
-            if eng_name in english_lower:
-                return vi_name
-
-        return english_name.title()
+        return self.vietnamese_names.lookup(english_name)
 
     def clear_all(self):
         """Clear all data"""
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Regression Test: Inference Batcher
+Future bị hủy (predict_many timeout, client asyncio ngắt kết nối) không được làm dừng
+worker thread của batcher: các request sau đó vẫn phải nhận được kết quả
+
+Chạy (không cần model):
+    python test_inference_batcher.py
+    python -m pytest test_inference_batcher.py
+"""
+
+import sys
+import time
+import threading
+from concurrent.futures import TimeoutError
+
+import numpy as np
+
+from inference_batcher import InferenceBatcher
+
+
+def slow_identity(batch):
+    """predict_fn giả: chậm hơn timeout của request bị hủy"""
+    time.sleep(0.2)
+    return batch * 2
+
+
+def make_batcher():
+    return InferenceBatcher(
+        slow_identity, max_batch_size=4, max_wait_ms=1, max_queue_depth=0
+    )
+
+
+def test_cancelled_future_keeps_worker_alive():
+    batcher = make_batcher()
+    sample = np.ones(3, dtype=np.float32)
+
+    # Batch đầu đang chạy; future thứ hai bị hủy khi còn trong hàng đợi
+    running = batcher.submit(sample)
+    cancelled = batcher.submit(sample)
+    assert cancelled.cancel()
+    running.result(timeout=5)
+
+    result = batcher.predict(sample, timeout=5)
+    assert np.array_equal(result, sample * 2)
+    assert batcher._worker.is_alive()
+
+
+def test_predict_many_timeout_keeps_worker_alive():
+    batcher = make_batcher()
+    samples = [np.full(3, i, dtype=np.float32) for i in range(6)]
+
+    try:
+        batcher.predict_many(samples, timeout=0.05)
+        raise AssertionError("predict_many should have timed out")
+    except TimeoutError:
+        pass
+
+    result = batcher.predict(samples[1], timeout=5)
+    assert np.array_equal(result, samples[1] * 2)
+    assert batcher._worker.is_alive()
+
+
+def test_future_resolved_elsewhere_keeps_worker_alive():
+    batcher = make_batcher()
+    sample = np.ones(3, dtype=np.float32)
+
+    # Future đã có kết quả trước khi batch chạy xong: set_result của batcher bị bỏ qua
+    future = batcher.submit(sample)
+    threading.Timer(0.05, lambda: future.set_result("resolved elsewhere")).start()
+    assert future.result(timeout=5) == "resolved elsewhere"
+
+    result = batcher.predict(sample, timeout=5)
+    assert np.array_equal(result, sample * 2)
+    assert batcher._worker.is_alive()
+
+
+if __name__ == "__main__":
+    tests = [
+        test_cancelled_future_keeps_worker_alive,
+        test_predict_many_timeout_keeps_worker_alive,
+        test_future_resolved_elsewhere_keeps_worker_alive,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"PASS {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"FAIL {test.__name__}: {e!r}")
+    sys.exit(1 if failed else 0)
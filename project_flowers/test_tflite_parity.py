@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Parity Test: Keras backend vs TFLite backend
+So sánh top-5 của hai backend trên Oxford test split (setid.mat tstid)
+
+Chạy sau khi convert:
+    python convert_tflite.py
+    python test_tflite_parity.py --limit 500
+"""
+
+import argparse
+import glob
+import sys
+import time
+
+import numpy as np
+import scipy.io as sio
+
+from image_decode import preprocess_pixels
+from model_serving import MODEL_PATH, load_serving_model
+
+
+def load_test_files(limit):
+    """Danh sách ảnh test theo thứ tự tstid, giống evaluate.py"""
+    test_idx = sio.loadmat("setid.mat")["tstid"].flatten() - 1
+    all_files = sorted(glob.glob("images/jpg/*.jpg"))
+    test_files = [all_files[i] for i in test_idx]
+    return test_files[:limit] if limit else test_files
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--limit", type=int, default=0, help="0 = toàn bộ tstid")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument(
+        "--min-agreement",
+        type=float,
+        default=0.99,
+        help="Tỉ lệ ảnh tối thiểu có top-5 giống hệt nhau",
+    )
+    args = parser.parse_args()
+
+    keras_model = load_serving_model(args.model, backend="keras")
+    tflite_model = load_serving_model(args.model, backend="tflite")
+
+    test_files = load_test_files(args.limit)
+    print("=" * 70)
+    print(f"Oxford test split: {len(test_files)} images")
+    print("=" * 70)
+
+    top1_match = 0
+    top5_match = 0
+    max_value_diff = 0.0
+    timings = {"keras": 0.0, "tflite": 0.0}
+
+    for start in range(0, len(test_files), args.batch_size):
+        batch = np.stack(
+            [
+                preprocess_pixels(path)
+                for path in test_files[start : start + args.batch_size]
+            ]
+        )
+
+        begin = time.perf_counter()
+        keras_outputs = keras_model.serve(batch)
+        timings["keras"] += time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        tflite_outputs = tflite_model.serve(batch)
+        timings["tflite"] += time.perf_counter() - begin
+
+        keras_top5 = keras_outputs["top_k_indices"]
+        tflite_top5 = tflite_outputs["top_k_indices"]
+        top1_match += int(np.sum(keras_top5[:, 0] == tflite_top5[:, 0]))
+        top5_match += int(np.sum(np.all(keras_top5 == tflite_top5, axis=1)))
+        value_diff = np.abs(
+            keras_outputs["top_k_values"] - tflite_outputs["top_k_values"]
+        )
+        max_value_diff = max(max_value_diff, float(np.max(value_diff)))
+
+    total = len(test_files)
+    top5_agreement = top5_match / total
+    print(f"Top-1 agreement: {top1_match / total:.4f} ({top1_match}/{total})")
+    print(f"Top-5 agreement: {top5_agreement:.4f} ({top5_match}/{total})")
+    print(f"Max top-5 probability difference: {max_value_diff:.2e}")
+    print(
+        f"Inference time per image: keras={timings['keras'] / total * 1000:.2f}ms, "
+        f"tflite={timings['tflite'] / total * 1000:.2f}ms"
+    )
+
+    if top5_agreement < args.min_agreement:
+        print(f"❌ Top-5 agreement below {args.min_agreement:.2%}")
+        sys.exit(1)
+    print("✅ TFLite backend matches Keras backend")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Unified Flower Recognition Daemon
+Một process phục vụ cả contract classic (app.py) và enhanced (enhanced_api.py) với một bản model
+
+Chọn contract theo port hoặc theo prefix:
+    - port 8000 (hoặc bất kỳ port nào không nằm trong FLOWER_ENHANCED_PORTS): classic,
+      riêng /enhanced/... chuyển sang enhanced (vd /enhanced/predict)
+    - port trong FLOWER_ENHANCED_PORTS (mặc định 8001): enhanced
+
+Chạy:
+    python unified_api.py                         # dev server, port 8000 + 8001
+    ./start_production.sh unified                 # gunicorn, bind 8000 + 8001
+"""
+
+import os
+import argparse
+import logging
+import threading
+
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+from werkzeug.serving import make_server
+
+# Cả hai module gọi load_serving_model() với cùng file nên dùng chung một
+# ServingModel (và một batcher); chỉ load + warm-up một lần
+import app as classic_api
+import enhanced_api
+
+logger = logging.getLogger(__name__)
+
+ENHANCED_PREFIX = "/enhanced"
+ENHANCED_PORTS = {
+    port.strip()
+    for port in os.environ.get("FLOWER_ENHANCED_PORTS", "8001").split(",")
+    if port.strip()
+}
+
+
+class ContractDispatcher:
+    """WSGI app chọn contract theo SERVER_PORT, hoặc theo prefix /enhanced"""
+
+    def __init__(self, classic_app, enhanced_app, enhanced_ports):
+        self.enhanced_app = enhanced_app
+        self.enhanced_ports = enhanced_ports
+        self.prefixed_app = DispatcherMiddleware(
+            classic_app, {ENHANCED_PREFIX: enhanced_app}
+        )
+
+    def __call__(self, environ, start_response):
+        if environ.get("SERVER_PORT") in self.enhanced_ports:
+            return self.enhanced_app(environ, start_response)
+        return self.prefixed_app(environ, start_response)
+
+
+app = ContractDispatcher(classic_api.app, enhanced_api.app, ENHANCED_PORTS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Unified Flower Recognition API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--classic-port", type=int, default=8000)
+    parser.add_argument("--enhanced-port", type=int, default=8001)
+    args = parser.parse_args()
+
+    app.enhanced_ports = {str(args.enhanced_port)}
+
+    logger.info("=" * 60)
+    logger.info("Starting Unified Flower Recognition API")
+    logger.info("=" * 60)
+    logger.info(
+        f"Model loaded once (backend: {classic_api.model.backend}, "
+        f"shared: {classic_api.model is enhanced_api.recognition_system.oxford_model})"
+    )
+    logger.info(f"Classic contract:  http://{args.host}:{args.classic_port}")
+    logger.info(
+        f"                   http://{args.host}:{args.classic_port}{ENHANCED_PREFIX}/... "
+        f"(enhanced)"
+    )
+    logger.info(f"Enhanced contract: http://{args.host}:{args.enhanced_port}")
+    logger.info("=" * 60)
+
+    servers = [
+        make_server(args.host, port, app, threaded=True)
+        for port in (args.classic_port, args.enhanced_port)
+    ]
+    for server in servers[1:]:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    servers[0].serve_forever()
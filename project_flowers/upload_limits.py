@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Upload Limits
+Giới hạn upload theo endpoint: số byte của request (kiểm tra Content-Length rồi giới hạn
+ngay khi đọc stream) và số pixel/format của ảnh (probe header trước khi decode), để
+upload quá lớn hoặc decompression bomb bị từ chối trước khi đọc hết body / cấp phát pixel
+
+Biến môi trường (giá trị chung; ghi đè cho từng endpoint bằng FLOWER_<ENDPOINT>_..., vd
+FLOWER_BATCH_MAX_UPLOAD_BYTES, FLOWER_SEARCH_MAX_IMAGE_PIXELS):
+    FLOWER_MAX_UPLOAD_BYTES   số byte tối đa của một request (mặc định 10 MB)
+    FLOWER_MAX_IMAGE_PIXELS   số pixel tối đa của một ảnh (mặc định 50 triệu)
+    FLOWER_IMAGE_FORMATS      format ảnh được nhận (tên format của Pillow)
+"""
+
+import os
+import logging
+from typing import NamedTuple
+
+from flask import request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from image_decode import ImageTooLargeError
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_BYTES = int(os.environ.get("FLOWER_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.environ.get("FLOWER_MAX_IMAGE_PIXELS", "50000000"))
+# MPO: JPEG nhiều frame của một số camera/điện thoại
+IMAGE_FORMATS = tuple(
+    name.strip().upper()
+    for name in os.environ.get(
+        "FLOWER_IMAGE_FORMATS", "JPEG,MPO,PNG,WEBP,BMP,GIF,TIFF"
+    ).split(",")
+    if name.strip()
+)
+
+
+class UploadLimits(NamedTuple):
+    """Giới hạn upload của một endpoint"""
+
+    max_bytes: int
+    max_pixels: int
+    formats: tuple
+
+
+def endpoint_limits(endpoint, max_bytes=MAX_UPLOAD_BYTES, max_pixels=MAX_IMAGE_PIXELS):
+    """Giới hạn của endpoint, đọc FLOWER_<ENDPOINT>_MAX_UPLOAD_BYTES/_MAX_IMAGE_PIXELS"""
+    prefix = f"FLOWER_{endpoint.upper()}_"
+    return UploadLimits(
+        max_bytes=int(os.environ.get(prefix + "MAX_UPLOAD_BYTES", max_bytes)),
+        max_pixels=int(os.environ.get(prefix + "MAX_IMAGE_PIXELS", max_pixels)),
+        formats=IMAGE_FORMATS,
+    )
+
+
+PREDICT_LIMITS = endpoint_limits("predict")
+SEARCH_LIMITS = endpoint_limits("search")
+SIMILAR_LIMITS = endpoint_limits("similar")
+# /predict-batch nhận nhiều ảnh trong một request
+BATCH_LIMITS = endpoint_limits("batch", max_bytes=8 * MAX_UPLOAD_BYTES)
+
+
+def check_request_size(content_length, limits):
+    """Từ chối theo header Content-Length, trước khi đọc body"""
+    if content_length is not None and content_length > limits.max_bytes:
+        raise ImageTooLargeError(
+            f"Request body too large: {content_length} bytes "
+            f"(max {limits.max_bytes} bytes)"
+        )
+
+
+def install_flask_limits(app, limits_by_endpoint, error_endpoints=()):
+    """Áp giới hạn byte cho Flask app theo tên view function.
+
+    Request class của app được thay bằng lớp con có max_content_length theo
+    endpoint: Werkzeug đọc giá trị này khi parse body (ở bất kỳ hook/view nào chạm
+    request.files trước), nên request có Content-Length vượt giới hạn bị từ chối
+    trước khi đọc body, và upload chunked dừng ngay khi vượt giới hạn (Werkzeug >=
+    2.3, xem requirements.txt). Vượt giới hạn trả về 413 JSON: {"error": ...} với
+    các endpoint trong error_endpoints (contract kiểu C#), còn lại
+    {"success": False, "message": ...}.
+    """
+    app.config["MAX_CONTENT_LENGTH"] = max(
+        limits.max_bytes for limits in limits_by_endpoint.values()
+    )
+
+    class UploadLimitedRequest(app.request_class):
+        @property
+        def max_content_length(self):
+            rule = self.url_rule
+            limits = limits_by_endpoint.get(rule.endpoint) if rule else None
+            if limits is None:
+                return super().max_content_length
+            return limits.max_bytes
+
+    app.request_class = UploadLimitedRequest
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def request_too_large(e):
+        message = f"Request body too large (max {request.max_content_length} bytes)"
+        logger.warning(message)
+        if request.endpoint in error_endpoints:
+            return jsonify({"error": message}), 413
+        return jsonify({"success": False, "message": message}), 413